@@ -0,0 +1,169 @@
+# --- START OF FILE analytics.py ---
+
+from pydantic import BaseModel, ConfigDict
+from typing import Optional, List
+import numpy as np
+import pandas as pd
+import models
+
+# Defaults for the at-risk flag: both conditions must hold
+LOW_GRADE_THRESHOLD = 60.0
+LOW_ATTENDANCE_THRESHOLD = 75.0
+PERCENTILES = [0.25, 0.5, 0.75, 0.9]
+
+class CohortReport(BaseModel):
+    """Class-wide statistics for one course and/or subject."""
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    course: Optional[str] = None
+    subject: Optional[str] = None
+    grade_rows: int = 0
+    # One row per subject: count, students, mean, std, min, p25, median, p75, p90, max
+    subject_stats: pd.DataFrame
+    # One row per (subject, student): average_grade, grade_count, attendance_percentage,
+    # rank (1 = best in subject), percentile (share of the subject's students at or below) and at_risk
+    student_stats: pd.DataFrame
+
+    @property
+    def at_risk(self) -> pd.DataFrame:
+        return self.student_stats[self.student_stats['at_risk']]
+
+# --- Loading (one connection, columnar reads) ---
+# Fetching a million rows as Python tuples costs far more than the statistics
+# themselves. Instead SQLite packs each subject's column into one delimited
+# string (group_concat) and NumPy parses it back in C. The covering indexes
+# from schema migration 6 deliver rows already ordered by (subject, student),
+# so per-student aggregates are contiguous runs.
+
+def _cohort_filter(course: Optional[str], subject: Optional[str], table: str):
+    conditions, params = [], []
+    if subject:
+        conditions.append(f"{table}.subject = ?")
+        params.append(subject)
+    if course:
+        conditions.append(f"{table}.student_id IN (SELECT id FROM students WHERE course = ?)")
+        params.append(course)
+    return (f"WHERE {' AND '.join(conditions)}" if conditions else ""), params
+
+def _read_columns(conn, table: str, value_column: str, where: str, params) -> pd.DataFrame:
+    """Reads (subject, student_id, value) for `table`, sorted by subject then student."""
+    rows = conn.execute(f"""
+        SELECT subject, COUNT(*), group_concat(student_id), group_concat({value_column})
+        FROM {table} {where}
+        GROUP BY subject
+        ORDER BY subject
+    """, params).fetchall()
+    subjects = [row[0] for row in rows]
+    counts = np.array([row[1] for row in rows], dtype=np.int64)
+    df = pd.DataFrame({
+        'subject': pd.Categorical.from_codes(np.repeat(np.arange(len(subjects)), counts), categories=subjects),
+        'student_id': np.concatenate([np.fromstring(row[2], dtype=np.int64, sep=',') for row in rows])
+                      if rows else np.array([], dtype=np.int64),
+        'value': np.concatenate([np.fromstring(row[3], dtype=np.float64, sep=',') for row in rows])
+                 if rows else np.array([], dtype=np.float64),
+    })
+    # group_concat follows the index order in practice, but SQLite does not promise it
+    codes = df['subject'].cat.codes.to_numpy()
+    student_ids = df['student_id'].to_numpy()
+    if len(df) > 1 and np.any((np.diff(codes) < 0) | ((np.diff(codes) == 0) & (np.diff(student_ids) < 0))):
+        df = df.iloc[np.lexsort((student_ids, codes))].reset_index(drop=True)
+    return df
+
+def _load_cohort(course: Optional[str], subject: Optional[str]):
+    """Reads the cohort's grades, attendance and student details in one read transaction."""
+    grade_where, grade_params = _cohort_filter(course, subject, "grades")
+    att_where, att_params = _cohort_filter(course, subject, "attendance")
+    with models.connect_db() as conn:
+        conn.execute("BEGIN")
+        grades = _read_columns(conn, "grades", "grade", grade_where, grade_params)
+        attendance = _read_columns(conn, "attendance", "status IN ('Present', 'Late')", att_where, att_params)
+        students = pd.read_sql_query(f"""
+            SELECT s.id AS student_id, s.name, s.course,
+                   100.0 * (m.present_count + m.late_count)
+                   / NULLIF(m.present_count + m.absent_count + m.late_count + m.excused_count, 0) AS overall_attendance
+            FROM students s
+            LEFT JOIN student_summary m ON m.student_id = s.id
+            {"WHERE s.course = ?" if course else ""}
+        """, conn, params=[course] if course else [])
+    return grades, attendance, students
+
+# --- Statistics (vectorized; no per-row Python) ---
+
+def _run_means(df: pd.DataFrame) -> pd.DataFrame:
+    """Mean and count of `value` per (subject, student) run of a sorted frame."""
+    if df.empty:
+        return pd.DataFrame({'subject': pd.Series([], dtype=str), 'student_id': np.array([], dtype=np.int64),
+                             'mean': np.array([], dtype=np.float64), 'count': np.array([], dtype=np.int64)})
+    codes = df['subject'].cat.codes.to_numpy()
+    student_ids = df['student_id'].to_numpy()
+    values = df['value'].to_numpy()
+    starts = np.concatenate(([0], np.flatnonzero((np.diff(codes) != 0) | (np.diff(student_ids) != 0)) + 1))
+    counts = np.diff(np.append(starts, len(values)))
+    return pd.DataFrame({
+        'subject': df['subject'].cat.categories.to_numpy()[codes[starts]],
+        'student_id': student_ids[starts],
+        'mean': np.add.reduceat(values, starts) / counts,
+        'count': counts,
+    })
+
+def _subject_stats(grades: pd.DataFrame) -> pd.DataFrame:
+    columns = ['subject', 'count', 'students', 'mean', 'std', 'min', 'p25', 'median', 'p75', 'p90', 'max']
+    if grades.empty:
+        return pd.DataFrame(columns=columns)
+    by_subject = grades.groupby('subject', observed=True)['value']
+    stats = by_subject.agg(['count', 'mean', 'std', 'min', 'max'])
+    quantiles = by_subject.quantile(PERCENTILES).unstack()
+    quantiles.columns = ['p25', 'median', 'p75', 'p90']
+    stats = stats.join(quantiles)
+    # Rows are sorted by (subject, student), so a student starts wherever the ID changes
+    codes = grades['subject'].cat.codes.to_numpy()
+    student_ids = grades['student_id'].to_numpy()
+    new_student = np.concatenate(([True], (np.diff(codes) != 0) | (np.diff(student_ids) != 0)))
+    stats['students'] = pd.Series(new_student).groupby(codes).sum().to_numpy()
+    return stats.reset_index()[columns]
+
+def _student_stats(grades, attendance, students, low_grade: float, low_attendance: float) -> pd.DataFrame:
+    per_student = _run_means(grades).rename(columns={'mean': 'average_grade', 'count': 'grade_count'})
+    subject_attendance = _run_means(attendance).drop(columns='count')
+    subject_attendance['mean'] *= 100
+
+    # Subject attendance where it was taken, else the student's overall attendance
+    per_student = per_student.merge(subject_attendance, on=['subject', 'student_id'], how='left') \
+        .merge(students, on='student_id', how='left')
+    per_student['attendance_percentage'] = per_student['mean'].fillna(per_student['overall_attendance'])
+
+    ranking = per_student.groupby('subject')['average_grade']
+    per_student['rank'] = ranking.rank(ascending=False, method='min').astype(np.int64)
+    per_student['percentile'] = ranking.rank(pct=True, method='max') * 100
+    per_student['at_risk'] = (per_student['average_grade'] < low_grade) \
+        & (per_student['attendance_percentage'] < low_attendance)
+
+    columns = ['subject', 'student_id', 'name', 'course', 'average_grade', 'grade_count',
+               'attendance_percentage', 'rank', 'percentile', 'at_risk']
+    return per_student[columns].sort_values(['subject', 'rank'], ignore_index=True)
+
+def cohort_report(course: Optional[str] = None, subject: Optional[str] = None,
+                  low_grade: float = LOW_GRADE_THRESHOLD,
+                  low_attendance: float = LOW_ATTENDANCE_THRESHOLD) -> CohortReport:
+    """Builds class-wide statistics for a course and/or subject (both optional).
+
+    A student is flagged at risk in a subject when their average grade there is
+    below `low_grade` AND their attendance is below `low_attendance` percent.
+    """
+    grades, attendance, students = _load_cohort(course, subject)
+    return CohortReport(
+        course=course,
+        subject=subject,
+        grade_rows=len(grades),
+        subject_stats=_subject_stats(grades),
+        student_stats=_student_stats(grades, attendance, students, low_grade, low_attendance),
+    )
+
+def get_subjects(course: Optional[str] = None) -> List[str]:
+    """Distinct graded subjects, optionally only those taken by a course's students."""
+    where, params = _cohort_filter(course, None, "grades")
+    with models.connect_db() as conn:
+        rows = conn.execute(f"SELECT DISTINCT subject FROM grades {where} ORDER BY subject", params).fetchall()
+    return [row['subject'] for row in rows]
+
+# --- END OF FILE analytics.py ---
@@ -0,0 +1,339 @@
+# --- START OF FILE benchmark.py ---
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, Optional
+import httpx
+import create_db
+import database
+import models
+import main
+
+# Benchmarks models.py and the FastAPI routes against generated databases
+# (create_db.generate_dataset) and reports latency percentiles and throughput
+# as JSON, so runs on different commits can be compared:
+#
+#   python benchmark.py -o before.json
+#   python benchmark.py -o after.json --baseline before.json
+#
+# Databases are generated once per size and cached in --db-dir; every run
+# works on a fresh copy, so writes never leak into the next run.
+
+# Named sizes -> approximate total rows (students + grades + attendance)
+SIZES = {"10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+DEFAULT_SIZES = ["10k", "100k", "1m"]
+# Shape of every generated dataset; only the student count varies with size
+DATASET = {"subjects": 6, "days": 180, "grades_per_subject": 4}
+SUITES = ("models", "api")
+BULK_SIZE = 100 # Records per bulk write
+LOGIN_REQUESTS = 20 # bcrypt at the seeded accounts' cost is slow; cap the login case
+DEFAULT_DB_DIR = os.path.join(tempfile.gettempdir(), "sis-benchmark")
+BENCH_DATE = date(2030, 1, 1) # Writes land after the generated history, so they never conflict
+
+# --- Datasets ---
+
+def students_for_rows(rows: int) -> int:
+    """Student count whose generated dataset has roughly `rows` rows in total."""
+    sessions = sum(1 for i in range(DATASET["subjects"])
+                   for day in create_db._school_days(DATASET["days"], create_db.GENERATOR_END_DATE)
+                   if day.weekday() == i % 5)
+    per_student = 1 + DATASET["subjects"] * DATASET["grades_per_subject"] + sessions
+    return max(1, round(rows / per_student))
+
+def prepare_database(size: str, db_dir: str, seed: int) -> str:
+    """Path of a fresh working copy of the generated database for `size`."""
+    students = students_for_rows(SIZES[size])
+    os.makedirs(db_dir, exist_ok=True)
+    pristine = os.path.join(db_dir, f"bench-{students}-{DATASET['subjects']}-{DATASET['days']}"
+                                    f"-{DATASET['grades_per_subject']}-{seed}.db")
+    if not os.path.exists(pristine):
+        print(f"Generating {size} dataset ({students:,} students) in '{pristine}'...", file=sys.stderr)
+        partial = pristine + ".partial"
+        create_db.generate_dataset(partial, students=students, seed=seed, overwrite=True, **DATASET)
+        os.replace(partial, pristine)
+    working = os.path.join(db_dir, f"run-{size}.db")
+    shutil.copyfile(pristine, working)
+    return working
+
+class Context:
+    """What the cases draw their arguments from, read once per database."""
+
+    def __init__(self, seed: int):
+        with models.connect_db() as conn:
+            self.students = [tuple(row) for row in conn.execute("SELECT id, name FROM students")]
+            self.subjects = [row[0] for row in conn.execute("SELECT DISTINCT subject FROM grades")]
+            self.grade_ids = conn.execute("SELECT MIN(id), MAX(id) FROM grades").fetchone()
+            self.rows = sum(conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                            for table in create_db.BASE_TABLES)
+        self.first_names = sorted({name.split()[0] for _, name in self.students})
+        self.seed = seed
+        self._write_day = 0
+
+    def rng(self, case: str) -> random.Random:
+        return random.Random(f"{self.seed}-{case}")
+
+    def next_write_date(self) -> date:
+        """A date no earlier write used, so inserts never hit the attendance unique key."""
+        self._write_day += 1
+        return BENCH_DATE + timedelta(days=self._write_day)
+
+# --- Measurement ---
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    """Nearest-rank percentile of an ascending list."""
+    index = max(0, min(len(sorted_values) - 1, int(round(q / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+def summarize(size: str, suite: str, name: str, latencies: List[float], wall: float,
+              errors: int, concurrency: int, rows: int) -> Dict:
+    latencies = sorted(latencies)
+    ms = lambda seconds: round(seconds * 1000, 3)
+    return {
+        "size": size,
+        "rows": rows,
+        "suite": suite,
+        "case": name,
+        "requests": len(latencies),
+        "concurrency": concurrency,
+        "errors": errors,
+        "p50_ms": ms(_percentile(latencies, 50)),
+        "p95_ms": ms(_percentile(latencies, 95)),
+        "p99_ms": ms(_percentile(latencies, 99)),
+        "mean_ms": ms(sum(latencies) / len(latencies)),
+        "max_ms": ms(latencies[-1]),
+        "throughput_per_s": round(len(latencies) / wall, 1) if wall else None,
+    }
+
+# --- models.py cases ---
+# Each builder takes the context and returns a zero-argument call for one
+# iteration; a falsy result (the models.py failure convention) counts as an error.
+
+def _random_student(ctx: Context, rng: random.Random) -> int:
+    return rng.choice(ctx.students)[0]
+
+def _grade_records(ctx: Context, rng: random.Random) -> List[Dict]:
+    day = ctx.next_write_date()
+    return [{"student_id": _random_student(ctx, rng), "subject": rng.choice(ctx.subjects),
+             "grade": round(rng.uniform(40, 100), 1), "date_graded": day} for _ in range(BULK_SIZE)]
+
+def _attendance_records(ctx: Context, rng: random.Random) -> List[Dict]:
+    day = ctx.next_write_date()
+    return [{"student_id": student_id, "date": day, "subject": ctx.subjects[0], "status": "Present"}
+            for student_id, _ in rng.sample(ctx.students, min(BULK_SIZE, len(ctx.students)))]
+
+def _bulk_ok(result: models.BulkWriteResult) -> bool:
+    return not result.conflicts
+
+MODEL_CASES = {
+    "list_students": lambda ctx, rng: lambda: models.list_students(
+        limit=50, after=tuple(reversed(rng.choice(ctx.students)))) is not None,
+    "search_students": lambda ctx, rng: lambda: models.search_students(rng.choice(ctx.first_names)[:3]) is not None,
+    "get_student_profile": lambda ctx, rng: lambda: models.get_student_profile(_random_student(ctx, rng)),
+    "get_student_summary": lambda ctx, rng: lambda: models.get_student_summary(_random_student(ctx, rng)),
+    "get_grades_page": lambda ctx, rng: lambda: models.get_grades_by_student_id(
+        _random_student(ctx, rng), limit=50) is not None,
+    "get_leaderboard": lambda ctx, rng: lambda: models.get_leaderboard(limit=10) is not None,
+    "add_grade": lambda ctx, rng: lambda: models.add_grade(
+        _random_student(ctx, rng), rng.choice(ctx.subjects), round(rng.uniform(40, 100), 1), ctx.next_write_date()),
+    "update_grade": lambda ctx, rng: lambda: models.update_grade(
+        rng.randint(*ctx.grade_ids), round(rng.uniform(40, 100), 1)),
+    "add_attendance": lambda ctx, rng: lambda: models.add_attendance(
+        _random_student(ctx, rng), ctx.next_write_date(), rng.choice(ctx.subjects), "Present"),
+    "add_grades_bulk": lambda ctx, rng: lambda: _bulk_ok(models.add_grades_bulk(_grade_records(ctx, rng))),
+    "add_attendance_bulk": lambda ctx, rng: lambda: _bulk_ok(
+        models.add_attendance_bulk(_attendance_records(ctx, rng), upsert=True)),
+    "update_grades_bulk": lambda ctx, rng: lambda: _bulk_ok(models.update_grades_bulk(
+        [{"id": rng.randint(*ctx.grade_ids), "grade": round(rng.uniform(40, 100), 1)} for _ in range(BULK_SIZE)])),
+}
+
+def run_model_case(name: str, ctx: Context, iterations: int, warmup: int):
+    call = MODEL_CASES[name](ctx, ctx.rng(name))
+    for _ in range(warmup):
+        call()
+    latencies, errors = [], 0
+    started = time.perf_counter()
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        ok = call()
+        latencies.append(time.perf_counter() - t0)
+        errors += not ok
+    return latencies, time.perf_counter() - started, errors
+
+# --- API cases (in-process ASGI, no sockets) ---
+# Each builder returns a function that produces (method, url, kwargs) per request.
+
+API_CASES = {
+    "GET /students": lambda ctx, rng: lambda: ("GET", "/students", {"params": {"limit": 50}}),
+    "GET /students/search": lambda ctx, rng: lambda: (
+        "GET", "/students/search", {"params": {"q": rng.choice(ctx.first_names)[:3]}}),
+    "GET /students/{id}/profile": lambda ctx, rng: lambda: (
+        "GET", f"/students/{_random_student(ctx, rng)}/profile", {}),
+    "GET /students/{id}/summary": lambda ctx, rng: lambda: (
+        "GET", f"/students/{_random_student(ctx, rng)}/summary", {}),
+    "GET /students/{id}/grades": lambda ctx, rng: lambda: (
+        "GET", f"/students/{_random_student(ctx, rng)}/grades", {"params": {"limit": 50}}),
+    "GET /leaderboard": lambda ctx, rng: lambda: ("GET", "/leaderboard", {}),
+    "POST /grades": lambda ctx, rng: lambda: ("POST", "/grades", {"json": {
+        "student_id": _random_student(ctx, rng), "subject": rng.choice(ctx.subjects),
+        "grade": round(rng.uniform(40, 100), 1), "date_graded": str(ctx.next_write_date())}}),
+    "POST /attendance": lambda ctx, rng: lambda: ("POST", "/attendance", {"json": {
+        "student_id": _random_student(ctx, rng), "date": str(ctx.next_write_date()),
+        "subject": rng.choice(ctx.subjects), "status": "Present"}}),
+    "POST /grades/bulk": lambda ctx, rng: lambda: ("POST", "/grades/bulk", {"json": {
+        "records": [{**record, "date_graded": str(record["date_graded"])} for record in _grade_records(ctx, rng)]}}),
+    "POST /token": lambda ctx, rng: lambda: ("POST", "/token", {
+        "data": {"username": "admin", "password": "admin123"}}),
+}
+
+async def run_api_case(name: str, ctx: Context, iterations: int, warmup: int, concurrency: int, token: str):
+    next_request = API_CASES[name](ctx, ctx.rng(name))
+    if name == "POST /token":
+        iterations, warmup = min(iterations, LOGIN_REQUESTS), min(warmup, 1)
+    latencies, errors = [], 0
+    remaining = iterations
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark",
+                                 headers={"Authorization": f"Bearer {token}"}, timeout=None) as client:
+        async def send():
+            method, url, kwargs = next_request()
+            t0 = time.perf_counter()
+            response = await client.request(method, url, **kwargs)
+            return time.perf_counter() - t0, response.status_code >= 400
+
+        async def client_loop():
+            nonlocal remaining, errors
+            while remaining > 0:
+                remaining -= 1
+                elapsed, failed = await send()
+                latencies.append(elapsed)
+                errors += failed
+
+        for _ in range(warmup):
+            await send()
+        started = time.perf_counter()
+        await asyncio.gather(*(client_loop() for _ in range(concurrency)))
+        wall = time.perf_counter() - started
+    return latencies, wall, errors
+
+# --- Runner ---
+
+def _select(names, wanted: Optional[List[str]]):
+    return [name for name in names if not wanted or name in wanted]
+
+def run(sizes: List[str], suites: List[str], iterations: int, warmup: int, concurrency: int,
+        db_dir: str, seed: int, cases: Optional[List[str]] = None) -> List[Dict]:
+    results = []
+    token = main.create_access_token({"sub": "admin", "role": "admin"}, expires_delta=timedelta(hours=12))
+    for size in sizes:
+        database.configure_pool(prepare_database(size, db_dir, seed))
+        models.clear_read_cache()
+        ctx = Context(seed)
+        print(f"[{size}] {ctx.rows:,} rows, {len(ctx.students):,} students", file=sys.stderr)
+        if "models" in suites:
+            for name in _select(MODEL_CASES, cases):
+                latencies, wall, errors = run_model_case(name, ctx, iterations, warmup)
+                results.append(summarize(size, "models", name, latencies, wall, errors, 1, ctx.rows))
+                print(f"  models {name}: p50 {results[-1]['p50_ms']} ms", file=sys.stderr)
+        if "api" in suites:
+            for name in _select(API_CASES, cases):
+                latencies, wall, errors = asyncio.run(
+                    run_api_case(name, ctx, iterations, warmup, concurrency, token))
+                results.append(summarize(size, "api", name, latencies, wall, errors, concurrency, ctx.rows))
+                print(f"  api {name}: p50 {results[-1]['p50_ms']} ms, "
+                      f"{results[-1]['throughput_per_s']}/s", file=sys.stderr)
+    database.shutdown_executor()
+    database.close_pool()
+    return results
+
+def environment() -> Dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "commit": commit,
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+def compare(results: List[Dict], baseline: List[Dict]) -> List[str]:
+    """One line per case present in both runs: p50/p95 and throughput change."""
+    previous = {(r["size"], r["suite"], r["case"]): r for r in baseline}
+    lines = []
+    for r in results:
+        old = previous.get((r["size"], r["suite"], r["case"]))
+        if not old:
+            continue
+        change = lambda new, was: f"{(new - was) / was * 100:+.0f}%" if was else "n/a"
+        lines.append(f"{r['size']:>5} {r['suite']:<6} {r['case']:<28} "
+                     f"p50 {old['p50_ms']:.2f}->{r['p50_ms']:.2f} ms ({change(r['p50_ms'], old['p50_ms'])}), "
+                     f"p95 {old['p95_ms']:.2f}->{r['p95_ms']:.2f} ms ({change(r['p95_ms'], old['p95_ms'])}), "
+                     f"throughput {change(r['throughput_per_s'] or 0, old['throughput_per_s'] or 0)}")
+    return lines
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark models.py and the API against generated databases.")
+    parser.add_argument("--sizes", default=",".join(DEFAULT_SIZES),
+                        help=f"comma-separated dataset sizes from: {', '.join(SIZES)}")
+    parser.add_argument("--suites", default=",".join(SUITES), help="comma-separated: models, api")
+    parser.add_argument("--cases", help="comma-separated case names to run (default: all)")
+    parser.add_argument("-n", "--iterations", type=int, default=200, help="measured calls per case")
+    parser.add_argument("--warmup", type=int, default=10, help="unmeasured calls per case")
+    parser.add_argument("-c", "--concurrency", type=int, default=8, help="concurrent API clients")
+    parser.add_argument("--seed", type=int, default=create_db.GENERATOR_DEFAULTS["seed"])
+    parser.add_argument("--db-dir", default=DEFAULT_DB_DIR, help="where generated databases are cached")
+    parser.add_argument("-o", "--output", help="write the JSON report here (default: stdout)")
+    parser.add_argument("--baseline", help="earlier JSON report to compare against")
+    args = parser.parse_args(argv)
+
+    sizes = [size.strip() for size in args.sizes.split(",") if size.strip()]
+    suites = [suite.strip() for suite in args.suites.split(",") if suite.strip()]
+    unknown = [s for s in sizes if s not in SIZES] + [s for s in suites if s not in SUITES]
+    if unknown:
+        parser.error(f"unknown size/suite: {', '.join(unknown)}")
+    cases = [case.strip() for case in args.cases.split(",")] if args.cases else None
+
+    # models.py and create_db report to stdout; keep it clean for the JSON
+    with contextlib.redirect_stdout(sys.stderr):
+        results = run(sizes, suites, args.iterations, args.warmup, args.concurrency, args.db_dir, args.seed, cases)
+    report = {
+        "environment": environment(),
+        "parameters": {"sizes": sizes, "suites": suites, "iterations": args.iterations, "warmup": args.warmup,
+                       "concurrency": args.concurrency, "seed": args.seed, "dataset": DATASET,
+                       "bulk_size": BULK_SIZE, "read_cache_size": models.READ_CACHE_SIZE},
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        for line in compare(results, baseline):
+            print(line, file=sys.stderr)
+
+if __name__ == "__main__":
+    main_cli()
+
+# --- END OF FILE benchmark.py ---
@@ -0,0 +1,148 @@
+# --- START OF FILE charts.py ---
+
+import functools
+import os
+from datetime import date
+from typing import Dict, Optional, Tuple
+import pandas as pd
+import plotly.express as px
+import database
+import models
+
+# Figures are built from a handful of SQL aggregates rather than every record,
+# so a student with years of history still ships a few dozen points to the browser.
+
+# Trend bucket by visible span (days): daily up to ~3 months, weekly up to 2 years, then monthly
+TREND_BUCKETS = [(92, "day"), (730, "week"), (None, "month")]
+_BUCKET_SQL = {
+    "day": "date_graded",
+    "week": "date(date_graded, '-6 days', 'weekday 1')", # Monday on or before the date
+    "month": "strftime('%Y-%m-01', date_graded)",
+}
+_BUCKET_LABELS = {"day": "daily", "week": "weekly", "month": "monthly"}
+
+# Built figure JSON per (student, range), served until grades or attendance change
+CHART_CACHE_SIZE = int(os.environ.get("SIS_CHART_CACHE_SIZE", "512"))
+
+# --- Aggregates (SQL does the reduction) ---
+
+def _range_filter(date_column: str, student_id: int, date_from: Optional[date], date_to: Optional[date]):
+    conditions, params = ["student_id = ?"], [student_id]
+    if date_from:
+        conditions.append(f"{date_column} >= ?")
+        params.append(str(date_from))
+    if date_to:
+        conditions.append(f"{date_column} <= ?")
+        params.append(str(date_to))
+    return " AND ".join(conditions), params
+
+def choose_bucket(first: Optional[str], last: Optional[str]) -> str:
+    """Trend bucket for data spanning first..last (ISO dates)."""
+    if not first or not last:
+        return "day"
+    span = (date.fromisoformat(last) - date.fromisoformat(first)).days
+    for max_days, bucket in TREND_BUCKETS:
+        if max_days is None or span <= max_days:
+            return bucket
+    return "month"
+
+def _subject_means(conn, student_id: int, date_from, date_to) -> pd.DataFrame:
+    where, params = _range_filter("date_graded", student_id, date_from, date_to)
+    return pd.read_sql_query(f"""
+        SELECT subject, AVG(grade) AS average_grade, COUNT(*) AS grade_count
+        FROM grades WHERE {where}
+        GROUP BY subject ORDER BY subject
+    """, conn, params=params)
+
+def _grade_trend(conn, student_id: int, date_from, date_to, bucket: Optional[str]) -> Tuple[pd.DataFrame, str]:
+    where, params = _range_filter("date_graded", student_id, date_from, date_to)
+    if bucket is None:
+        # The visible span is the requested range, narrowed to where grades actually exist
+        first, last = conn.execute(f"SELECT MIN(date_graded), MAX(date_graded) FROM grades WHERE {where}", params).fetchone()
+        bucket = choose_bucket(str(date_from) if date_from else first, str(date_to) if date_to else last)
+    df = pd.read_sql_query(f"""
+        SELECT {_BUCKET_SQL[bucket]} AS period, AVG(grade) AS average_grade,
+               MIN(grade) AS lowest, MAX(grade) AS highest, COUNT(*) AS grade_count
+        FROM grades WHERE {where}
+        GROUP BY period ORDER BY period
+    """, conn, params=params)
+    df['period'] = pd.to_datetime(df['period'])
+    return df, bucket
+
+def _status_counts(conn, student_id: int, date_from, date_to) -> pd.DataFrame:
+    if not date_from and not date_to:
+        # Whole history: the trigger-maintained counters answer without touching attendance
+        row = conn.execute("""
+            SELECT present_count, absent_count, late_count, excused_count
+            FROM student_summary WHERE student_id = ?
+        """, (student_id,)).fetchone()
+        counts = dict(zip(models.ALLOWED_ATTENDANCE_STATUSES, row if row else [0] * 4))
+        df = pd.DataFrame({'status': list(counts), 'count': list(counts.values())})
+        return df[df['count'] > 0].reset_index(drop=True)
+    where, params = _range_filter("date", student_id, date_from, date_to)
+    return pd.read_sql_query(f"""
+        SELECT status, COUNT(*) AS count FROM attendance WHERE {where}
+        GROUP BY status ORDER BY count DESC
+    """, conn, params=params)
+
+def student_chart_data(student_id: int, date_from: Optional[date] = None, date_to: Optional[date] = None,
+                       bucket: Optional[str] = None) -> Dict:
+    """Pre-aggregated chart inputs for one student, read in one snapshot.
+
+    Returns subject_means (subject, average_grade, grade_count), trend (period,
+    average_grade, lowest, highest, grade_count), trend_bucket and
+    status_counts (status, count). `bucket` ("day", "week" or "month")
+    defaults to one suited to the visible range.
+    """
+    if bucket is not None and bucket not in _BUCKET_SQL:
+        raise ValueError(f"Unknown trend bucket '{bucket}'. Choose from: {', '.join(_BUCKET_SQL)}")
+    with models.connect_db() as conn:
+        conn.execute("BEGIN")
+        subject_means = _subject_means(conn, student_id, date_from, date_to)
+        trend, bucket = _grade_trend(conn, student_id, date_from, date_to, bucket)
+        status_counts = _status_counts(conn, student_id, date_from, date_to)
+    return {"subject_means": subject_means, "trend": trend, "trend_bucket": bucket, "status_counts": status_counts}
+
+# --- Figures ---
+
+def _build_figures(data: Dict) -> Dict[str, Optional[str]]:
+    figures = {"grades_bar": None, "grades_trend": None, "attendance_pie": None}
+    if not data["subject_means"].empty:
+        fig_grades_bar = px.bar(data["subject_means"], x='subject', y='average_grade', color='subject',
+                                hover_data=['grade_count'], title="Average Grade by Subject",
+                                labels={'average_grade': 'Average Grade (%)', 'grade_count': 'Grades'})
+        fig_grades_bar.update_layout(xaxis_title="Subject", yaxis_title="Grade (%)", showlegend=False)
+        figures["grades_bar"] = fig_grades_bar.to_json()
+    if not data["trend"].empty:
+        bucket_label = _BUCKET_LABELS[data["trend_bucket"]]
+        fig_grades_trend = px.line(data["trend"], x='period', y='average_grade', markers=True,
+                                   hover_data=['lowest', 'highest', 'grade_count'],
+                                   title=f"Grade Trend ({bucket_label} average)",
+                                   labels={'period': 'Date', 'average_grade': 'Grade (%)', 'grade_count': 'Grades'})
+        fig_grades_trend.update_layout(xaxis_title="Date Graded", yaxis_title="Grade (%)")
+        figures["grades_trend"] = fig_grades_trend.to_json()
+    if not data["status_counts"].empty:
+        fig_attendance_pie = px.pie(data["status_counts"], values='count', names='status', title="Attendance Breakdown", hole=0.3)
+        fig_attendance_pie.update_traces(textposition='inside', textinfo='percent+label')
+        figures["attendance_pie"] = fig_attendance_pie.to_json()
+    return figures
+
+def student_chart_json(student_id: int, date_from: Optional[date] = None,
+                       date_to: Optional[date] = None) -> Dict[str, Optional[str]]:
+    """Plotly figure JSON for the student dashboard (None where there is no data).
+
+    Cached per student and range until a write to grades or attendance.
+    """
+    # The models read cache's change token: any write to either table makes a
+    # new key, and entries for older versions age out of the LRU
+    version = models.data_version(("grades", "attendance"))
+    if version is None:
+        return _build_figures(student_chart_data(student_id, date_from, date_to))
+    return dict(_cached_figures(database.get_pool().db_name, version, student_id, date_from, date_to))
+
+@functools.lru_cache(maxsize=CHART_CACHE_SIZE)
+def _cached_figures(db_name: str, version: Tuple[int, ...], student_id: int,
+                    date_from: Optional[date], date_to: Optional[date]) -> Dict[str, Optional[str]]:
+    return _build_figures(student_chart_data(student_id, date_from, date_to))
+
+# --- END OF FILE charts.py ---
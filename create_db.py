@@ -1,10 +1,303 @@
 # --- START OF FILE create_db.py ---
 
+import argparse
+import random
 import sqlite3
 import os
+import time
 from datetime import date, timedelta
+import database
 
-DB_NAME = "students.db"
+DB_NAME = os.environ.get("SIS_DB_PATH", "students.db")
+
+# --- Base Tables ---
+# Created before any migration runs; everything else (indexes, triggers,
+# derived tables) comes from MIGRATIONS.
+BASE_TABLES = {
+    "students": """
+        CREATE TABLE IF NOT EXISTS students (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            email TEXT UNIQUE NOT NULL,
+            course TEXT NOT NULL
+        )
+    """,
+    "grades": """
+        CREATE TABLE IF NOT EXISTS grades (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            student_id INTEGER NOT NULL,
+            subject TEXT NOT NULL,
+            grade REAL NOT NULL CHECK(grade >= 0 AND grade <= 100), -- Assuming 0-100 scale
+            date_graded TEXT NOT NULL, -- Store as ISO format string YYYY-MM-DD
+            FOREIGN KEY (student_id) REFERENCES students (id) ON DELETE CASCADE
+        )
+    """,
+    "attendance": """
+        CREATE TABLE IF NOT EXISTS attendance (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            student_id INTEGER NOT NULL,
+            date TEXT NOT NULL, -- Store as ISO format string YYYY-MM-DD
+            subject TEXT NOT NULL,
+            status TEXT NOT NULL CHECK(status IN ('Present', 'Absent', 'Late', 'Excused')),
+            FOREIGN KEY (student_id) REFERENCES students (id) ON DELETE CASCADE
+        )
+    """,
+}
+
+# Recomputes student_summary from the base tables (used by migration 5 and the dataset generator)
+STUDENT_SUMMARY_BACKFILL = """
+    -- Backfill from existing rows
+    INSERT OR REPLACE INTO student_summary
+    SELECT s.id,
+           COALESCE(g.grade_count, 0), COALESCE(g.grade_sum, 0), g.grade_min, g.grade_max,
+           COALESCE(a.present_count, 0), COALESCE(a.absent_count, 0),
+           COALESCE(a.late_count, 0), COALESCE(a.excused_count, 0)
+    FROM students s
+    LEFT JOIN (
+        SELECT student_id, COUNT(*) AS grade_count, SUM(grade) AS grade_sum,
+               MIN(grade) AS grade_min, MAX(grade) AS grade_max
+        FROM grades GROUP BY student_id
+    ) g ON g.student_id = s.id
+    LEFT JOIN (
+        SELECT student_id,
+               SUM(status = 'Present') AS present_count, SUM(status = 'Absent') AS absent_count,
+               SUM(status = 'Late') AS late_count, SUM(status = 'Excused') AS excused_count
+        FROM attendance GROUP BY student_id
+    ) a ON a.student_id = s.id;
+    """
+
+# --- Schema Migrations ---
+# Each entry upgrades the schema by one version. PRAGMA user_version records
+# how many have been applied, so existing databases are upgraded in place.
+# Never edit a released entry - append a new one instead.
+MIGRATIONS = [
+    # 1: Indexes for the per-student lookups in models.py
+    """
+    CREATE INDEX IF NOT EXISTS idx_grades_student_date ON grades (student_id, date_graded);
+    CREATE INDEX IF NOT EXISTS idx_attendance_student_date_subject ON attendance (student_id, date, subject);
+    CREATE INDEX IF NOT EXISTS idx_students_name ON students (name);
+    """,
+    # 2: One attendance record per (student, date, subject), enforced so writes can upsert.
+    #    Older databases may hold duplicates; keep the most recent row of each and
+    #    move the others to attendance_duplicates, so nothing is lost unseen.
+    """
+    CREATE TABLE IF NOT EXISTS attendance_duplicates (
+        id INTEGER PRIMARY KEY, -- The removed row's attendance ID
+        student_id INTEGER NOT NULL,
+        date TEXT NOT NULL,
+        subject TEXT NOT NULL,
+        status TEXT NOT NULL,
+        kept_id INTEGER NOT NULL, -- The attendance row kept in its place
+        removed_at TEXT NOT NULL DEFAULT (datetime('now'))
+    );
+    INSERT OR IGNORE INTO attendance_duplicates (id, student_id, date, subject, status, kept_id)
+    SELECT a.id, a.student_id, a.date, a.subject, a.status, k.kept_id
+    FROM attendance a
+    JOIN (
+        SELECT student_id, date, subject, MAX(id) AS kept_id FROM attendance
+        GROUP BY student_id, date, subject HAVING COUNT(*) > 1
+    ) k ON k.student_id = a.student_id AND k.date = a.date AND k.subject = a.subject
+    WHERE a.id <> k.kept_id;
+    DELETE FROM attendance WHERE id IN (SELECT id FROM attendance_duplicates);
+    DROP INDEX IF EXISTS idx_attendance_student_date_subject;
+    CREATE UNIQUE INDEX IF NOT EXISTS uq_attendance_student_date_subject ON attendance (student_id, date, subject);
+    """,
+    # 3: Keyset pagination of the roster by (name, id), optionally within a course.
+    #    NOCASE so name-prefix search is case-insensitive and can still seek.
+    """
+    CREATE INDEX IF NOT EXISTS idx_students_name_nocase ON students (name COLLATE NOCASE);
+    CREATE INDEX IF NOT EXISTS idx_students_course_name ON students (course, name COLLATE NOCASE);
+    """,
+    # 4: Full-text search over students (external content, kept in sync by triggers)
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS students_fts USING fts5(
+        name, email, course,
+        content = 'students', content_rowid = 'id',
+        tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+    );
+    CREATE TRIGGER IF NOT EXISTS students_fts_after_insert AFTER INSERT ON students BEGIN
+        INSERT INTO students_fts (rowid, name, email, course) VALUES (new.id, new.name, new.email, new.course);
+    END;
+    CREATE TRIGGER IF NOT EXISTS students_fts_after_delete AFTER DELETE ON students BEGIN
+        INSERT INTO students_fts (students_fts, rowid, name, email, course) VALUES ('delete', old.id, old.name, old.email, old.course);
+    END;
+    CREATE TRIGGER IF NOT EXISTS students_fts_after_update AFTER UPDATE ON students BEGIN
+        INSERT INTO students_fts (students_fts, rowid, name, email, course) VALUES ('delete', old.id, old.name, old.email, old.course);
+        INSERT INTO students_fts (rowid, name, email, course) VALUES (new.id, new.name, new.email, new.course);
+    END;
+    INSERT INTO students_fts (students_fts) VALUES ('rebuild');
+    """,
+    # 5: Per-student grade/attendance aggregates, maintained incrementally by triggers.
+    #    Min/max are only recomputed when the removed grade was the current extreme.
+    """
+    CREATE TABLE IF NOT EXISTS student_summary (
+        student_id INTEGER PRIMARY KEY,
+        grade_count INTEGER NOT NULL DEFAULT 0,
+        grade_sum REAL NOT NULL DEFAULT 0,
+        grade_min REAL,
+        grade_max REAL,
+        present_count INTEGER NOT NULL DEFAULT 0,
+        absent_count INTEGER NOT NULL DEFAULT 0,
+        late_count INTEGER NOT NULL DEFAULT 0,
+        excused_count INTEGER NOT NULL DEFAULT 0,
+        FOREIGN KEY (student_id) REFERENCES students (id) ON DELETE CASCADE
+    );
+
+    CREATE TRIGGER IF NOT EXISTS student_summary_after_student_insert AFTER INSERT ON students BEGIN
+        INSERT OR IGNORE INTO student_summary (student_id) VALUES (new.id);
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS student_summary_after_grade_insert AFTER INSERT ON grades BEGIN
+        UPDATE student_summary SET
+            grade_count = grade_count + 1,
+            grade_sum = grade_sum + new.grade,
+            grade_min = MIN(COALESCE(grade_min, new.grade), new.grade),
+            grade_max = MAX(COALESCE(grade_max, new.grade), new.grade)
+        WHERE student_id = new.student_id;
+    END;
+    CREATE TRIGGER IF NOT EXISTS student_summary_after_grade_delete AFTER DELETE ON grades BEGIN
+        UPDATE student_summary SET
+            grade_count = grade_count - 1,
+            grade_sum = grade_sum - old.grade,
+            grade_min = CASE WHEN old.grade <= grade_min
+                THEN (SELECT MIN(grade) FROM grades WHERE student_id = old.student_id) ELSE grade_min END,
+            grade_max = CASE WHEN old.grade >= grade_max
+                THEN (SELECT MAX(grade) FROM grades WHERE student_id = old.student_id) ELSE grade_max END
+        WHERE student_id = old.student_id;
+    END;
+    CREATE TRIGGER IF NOT EXISTS student_summary_after_grade_update AFTER UPDATE OF grade, student_id ON grades BEGIN
+        UPDATE student_summary SET
+            grade_count = grade_count - 1,
+            grade_sum = grade_sum - old.grade,
+            grade_min = CASE WHEN old.grade <= grade_min
+                THEN (SELECT MIN(grade) FROM grades WHERE student_id = old.student_id) ELSE grade_min END,
+            grade_max = CASE WHEN old.grade >= grade_max
+                THEN (SELECT MAX(grade) FROM grades WHERE student_id = old.student_id) ELSE grade_max END
+        WHERE student_id = old.student_id;
+        UPDATE student_summary SET
+            grade_count = grade_count + 1,
+            grade_sum = grade_sum + new.grade,
+            grade_min = MIN(COALESCE(grade_min, new.grade), new.grade),
+            grade_max = MAX(COALESCE(grade_max, new.grade), new.grade)
+        WHERE student_id = new.student_id;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS student_summary_after_attendance_insert AFTER INSERT ON attendance BEGIN
+        UPDATE student_summary SET
+            present_count = present_count + (new.status = 'Present'),
+            absent_count = absent_count + (new.status = 'Absent'),
+            late_count = late_count + (new.status = 'Late'),
+            excused_count = excused_count + (new.status = 'Excused')
+        WHERE student_id = new.student_id;
+    END;
+    CREATE TRIGGER IF NOT EXISTS student_summary_after_attendance_delete AFTER DELETE ON attendance BEGIN
+        UPDATE student_summary SET
+            present_count = present_count - (old.status = 'Present'),
+            absent_count = absent_count - (old.status = 'Absent'),
+            late_count = late_count - (old.status = 'Late'),
+            excused_count = excused_count - (old.status = 'Excused')
+        WHERE student_id = old.student_id;
+    END;
+    CREATE TRIGGER IF NOT EXISTS student_summary_after_attendance_update AFTER UPDATE OF status, student_id ON attendance BEGIN
+        UPDATE student_summary SET
+            present_count = present_count - (old.status = 'Present'),
+            absent_count = absent_count - (old.status = 'Absent'),
+            late_count = late_count - (old.status = 'Late'),
+            excused_count = excused_count - (old.status = 'Excused')
+        WHERE student_id = old.student_id;
+        UPDATE student_summary SET
+            present_count = present_count + (new.status = 'Present'),
+            absent_count = absent_count + (new.status = 'Absent'),
+            late_count = late_count + (new.status = 'Late'),
+            excused_count = excused_count + (new.status = 'Excused')
+        WHERE student_id = new.student_id;
+    END;
+
+    """ + STUDENT_SUMMARY_BACKFILL,
+    # 6: Covering indexes for cohort analytics (analytics.py): whole subjects are read
+    #    straight from the index, already grouped by subject and student
+    """
+    CREATE INDEX IF NOT EXISTS idx_grades_subject_student ON grades (subject, student_id, grade);
+    CREATE INDEX IF NOT EXISTS idx_attendance_subject_student ON attendance (subject, student_id, status);
+    """,
+    # 7: Login accounts (replaces the hard-coded users in main.py). Seeded with the
+    #    former default accounts; the hashes are bcrypt of admin123/teacher123/student123.
+    """
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT NOT NULL UNIQUE,
+        hashed_password TEXT NOT NULL,
+        role TEXT NOT NULL CHECK(role IN ('admin', 'teacher', 'student')),
+        student_id INTEGER, -- The student record a 'student' account belongs to
+        FOREIGN KEY (student_id) REFERENCES students (id) ON DELETE SET NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_users_student_id ON users (student_id);
+    INSERT OR IGNORE INTO users (username, hashed_password, role, student_id) VALUES
+        ('admin', '$2b$12$79hTGHr1yWJO8gmNgR0ea.vrjtUlqxW5l1PsTeqzKKhTu9/Pszjba', 'admin', NULL),
+        ('teacher', '$2b$12$9g1R/A/qYsz3RzOaSr4YQOFKMAeLuCaeA0bEqLXbg9agw9P4C44AW', 'teacher', NULL),
+        ('student', '$2b$12$8GeyDLFQ9SJIBpyDNENfZeqD2eRfzr1TI0Mh4z8nKAHOCwfqqZahe', 'student',
+         (SELECT MIN(id) FROM students WHERE name = 'student'));
+    """,
+    # 8: Per-table change counters for the read cache in models.py. Triggers bump
+    #    them in the writing transaction, so writes from any connection or process
+    #    (including raw SQL) invalidate cached reads of that table.
+    """
+    CREATE TABLE IF NOT EXISTS data_versions (
+        name TEXT PRIMARY KEY,
+        version INTEGER NOT NULL DEFAULT 0
+    ) WITHOUT ROWID;
+    INSERT OR IGNORE INTO data_versions (name) VALUES ('students'), ('grades'), ('attendance');
+    """ + "".join(f"""
+    CREATE TRIGGER IF NOT EXISTS data_versions_{table}_after_{event} AFTER {event.upper()} ON {table} BEGIN
+        UPDATE data_versions SET version = version + 1 WHERE name = '{table}';
+    END;""" for table in ("students", "grades", "attendance") for event in ("insert", "update", "delete")),
+    # 9: Revoked login tokens, shared by every API worker process. Keyed by the
+    #    token's SHA-256; rows are purged once the token has expired anyway.
+    #    Its data_versions counter lets workers poll for new revocations cheaply.
+    """
+    CREATE TABLE IF NOT EXISTS revoked_tokens (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, -- Workers read only rows past the last id they saw
+        token_hash TEXT NOT NULL UNIQUE,
+        expires_at REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_revoked_tokens_expires_at ON revoked_tokens (expires_at);
+    INSERT OR IGNORE INTO data_versions (name) VALUES ('revoked_tokens');
+    CREATE TRIGGER IF NOT EXISTS data_versions_revoked_tokens_after_insert AFTER INSERT ON revoked_tokens BEGIN
+        UPDATE data_versions SET version = version + 1 WHERE name = 'revoked_tokens';
+    END;
+    """,
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+def get_schema_version(conn) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def apply_migrations(conn) -> int:
+    """Applies any pending migrations and returns the resulting schema version.
+
+    Each migration runs in its own transaction together with the user_version
+    bump, so an interrupted upgrade never leaves a half-applied step behind.
+    """
+    current_version = get_schema_version(conn)
+    if current_version >= SCHEMA_VERSION:
+        return current_version
+    if conn.in_transaction:
+        conn.commit()
+    for version in range(current_version + 1, SCHEMA_VERSION + 1):
+        print(f"Applying schema migration {version}...")
+        try:
+            conn.executescript(f"BEGIN;\n{MIGRATIONS[version - 1]}\nPRAGMA user_version = {version};\nCOMMIT;")
+        except sqlite3.Error:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+        if version == 2:
+            moved = conn.execute("SELECT COUNT(*) FROM attendance_duplicates").fetchone()[0]
+            if moved:
+                print(f"Warning: {moved} duplicate attendance record(s) were moved to the attendance_duplicates "
+                      "table; review them there (kept_id is the record that was kept).")
+    return SCHEMA_VERSION
 
 def setup_database():
     """Creates/updates the database with students, grades, and attendance."""
@@ -20,45 +313,19 @@ def setup_database():
         conn.execute("PRAGMA foreign_keys = ON")
         cursor = conn.cursor()
         print("Connection successful. Foreign key support enabled.")
+        journal_mode = database.apply_profile(conn, database.get_profile())
+        print(f"Applied '{database.DB_PROFILE}' database profile (journal mode {journal_mode}).")
 
-        # --- Create Students Table (if not exists) ---
-        print("Ensuring 'students' table structure...")
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS students (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL,
-                email TEXT UNIQUE NOT NULL,
-                course TEXT NOT NULL
-            )
-        """)
-
-        # --- Create Grades Table (if not exists) ---
-        print("Ensuring 'grades' table structure...")
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS grades (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                student_id INTEGER NOT NULL,
-                subject TEXT NOT NULL,
-                grade REAL NOT NULL CHECK(grade >= 0 AND grade <= 100), -- Assuming 0-100 scale
-                date_graded TEXT NOT NULL, -- Store as ISO format string YYYY-MM-DD
-                FOREIGN KEY (student_id) REFERENCES students (id) ON DELETE CASCADE
-            )
-        """)
-
-        # --- Create Attendance Table (if not exists) ---
-        print("Ensuring 'attendance' table structure...")
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS attendance (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                student_id INTEGER NOT NULL,
-                date TEXT NOT NULL, -- Store as ISO format string YYYY-MM-DD
-                subject TEXT NOT NULL,
-                status TEXT NOT NULL CHECK(status IN ('Present', 'Absent', 'Late', 'Excused')),
-                FOREIGN KEY (student_id) REFERENCES students (id) ON DELETE CASCADE
-            )
-        """)
+        for table, ddl in BASE_TABLES.items():
+            print(f"Ensuring '{table}' table structure...")
+            cursor.execute(ddl)
         print("All table structures ensured.")
 
+        # --- Upgrade schema (indexes, constraints) ---
+        conn.commit()
+        schema_version = apply_migrations(conn)
+        print(f"Schema is at version {schema_version}.")
+
         # --- Populate Students (if necessary) ---
         print("\nChecking and inserting base student users...")
         initial_students = [
@@ -84,6 +351,8 @@ def setup_database():
         if result:
             student_user_id = result[0]
             print(f"ID for 'student' is: {student_user_id}")
+            # Link the 'student' login account to its student record
+            cursor.execute("UPDATE users SET student_id = ? WHERE username = 'student' AND student_id IS NULL", (student_user_id,))
         else:
             print("WARNING: Could not find user 'student'. Sample grades/attendance might not be linked correctly.")
             # Optionally handle error or exit if 'student' must exist
@@ -160,8 +429,190 @@ def setup_database():
             print("\nDatabase connection closed.")
         print("--- Database Setup Script Finished ---")
 
+# --- Synthetic Dataset (benchmarks and load tests) ---
+# Fixed end date so a given seed and set of flags always produces the same rows
+GENERATOR_END_DATE = date(2025, 6, 30)
+GENERATOR_DEFAULTS = {"students": 1000, "subjects": 6, "days": 180, "grades_per_subject": 4, "seed": 42}
+
+FIRST_NAMES = ["Aarav", "Maya", "Liam", "Priya", "Noah", "Sofia", "Ethan", "Ananya", "Lucas", "Chloe",
+               "Omar", "Isha", "Mateo", "Zara", "Daniel", "Meera", "Leo", "Hannah", "Kabir", "Emma",
+               "Yusuf", "Grace", "Arjun", "Olivia", "Ravi", "Amelia", "Samuel", "Nina", "Vikram", "Lily"]
+LAST_NAMES = ["Sharma", "Smith", "Patel", "Garcia", "Khan", "Johnson", "Iyer", "Brown", "Gupta", "Martin",
+              "Singh", "Lee", "Reddy", "Wilson", "Das", "Lopez", "Nair", "Clark", "Mehta", "Walker"]
+COURSES = ["Computer Science", "Mechanical Engineering", "Business Administration", "Journalism",
+           "Physics", "Mathematics", "Economics", "Biotechnology", "Psychology", "International Relations"]
+SUBJECTS = ["Mathematics", "Physics", "Literature", "History", "Chemistry", "Biology", "Economics",
+            "Computer Science", "Statistics", "Philosophy", "Geography", "Art"]
+
+# Bulk-load settings: no rollback journal or fsync (a failed load is simply rerun),
+# a large page cache, and no CHECK constraints - the generator only emits valid
+# grades and statuses, and evaluating the status IN (...) check triples insert time.
+# Afterwards the database gets the configured profile (database.py), like any other.
+LOAD_PRAGMAS = [
+    "PRAGMA journal_mode = OFF",
+    "PRAGMA ignore_check_constraints = ON",
+    "PRAGMA synchronous = OFF",
+    "PRAGMA locking_mode = EXCLUSIVE",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -262144", # 256 MiB
+]
+RESTORE_PRAGMAS = [
+    "PRAGMA journal_mode = DELETE",
+    "PRAGMA ignore_check_constraints = OFF",
+    "PRAGMA locking_mode = NORMAL",
+]
+
+def _subject_names(count: int) -> list:
+    return [SUBJECTS[i] if i < len(SUBJECTS) else f"Elective {i - len(SUBJECTS) + 1}" for i in range(count)]
+
+def _school_days(days: int, end_date: date) -> list:
+    """Weekdays in the `days` days up to and including end_date, oldest first."""
+    start = end_date - timedelta(days=days - 1)
+    return [start + timedelta(days=i) for i in range(days) if (start + timedelta(days=i)).weekday() < 5]
+
+def _generate_students(rng: random.Random, students: int, profiles: list):
+    """Student rows; also fills `profiles` with each student's (ability, attendance rate)."""
+    for student_id in range(1, students + 1):
+        profiles.append((rng.gauss(72, 10), min(0.99, max(0.5, rng.gauss(0.88, 0.06)))))
+        if student_id == 1:
+            # Linked to the seeded 'student' login account by migration 7
+            yield ("student", "student@example.com", "General Studies")
+            continue
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        yield (f"{first} {last}", f"{first}.{last}.{student_id}@example.edu".lower(), rng.choice(COURSES))
+
+def _generate_grades(rng: random.Random, profiles: list, subjects: list, school_days: list, grades_per_subject: int):
+    difficulty = [rng.uniform(-6, 6) for _ in subjects]
+    day_strings = [day.isoformat() for day in school_days]
+    gauss, randrange = rng.gauss, rng.randrange
+    for student_id, (ability, _) in enumerate(profiles, start=1):
+        for subject, offset in zip(subjects, difficulty):
+            mean = ability + offset
+            for _ in range(grades_per_subject):
+                grade = min(100.0, max(0.0, round((mean + gauss(0, 8)) * 2) / 2))
+                yield (student_id, subject, grade, day_strings[randrange(len(day_strings))])
+
+def _generate_attendance(rng: random.Random, profiles: list, subjects: list, school_days: list):
+    # Each subject meets once a week, on its own weekday, so (student, date, subject) is unique
+    sessions = [(subject, [day.isoformat() for day in school_days if day.weekday() == i % 5])
+                for i, subject in enumerate(subjects)]
+    rand = rng.random
+    for student_id, (_, present_rate) in enumerate(profiles, start=1):
+        late_below = present_rate + (1 - present_rate) * 0.4
+        excused_below = present_rate + (1 - present_rate) * 0.6
+        for subject, days in sessions:
+            for day in days:
+                r = rand()
+                status = ("Present" if r < present_rate else "Late" if r < late_below
+                          else "Excused" if r < excused_below else "Absent")
+                yield (student_id, day, subject, status)
+
+def generate_dataset(db_name: str, students: int = 1000, subjects: int = 6, days: int = 180,
+                     grades_per_subject: int = 4, seed: int = 42, end_date: date = GENERATOR_END_DATE,
+                     overwrite: bool = False) -> dict:
+    """Builds a new database at `db_name` filled with synthetic students, grades and attendance.
+
+    Every student takes `subjects` subjects and gets `grades_per_subject`
+    grades in each, spread over the school days of the `days`-day window
+    ending on `end_date`; each subject meets weekly, giving roughly
+    students * subjects * days / 7 attendance rows. The same arguments always
+    produce the same rows.
+
+    The schema comes from the regular migrations, but indexes and triggers
+    are dropped while rows are bulk-inserted and recreated afterwards, with
+    full-text search and summaries rebuilt in one pass. Returns the row count
+    of each table.
+    """
+    if min(students, subjects, days) < 1 or grades_per_subject < 0:
+        raise ValueError("students, subjects and days must be at least 1; grades_per_subject at least 0")
+    if os.path.exists(db_name):
+        if not overwrite:
+            raise FileExistsError(f"'{db_name}' already exists (pass overwrite=True / --overwrite to replace it)")
+        for suffix in ("", "-journal", "-wal", "-shm"):
+            if os.path.exists(db_name + suffix):
+                os.remove(db_name + suffix)
+
+    subject_names = _subject_names(subjects)
+    school_days = _school_days(days, end_date)
+    profiles = []
+    conn = sqlite3.connect(db_name, isolation_level=None)
+    try:
+        for pragma in LOAD_PRAGMAS:
+            conn.execute(pragma)
+        # Full schema on the empty tables, then set aside every index and trigger
+        # on them: they are rebuilt once over the loaded rows (one sort per index)
+        # instead of being maintained row by row
+        for ddl in BASE_TABLES.values():
+            conn.execute(ddl)
+        apply_migrations(conn)
+        conn.execute("BEGIN")
+        deferred = conn.execute("""
+            SELECT type, name, sql FROM sqlite_master
+            WHERE type IN ('index', 'trigger') AND tbl_name IN ('students', 'grades', 'attendance')
+              AND sql IS NOT NULL
+            ORDER BY type = 'trigger', name
+        """).fetchall()
+        for object_type, name, _ in deferred:
+            conn.execute(f"DROP {object_type.upper()} {name}")
+
+        # Separate generators per table, so changing one flag leaves the other tables' values alone
+        conn.executemany("INSERT INTO students (name, email, course) VALUES (?, ?, ?)",
+                         _generate_students(random.Random(f"{seed}-students"), students, profiles))
+        conn.executemany("INSERT INTO grades (student_id, subject, grade, date_graded) VALUES (?, ?, ?, ?)",
+                         _generate_grades(random.Random(f"{seed}-grades"), profiles, subject_names,
+                                          school_days, grades_per_subject))
+        conn.executemany("INSERT INTO attendance (student_id, date, subject, status) VALUES (?, ?, ?, ?)",
+                         _generate_attendance(random.Random(f"{seed}-attendance"), profiles, subject_names, school_days))
+
+        for _, _, sql in deferred:
+            conn.execute(sql)
+        # What the triggers would have maintained: search index, summaries, the 'student' login link
+        conn.execute("INSERT INTO students_fts (students_fts) VALUES ('rebuild')")
+        conn.execute(STUDENT_SUMMARY_BACKFILL)
+        conn.execute("UPDATE users SET student_id = 1 WHERE username = 'student'")
+        conn.execute("COMMIT")
+
+        for pragma in RESTORE_PRAGMAS:
+            conn.execute(pragma)
+        conn.execute("SELECT COUNT(*) FROM data_versions").fetchone() # Drops the exclusive lock
+        database.apply_profile(conn, database.get_profile())
+        return {table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] for table in BASE_TABLES}
+    finally:
+        conn.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Create or upgrade the database with sample data, or --generate a synthetic one of any size.")
+    parser.add_argument("--generate", action="store_true", help="build a new synthetic dataset instead of the sample data")
+    parser.add_argument("-o", "--output", default=DB_NAME, help=f"database file for --generate (default: {DB_NAME})")
+    parser.add_argument("--students", type=int, default=GENERATOR_DEFAULTS["students"])
+    parser.add_argument("--subjects", type=int, default=GENERATOR_DEFAULTS["subjects"], help="subjects taken by every student")
+    parser.add_argument("--days", type=int, default=GENERATOR_DEFAULTS["days"], help="length of the history in days")
+    parser.add_argument("--grades-per-subject", type=int, default=GENERATOR_DEFAULTS["grades_per_subject"])
+    parser.add_argument("--seed", type=int, default=GENERATOR_DEFAULTS["seed"])
+    parser.add_argument("--end-date", type=date.fromisoformat, default=GENERATOR_END_DATE, help="last day of the history, YYYY-MM-DD")
+    parser.add_argument("--overwrite", action="store_true", help="replace the output file if it exists")
+    args = parser.parse_args(argv)
+
+    if not args.generate:
+        setup_database()
+        print(f"\n'{DB_NAME}' should be ready with student, grades, and attendance data.")
+        print("Make sure you have 'pandas' and 'plotly' installed (`pip install pandas plotly`)")
+        return
+
+    print(f"Generating synthetic dataset in '{args.output}' (seed {args.seed})...")
+    started = time.perf_counter()
+    try:
+        counts = generate_dataset(args.output, args.students, args.subjects, args.days,
+                                  args.grades_per_subject, args.seed, args.end_date, args.overwrite)
+    except (ValueError, FileExistsError, sqlite3.Error) as e:
+        print(f"Error generating dataset: {e}")
+        raise SystemExit(1)
+    elapsed = time.perf_counter() - started
+    total = sum(counts.values())
+    print(", ".join(f"{count:,} {table}" for table, count in counts.items())
+          + f" ({total:,} rows) in {elapsed:.1f}s, {total / elapsed:,.0f} rows/s.")
+
 if __name__ == "__main__":
-    setup_database()
-    print(f"\n'{DB_NAME}' should be ready with student, grades, and attendance data.")
-    print("Make sure you have 'pandas' and 'plotly' installed (`pip install pandas plotly`)")
+    main()
 # --- END OF FILE create_db.py ---
\ No newline at end of file
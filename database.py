@@ -0,0 +1,440 @@
+# --- START OF FILE database.py ---
+
+import os
+import sqlite3
+import threading
+import time
+import atexit
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from queue import LifoQueue, Empty, Full
+
+# --- Configuration ---
+DB_NAME = os.environ.get("SIS_DB_PATH", "students.db")
+POOL_SIZE = int(os.environ.get("SIS_DB_POOL_SIZE", "8"))
+POOL_TIMEOUT = float(os.environ.get("SIS_DB_POOL_TIMEOUT", "10"))
+# Idle connections older than this are pinged before being handed out again
+HEALTH_CHECK_INTERVAL = float(os.environ.get("SIS_DB_HEALTH_CHECK_INTERVAL", "30"))
+# Threads that run blocking SQLite work for async callers (FastAPI). Matching the
+# pool size means a queued call never waits for a connection as well.
+DB_WORKERS = int(os.environ.get("SIS_DB_WORKERS", str(POOL_SIZE)))
+
+# --- Durability / performance profiles ---
+# Applied to every pooled connection and, for the journal mode (which is stored
+# in the file), once when the database is created or first opened. WAL lets
+# readers keep reading their snapshot while a writer commits, so dashboards
+# never wait on a teacher's add_grade; busy_timeout makes writers queue for
+# the write lock instead of failing with "database is locked".
+#   durable  - WAL, fsync on every commit
+#   balanced - WAL, fsync at checkpoints only (a power cut can lose the last
+#              commits, never corrupt the file); the default
+#   fast     - no fsync at all, for benchmarks and throwaway databases
+#   compat   - rollback journal, for filesystems without shared memory (NFS, SMB)
+DB_PROFILES = {
+    "durable": {"journal_mode": "WAL", "synchronous": "FULL", "busy_timeout": 5000, "cache_size": -16384,
+                "mmap_size": 268435456, "temp_store": "MEMORY", "wal_autocheckpoint": 1000},
+    "balanced": {"journal_mode": "WAL", "synchronous": "NORMAL", "busy_timeout": 5000, "cache_size": -65536,
+                 "mmap_size": 268435456, "temp_store": "MEMORY", "wal_autocheckpoint": 4000},
+    "fast": {"journal_mode": "WAL", "synchronous": "OFF", "busy_timeout": 5000, "cache_size": -262144,
+             "mmap_size": 1073741824, "temp_store": "MEMORY", "wal_autocheckpoint": 16000},
+    "compat": {"journal_mode": "DELETE", "synchronous": "FULL", "busy_timeout": 5000, "cache_size": -2000,
+               "mmap_size": 0, "temp_store": "DEFAULT", "wal_autocheckpoint": 1000},
+}
+DB_PROFILE = os.environ.get("SIS_DB_PROFILE", "balanced")
+# Individual settings can be overridden on top of the chosen profile
+_PROFILE_OVERRIDES = {
+    "journal_mode": "SIS_DB_JOURNAL_MODE",
+    "synchronous": "SIS_DB_SYNCHRONOUS",
+    "busy_timeout": "SIS_DB_BUSY_TIMEOUT_MS",
+    "cache_size": "SIS_DB_CACHE_SIZE", # Pages, or -KiB as in PRAGMA cache_size
+    "mmap_size": "SIS_DB_MMAP_SIZE",
+    "temp_store": "SIS_DB_TEMP_STORE",
+    "wal_autocheckpoint": "SIS_DB_WAL_AUTOCHECKPOINT",
+}
+_PROFILE_CHOICES = {
+    "journal_mode": ("WAL", "DELETE", "TRUNCATE", "PERSIST"),
+    "synchronous": ("OFF", "NORMAL", "FULL", "EXTRA"),
+    "temp_store": ("DEFAULT", "FILE", "MEMORY"),
+}
+# Background WAL checkpoints (seconds between runs; 0 disables), and the WAL
+# size above which a checkpoint also truncates the file back to zero
+CHECKPOINT_INTERVAL = float(os.environ.get("SIS_DB_CHECKPOINT_INTERVAL", "30"))
+WAL_TRUNCATE_BYTES = int(os.environ.get("SIS_DB_WAL_TRUNCATE_MB", "64")) * 1024 * 1024
+
+
+def get_profile(name: str = None) -> dict:
+    """The named profile (default SIS_DB_PROFILE) with any SIS_DB_* overrides applied."""
+    name = name or DB_PROFILE
+    if name not in DB_PROFILES:
+        raise ValueError(f"Unknown database profile '{name}'. Choose from: {', '.join(DB_PROFILES)}")
+    profile = dict(DB_PROFILES[name])
+    for key, env in _PROFILE_OVERRIDES.items():
+        if env in os.environ:
+            profile[key] = os.environ[env]
+    for key, value in profile.items():
+        if key in _PROFILE_CHOICES:
+            profile[key] = str(value).upper()
+            if profile[key] not in _PROFILE_CHOICES[key]:
+                raise ValueError(f"Invalid {key} '{value}'. Choose from: {', '.join(_PROFILE_CHOICES[key])}")
+        else:
+            profile[key] = int(value)
+    return profile
+
+def apply_profile(conn: sqlite3.Connection, profile: dict, persistent: bool = True) -> str:
+    """Sets the profile's pragmas on `conn` and returns the journal mode in effect.
+
+    The per-connection settings are always applied. With persistent=True the
+    journal mode is switched as well; it is stored in the database file, so
+    once per database is enough.
+    """
+    conn.execute(f"PRAGMA busy_timeout = {profile['busy_timeout']}")
+    conn.execute(f"PRAGMA synchronous = {profile['synchronous']}")
+    conn.execute(f"PRAGMA cache_size = {profile['cache_size']}")
+    conn.execute(f"PRAGMA mmap_size = {profile['mmap_size']}")
+    conn.execute(f"PRAGMA temp_store = {profile['temp_store']}")
+    conn.execute(f"PRAGMA wal_autocheckpoint = {profile['wal_autocheckpoint']}")
+    if not persistent:
+        return conn.execute("PRAGMA journal_mode").fetchone()[0].upper()
+    journal_mode = conn.execute(f"PRAGMA journal_mode = {profile['journal_mode']}").fetchone()[0].upper()
+    if journal_mode != profile["journal_mode"]:
+        print(f"Warning: could not switch the journal mode to {profile['journal_mode']} (still {journal_mode}).")
+    return journal_mode
+
+
+class Checkpointer:
+    """Background thread that checkpoints the WAL every `interval` seconds.
+
+    SQLite's own auto-checkpoint runs inside whichever commit crosses
+    wal_autocheckpoint pages, and cannot finish while a long reader (an
+    export, a cohort report) holds an old snapshot, so the WAL can keep
+    growing. This runs PASSIVE checkpoints off the request path - they never
+    wait for readers or block writers - and truncates the WAL file once it is
+    fully checkpointed and larger than `truncate_bytes`.
+    """
+
+    def __init__(self, db_name: str, interval: float = CHECKPOINT_INTERVAL,
+                 truncate_bytes: int = WAL_TRUNCATE_BYTES):
+        self.db_name = db_name
+        self.interval = interval
+        self.truncate_bytes = truncate_bytes
+        self._stop = threading.Event()
+        self._thread = None
+        self._conn = None
+        self.runs = 0
+        self.truncations = 0
+        self.last_result = None # (busy, WAL frames, frames checkpointed) from the last run
+        self.last_error = None
+
+    def start(self):
+        if self.interval > 0 and self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="sqlite-checkpoint", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.checkpoint()
+
+    def checkpoint(self, mode: str = "PASSIVE"):
+        """Runs one checkpoint now; returns (busy, WAL frames, frames checkpointed)."""
+        try:
+            if self._conn is None:
+                self._conn = sqlite3.connect(self.db_name, check_same_thread=False, isolation_level=None)
+                # TRUNCATE waits for readers; give up quickly rather than hold back writers
+                self._conn.execute("PRAGMA busy_timeout = 100")
+            result = self._conn.execute(f"PRAGMA wal_checkpoint({mode})").fetchone()
+            busy, log_frames, checkpointed = result
+            if (mode == "PASSIVE" and not busy and log_frames == checkpointed
+                    and os.path.exists(self.db_name + "-wal")
+                    and os.path.getsize(self.db_name + "-wal") >= self.truncate_bytes):
+                result = self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+                self.truncations += not result[0]
+            self.runs += 1
+            self.last_result = tuple(result)
+            self.last_error = None
+            return self.last_result
+        except sqlite3.Error as e:
+            self.last_error = str(e)
+            return None
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval + 1)
+            self._thread = None
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def stats(self) -> dict:
+        return {
+            "runs": self.runs,
+            "truncations": self.truncations,
+            "last_result": self.last_result,
+            "last_error": self.last_error,
+        }
+
+
+class PooledConnection(sqlite3.Connection):
+    """sqlite3 connection that goes back to its pool instead of closing.
+
+    Still a real sqlite3.Connection, so pandas.read_sql_query and friends
+    accept it. `conn.close()` releases it, and `with connect_db() as conn:`
+    commits (or rolls back on error) and then releases it.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._pool = None
+        self._on_loan = False # True from connect() until the first release
+        self._last_used = time.monotonic()
+        self.cursor_factory = sqlite3.Cursor # Swapped for a timed cursor by models.connect_db()
+
+    # Routed through cursor() so conn.execute() uses cursor_factory too
+    def cursor(self, factory=None):
+        return super().cursor(factory or self.cursor_factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def close(self):
+        # Closing twice is harmless: the pool ignores connections not on loan
+        if self._pool is not None:
+            self._pool.release(self)
+        else:
+            super().close()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            super().__exit__(exc_type, exc_value, traceback)
+        finally:
+            self.close()
+        return False
+
+
+class ConnectionPool:
+    """Fixed-size pool of reusable SQLite connections shared across threads."""
+
+    def __init__(self, db_name: str = DB_NAME, size: int = POOL_SIZE, timeout: float = POOL_TIMEOUT,
+                 health_check_interval: float = HEALTH_CHECK_INTERVAL, profile: dict = None):
+        if size < 1:
+            raise ValueError("Pool size must be at least 1")
+        self.db_name = db_name
+        self.size = size
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self.profile = profile or get_profile()
+        self.journal_mode = None # Set by the first connection
+        self._checkpointer = None
+        self._idle = LifoQueue(maxsize=size)
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._all = set()
+        self._closed = False
+        self._schema_checked = False
+
+    # --- Connection lifecycle ---
+    def _open(self) -> PooledConnection:
+        conn = sqlite3.connect(self.db_name, factory=PooledConnection, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA foreign_keys = ON")
+        try:
+            self._apply_profile(conn)
+        except Exception:
+            sqlite3.Connection.close(conn)
+            raise
+        if not self._schema_checked:
+            try:
+                self._upgrade_schema(conn)
+            except Exception:
+                sqlite3.Connection.close(conn)
+                raise
+        conn._pool = self
+        with self._lock:
+            self._all.add(conn)
+        return conn
+
+    def _apply_profile(self, conn: sqlite3.Connection):
+        if self.journal_mode is not None:
+            apply_profile(conn, self.profile, persistent=False)
+            return
+        with self._lock:
+            # The first connection also sets the journal mode, and starts
+            # background checkpoints when that is WAL
+            self.journal_mode = apply_profile(conn, self.profile, persistent=self.journal_mode is None)
+            if self.journal_mode == "WAL" and self._checkpointer is None:
+                self._checkpointer = Checkpointer(self.db_name)
+                self._checkpointer.start()
+
+    def _upgrade_schema(self, conn: sqlite3.Connection):
+        """Brings an existing database up to the latest schema version, once per pool."""
+        from create_db import apply_migrations  # Local import: create_db is also a script
+        with self._lock:
+            if self._schema_checked:
+                return
+            has_tables = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'students'"
+            ).fetchone()
+            if has_tables:
+                apply_migrations(conn)
+            self._schema_checked = True
+
+    def _discard(self, conn: PooledConnection):
+        with self._lock:
+            self._all.discard(conn)
+        conn._pool = None
+        try:
+            sqlite3.Connection.close(conn)
+        except sqlite3.Error:
+            pass
+
+    def _is_healthy(self, conn: PooledConnection) -> bool:
+        if time.monotonic() - conn._last_used < self.health_check_interval:
+            return True
+        try:
+            conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def connect(self) -> PooledConnection:
+        """Borrows a connection, waiting up to `timeout` seconds for a free slot."""
+        if self._closed:
+            raise sqlite3.ProgrammingError("Connection pool has been shut down")
+        if not self._slots.acquire(timeout=self.timeout):
+            raise sqlite3.OperationalError(f"Connection pool exhausted ({self.size} connections in use)")
+        try:
+            while True:
+                try:
+                    conn = self._idle.get_nowait()
+                except Empty:
+                    conn = self._open()
+                    break
+                if self._is_healthy(conn):
+                    break
+                self._discard(conn)
+            conn._on_loan = True
+            return conn
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, conn: PooledConnection):
+        """Returns a borrowed connection; uncommitted work is rolled back.
+
+        Releasing a connection that is not on loan (a second close()) does
+        nothing, so one slot is never freed twice. That only holds until the
+        connection is borrowed again: a stale close() after that releases
+        the new borrower's loan.
+        """
+        with self._lock:
+            if not conn._on_loan:
+                return
+            conn._on_loan = False
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            conn._last_used = time.monotonic()
+            if self._closed:
+                self._discard(conn)
+            else:
+                self._idle.put_nowait(conn)
+        except (sqlite3.Error, Full):
+            self._discard(conn)
+        finally:
+            self._slots.release()
+
+    def close(self):
+        """Closes every idle connection and refuses further borrowing.
+
+        Connections still on loan are closed as they are released.
+        """
+        self._closed = True
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except Empty:
+                break
+            self._discard(conn)
+        if self._checkpointer is not None:
+            self._checkpointer.stop()
+
+    def stats(self) -> dict:
+        with self._lock:
+            open_connections = len(self._all)
+        return {
+            "size": self.size,
+            "open": open_connections,
+            "idle": self._idle.qsize(),
+            "closed": self._closed,
+            "journal_mode": self.journal_mode,
+            "checkpoints": self._checkpointer.stats() if self._checkpointer else None,
+        }
+
+
+# --- Module-level pool used by models.connect_db() ---
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool() -> ConnectionPool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool()
+    return _pool
+
+def configure_pool(db_name: str = DB_NAME, size: int = POOL_SIZE, timeout: float = POOL_TIMEOUT,
+                   health_check_interval: float = HEALTH_CHECK_INTERVAL, profile: dict = None) -> ConnectionPool:
+    """Replaces the shared pool, shutting the previous one down."""
+    global _pool
+    with _pool_lock:
+        old_pool = _pool
+        _pool = ConnectionPool(db_name, size, timeout, health_check_interval, profile)
+    if old_pool is not None:
+        old_pool.close()
+    return _pool
+
+def close_pool():
+    """Shuts down the shared pool. Registered to run at interpreter exit."""
+    global _pool
+    with _pool_lock:
+        old_pool, _pool = _pool, None
+    if old_pool is not None:
+        old_pool.close()
+
+atexit.register(close_pool)
+
+
+# --- Async access (for FastAPI handlers) ---
+_executor = None
+_executor_lock = threading.Lock()
+
+def get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=DB_WORKERS, thread_name_prefix="sqlite")
+    return _executor
+
+async def run_in_db(func, *args, **kwargs):
+    """Awaits a blocking models.py call on the dedicated DB executor.
+
+    The event loop never runs SQLite itself, so slow queries only occupy a
+    DB thread, not every in-flight request.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(), functools.partial(func, *args, **kwargs))
+
+def shutdown_executor():
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=True)
+
+# --- END OF FILE database.py ---
@@ -0,0 +1,162 @@
+# --- START OF FILE export.py ---
+
+import argparse
+import csv
+import io
+import json
+import sys
+import zlib
+from datetime import date
+from typing import Iterator, Optional
+import models
+
+# Rows fetched from the cursor (and encoded) per chunk; memory use is bounded by this
+CHUNK_SIZE = 5000
+FORMATS = ("ndjson", "csv")
+
+# table -> (columns written, SELECT list, date column used for the date range)
+EXPORT_TABLES = {
+    "grades": (
+        ["id", "student_id", "name", "email", "course", "subject", "grade", "date_graded"],
+        "t.id, t.student_id, s.name, s.email, s.course, t.subject, t.grade, t.date_graded",
+        "date_graded",
+    ),
+    "attendance": (
+        ["id", "student_id", "name", "email", "course", "subject", "date", "status"],
+        "t.id, t.student_id, s.name, s.email, s.course, t.subject, t.date, t.status",
+        "date",
+    ),
+}
+
+# --- Query ---
+
+def _export_query(table: str, course: Optional[str], subject: Optional[str],
+                  date_from: Optional[date], date_to: Optional[date]):
+    if table not in EXPORT_TABLES:
+        raise ValueError(f"Unknown export table '{table}'. Choose from: {', '.join(EXPORT_TABLES)}")
+    _, select_list, date_column = EXPORT_TABLES[table]
+    conditions, params = [], []
+    if course:
+        conditions.append("s.course = ?")
+        params.append(course)
+    if subject:
+        conditions.append("t.subject = ?")
+        params.append(subject)
+    if date_from:
+        conditions.append(f"t.{date_column} >= ?")
+        params.append(str(date_from))
+    if date_to:
+        conditions.append(f"t.{date_column} <= ?")
+        params.append(str(date_to))
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    # No ORDER BY: rows come out in whatever index order the filters use, so
+    # SQLite never has to sort (and buffer) the whole result before the first row
+    query = f"""
+        SELECT {select_list}
+        FROM {table} t
+        JOIN students s ON s.id = t.student_id
+        {where}
+    """
+    return query, params
+
+def iter_rows(table: str, course: Optional[str] = None, subject: Optional[str] = None,
+              date_from: Optional[date] = None, date_to: Optional[date] = None,
+              chunk_size: int = CHUNK_SIZE) -> Iterator[list]:
+    """Yields lists of up to `chunk_size` row tuples straight from the cursor.
+
+    The whole export is read inside one transaction, so it is a consistent
+    snapshot even while grades are being written. The pooled connection is
+    held until the generator is exhausted or closed.
+    """
+    query, params = _export_query(table, course, subject, date_from, date_to)
+    with models.connect_db() as conn:
+        conn.execute("BEGIN")
+        cursor = conn.cursor()
+        cursor.row_factory = None # Plain tuples; sqlite3.Row is wasted work here
+        cursor.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield rows
+
+# --- Encoding ---
+
+def _ndjson_chunks(table: str, chunks: Iterator[list]) -> Iterator[bytes]:
+    columns = EXPORT_TABLES[table][0]
+    encode = json.JSONEncoder(ensure_ascii=False, separators=(",", ":")).encode
+    for rows in chunks:
+        yield "".join(encode(dict(zip(columns, row))) + "\n" for row in rows).encode()
+
+def _csv_chunks(table: str, chunks: Iterator[list]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(EXPORT_TABLES[table][0])
+    for rows in chunks:
+        writer.writerows(rows)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():  # Header only: the export matched no rows
+        yield buffer.getvalue().encode()
+
+def _gzip_chunks(chunks: Iterator[bytes], level: int = 6) -> Iterator[bytes]:
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31) # wbits 31 = gzip container
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+def stream_export(table: str, fmt: str = "ndjson", gzip: bool = False, course: Optional[str] = None,
+                  subject: Optional[str] = None, date_from: Optional[date] = None,
+                  date_to: Optional[date] = None, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """Encoded export of `table` ("grades" or "attendance") as a stream of byte chunks.
+
+    `fmt` is "ndjson" (one JSON object per line) or "csv" (with a header row);
+    `gzip=True` compresses the stream. Memory use stays at roughly one chunk.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format '{fmt}'. Choose from: {', '.join(FORMATS)}")
+    # Validates the table and filters now, rather than on the first next()
+    _export_query(table, course, subject, date_from, date_to)
+    rows = iter_rows(table, course, subject, date_from, date_to, chunk_size)
+    chunks = _csv_chunks(table, rows) if fmt == "csv" else _ndjson_chunks(table, rows)
+    return _gzip_chunks(chunks) if gzip else chunks
+
+def export_filename(table: str, fmt: str, gzip: bool) -> str:
+    return f"{table}.{fmt}{'.gz' if gzip else ''}"
+
+# --- Command line ---
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stream grades or attendance out of the database as NDJSON or CSV.")
+    parser.add_argument("table", choices=list(EXPORT_TABLES))
+    parser.add_argument("-f", "--format", choices=FORMATS, default="ndjson", dest="fmt")
+    parser.add_argument("-z", "--gzip", action="store_true", help="gzip-compress the output")
+    parser.add_argument("-o", "--output", help="output file (default: stdout)")
+    parser.add_argument("--course")
+    parser.add_argument("--subject")
+    parser.add_argument("--from", dest="date_from", type=date.fromisoformat, help="first date, YYYY-MM-DD")
+    parser.add_argument("--to", dest="date_to", type=date.fromisoformat, help="last date, YYYY-MM-DD")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    args = parser.parse_args(argv)
+
+    chunks = stream_export(args.table, args.fmt, args.gzip, args.course, args.subject,
+                           args.date_from, args.date_to, args.chunk_size)
+    out = open(args.output, "wb") if args.output else sys.stdout.buffer
+    try:
+        written = 0
+        for chunk in chunks:
+            out.write(chunk)
+            written += len(chunk)
+    finally:
+        if args.output:
+            out.close()
+    if args.output:
+        print(f"Wrote {written:,} bytes to '{args.output}'.", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
+
+# --- END OF FILE export.py ---
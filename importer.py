@@ -0,0 +1,304 @@
+# --- START OF FILE importer.py ---
+
+import argparse
+import csv
+import gzip
+import io
+import itertools
+import json
+import sys
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+from pydantic import BaseModel, TypeAdapter, ValidationError
+import models
+
+# Rows validated and written per transaction
+CHUNK_SIZE = 50000
+# Page cache for the import connection (KiB). Index pages of a large grades
+# table stop fitting in SQLite's 2 MB default, and every insert then misses.
+IMPORT_CACHE_KB = 262144
+FORMATS = ("csv", "ndjson")
+IMPORT_KINDS = {
+    "students": models.StudentImport,
+    "grades": models.GradeImport,
+    "attendance": models.AttendanceImport,
+}
+REJECT_COLUMNS = ["line", "reason", "row"]
+
+class ImportReport(BaseModel):
+    kind: str
+    read: int = 0
+    written: int = 0
+    rejected: int = 0
+    seconds: float = 0.0
+    reject_path: Optional[str] = None # Only set when something was rejected
+    rejects_url: Optional[str] = None # Set by POST /import/{kind}: where an admin downloads the reject report
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.read / self.seconds if self.seconds else 0.0
+
+# --- Reading (streamed; one chunk in memory at a time) ---
+
+def detect_format(filename: str) -> str:
+    name = filename.lower()
+    if name.endswith(".gz"):
+        name = name[:-3]
+    if name.endswith(".csv"):
+        return "csv"
+    if name.endswith((".ndjson", ".jsonl", ".json")):
+        return "ndjson"
+    raise ValueError(f"Cannot tell the format of '{filename}'; pass csv or ndjson explicitly")
+
+def _read_rows(stream: io.TextIOBase, fmt: str) -> Iterator[Tuple[int, Dict]]:
+    """Yields (line number, raw row) pairs. Empty CSV cells count as missing."""
+    if fmt == "csv":
+        reader = csv.reader(stream)
+        header = next(reader, [])
+        for row in reader:
+            yield reader.line_num, {key: value for key, value in zip(header, row) if value != ""}
+    else:
+        for line_number, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError as e:
+                row = {"_error": f"Invalid JSON: {e.msg}", "_raw": line.rstrip("\n")}
+            if not isinstance(row, dict):
+                row = {"_error": "Expected a JSON object", "_raw": line.rstrip("\n")}
+            yield line_number, row
+
+def _chunks(rows: Iterator, size: int) -> Iterator[List]:
+    while True:
+        chunk = list(itertools.islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+# --- Validation ---
+
+def _error_text(error: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(map(str, e['loc'])) or 'row'}: {e['msg']}" for e in error.errors())
+
+_LIST_ADAPTERS = {}
+
+def _validate(model, chunk, rejects):
+    """Validated models for the chunk; failures are appended to `rejects`."""
+    rows = []
+    for line_number, row in chunk:
+        if "_error" in row:
+            rejects.append((line_number, row["_error"], row["_raw"]))
+        else:
+            rows.append((line_number, row))
+    # Fast path: validating the whole list in one call is about twice as quick
+    adapter = _LIST_ADAPTERS.get(model) or _LIST_ADAPTERS.setdefault(model, TypeAdapter(List[model]))
+    try:
+        records = adapter.validate_python([row for _, row in rows])
+        return [(line_number, row, record) for (line_number, row), record in zip(rows, records)]
+    except ValidationError:
+        pass # Some row is bad; validate one by one to find which
+
+    valid = []
+    for line_number, row in rows:
+        try:
+            valid.append((line_number, row, model.model_validate(row)))
+        except ValidationError as e:
+            rejects.append((line_number, _error_text(e), row))
+    return valid
+
+# --- Writing (one large transaction per chunk) ---
+
+# Inserts keep their row-level triggers (create_db.py migrations 4, 5 and 8):
+# FTS, student_summary and data_versions stay exact for every concurrent
+# reader and writer, and no chunk changes the schema, which would invalidate
+# the prepared statements of every pooled connection.
+
+def _load_email_map(conn) -> Dict[str, int]:
+    return {email: student_id for email, student_id in conn.execute("SELECT email, id FROM students")}
+
+def _write_students(conn, valid, email_ids: Dict[str, int], rejects) -> int:
+    rows = []
+    for line_number, raw, student in valid:
+        if student.email in email_ids:
+            rejects.append((line_number, f"Student with email {student.email} already exists", raw))
+            continue
+        email_ids[student.email] = None # Placeholder; also rejects repeats within the file
+        rows.append((student.name, student.email, student.course))
+    last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM students").fetchone()[0]
+    conn.executemany("INSERT INTO students (name, email, course) VALUES (?, ?, ?)", rows)
+    # AUTOINCREMENT ids only grow, and the write lock is held, so these are exactly the new rows
+    email_ids.update(conn.execute("SELECT email, id FROM students WHERE id > ?", (last_id,)))
+    return len(rows)
+
+def _resolve_students(valid, email_ids: Dict[str, int], known_ids: set, rejects):
+    """Pairs each valid row with its student id, rejecting rows for unknown students."""
+    resolved = []
+    for line_number, raw, record in valid:
+        if record.student_id is not None:
+            student_id = record.student_id if record.student_id in known_ids else None
+        else:
+            student_id = email_ids.get(record.email)
+        if student_id is None:
+            rejects.append((line_number, f"Unknown student {record.student_id or record.email}", raw))
+        else:
+            resolved.append((line_number, raw, record, student_id))
+    return resolved
+
+def _write_grades(conn, resolved) -> int:
+    # Student order keeps the (student_id, date) index and summary updates on neighbouring pages
+    rows = sorted((student_id, record.subject, record.grade, record.date_graded.isoformat())
+                  for _, _, record, student_id in resolved)
+    conn.executemany("INSERT INTO grades (student_id, subject, grade, date_graded) VALUES (?, ?, ?, ?)", rows)
+    return len(rows)
+
+def _write_attendance(conn, resolved, rejects, upsert: bool) -> int:
+    if upsert:
+        # Sorted on the key only: the sort is stable, so a later row for the same record still wins
+        rows = sorted(((student_id, record.date.isoformat(), record.subject, record.status)
+                       for _, _, record, student_id in resolved), key=lambda row: row[:3])
+        models.write_attendance_rows(conn, rows, upsert=True)
+        return len(resolved)
+
+    # Stage the chunk in a temp table so existing records are found with one indexed join
+    staged, seen = [], set()
+    for position, (line_number, raw, record, student_id) in enumerate(resolved):
+        key = (student_id, record.date.isoformat(), record.subject)
+        if key in seen:
+            rejects.append((line_number, f"Duplicate of an earlier row for {record.subject} on {key[1]}", raw))
+            continue
+        seen.add(key)
+        staged.append((position, *key, record.status))
+    conn.execute("""
+        CREATE TEMP TABLE IF NOT EXISTS import_attendance (
+            position INTEGER PRIMARY KEY, student_id INTEGER, date TEXT, subject TEXT, status TEXT
+        )
+    """)
+    conn.execute("DELETE FROM import_attendance")
+    conn.executemany("INSERT INTO import_attendance VALUES (?, ?, ?, ?, ?)", staged)
+    existing = conn.execute("""
+        SELECT i.position FROM import_attendance i
+        WHERE EXISTS (SELECT 1 FROM attendance a
+                      WHERE a.student_id = i.student_id AND a.date = i.date AND a.subject = i.subject)
+    """).fetchall()
+    for (position,) in existing:
+        line_number, raw, record, _ = resolved[position]
+        rejects.append((line_number, f"Attendance already recorded for {record.subject} on {record.date.isoformat()}", raw))
+    cursor = conn.execute("""
+        INSERT INTO attendance (student_id, date, subject, status)
+        SELECT student_id, date, subject, status FROM import_attendance
+        ORDER BY student_id, date, subject
+        ON CONFLICT (student_id, date, subject) DO NOTHING
+    """)
+    conn.execute("DELETE FROM import_attendance")
+    return cursor.rowcount
+
+# --- Entry points ---
+
+def import_stream(kind: str, stream: io.TextIOBase, fmt: str, reject_path: str,
+                  upsert: bool = False, chunk_size: int = CHUNK_SIZE) -> ImportReport:
+    """Imports students, grades or attendance rows from a text stream.
+
+    Rows are validated against the models.py import models and written in
+    transactions of `chunk_size` rows. Grade and attendance rows may name their
+    student by email, resolved through an in-memory email -> id map. Rejected
+    rows are written to `reject_path` as CSV (line, reason, row); a chunk that
+    fails as a whole is rolled back and all its rows are rejected.
+    """
+    if kind not in IMPORT_KINDS:
+        raise ValueError(f"Unknown import kind '{kind}'. Choose from: {', '.join(IMPORT_KINDS)}")
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown import format '{fmt}'. Choose from: {', '.join(FORMATS)}")
+    report = ImportReport(kind=kind)
+    started = time.perf_counter()
+    reject_file, reject_writer = None, None
+
+    try:
+        with models.connect_db() as conn:
+            default_cache = conn.execute("PRAGMA cache_size").fetchone()[0]
+            conn.execute(f"PRAGMA cache_size = -{IMPORT_CACHE_KB}")
+            email_ids = _load_email_map(conn)
+            known_ids = set(email_ids.values())
+            conn.commit()
+            try:
+                for chunk in _chunks(_read_rows(stream, fmt), chunk_size):
+                    report.read += len(chunk)
+                    rejects = []
+                    valid = _validate(IMPORT_KINDS[kind], chunk, rejects)
+                    try:
+                        conn.execute("BEGIN IMMEDIATE")
+                        if kind == "students":
+                            written = _write_students(conn, valid, email_ids, rejects)
+                        else:
+                            resolved = _resolve_students(valid, email_ids, known_ids, rejects)
+                            if kind == "grades":
+                                written = _write_grades(conn, resolved)
+                            else:
+                                written = _write_attendance(conn, resolved, rejects, upsert)
+                        conn.commit()
+                        report.written += written
+                        if kind == "students":
+                            known_ids.update(student_id for student_id in email_ids.values() if student_id)
+                    except Exception as e:
+                        conn.rollback()
+                        print(f"Error importing {kind} rows {chunk[0][0]}-{chunk[-1][0]}: {e}")
+                        if kind == "students":  # Forget the emails of the rolled-back rows
+                            email_ids = _load_email_map(conn)
+                            conn.commit()
+                        rejects = [(line_number, f"Batch failed: {e}", raw) for line_number, raw in chunk]
+
+                    if rejects:
+                        if reject_writer is None:
+                            reject_file = open(reject_path, "w", newline="", encoding="utf-8")
+                            reject_writer = csv.writer(reject_file)
+                            reject_writer.writerow(REJECT_COLUMNS)
+                            report.reject_path = reject_path
+                        rejects.sort(key=lambda reject: reject[0])
+                        reject_writer.writerows((line_number, reason, raw if isinstance(raw, str) else json.dumps(raw))
+                                                for line_number, reason, raw in rejects)
+                        report.rejected += len(rejects)
+            finally:
+                # The connection goes back to the pool; don't leave it holding a 256 MB cache
+                conn.execute(f"PRAGMA cache_size = {default_cache}")
+    finally:
+        if reject_file:
+            reject_file.close()
+        report.seconds = time.perf_counter() - started
+    return report
+
+def open_text(binary, filename: str = "") -> io.TextIOBase:
+    """Wraps a binary file object for import_stream, gunzipping '.gz' names on the fly."""
+    if filename.lower().endswith(".gz"):
+        binary = gzip.GzipFile(fileobj=binary, mode="rb")
+    return io.TextIOWrapper(binary, encoding="utf-8", newline="")
+
+def import_file(kind: str, path: str, fmt: Optional[str] = None, reject_path: Optional[str] = None,
+                upsert: bool = False, chunk_size: int = CHUNK_SIZE) -> ImportReport:
+    """Imports a CSV or NDJSON file (optionally .gz). Rejects go to '<path>.rejects.csv' by default."""
+    fmt = fmt or detect_format(path)
+    with open(path, "rb") as binary:
+        return import_stream(kind, open_text(binary, path), fmt, reject_path or f"{path}.rejects.csv", upsert, chunk_size)
+
+# --- Command line ---
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk-load students, grades or attendance from CSV or NDJSON.")
+    parser.add_argument("kind", choices=list(IMPORT_KINDS))
+    parser.add_argument("path", help="input file; .gz is decompressed on the fly")
+    parser.add_argument("-f", "--format", choices=FORMATS, dest="fmt", help="default: from the file extension")
+    parser.add_argument("-r", "--rejects", help="reject report (default: <path>.rejects.csv)")
+    parser.add_argument("--upsert", action="store_true", help="attendance: overwrite existing records")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    args = parser.parse_args(argv)
+
+    report = import_file(args.kind, args.path, args.fmt, args.rejects, args.upsert, args.chunk_size)
+    print(f"Read {report.read:,} {report.kind} rows, wrote {report.written:,}, rejected {report.rejected:,} "
+          f"in {report.seconds:.2f}s ({report.rows_per_second:,.0f} rows/s).")
+    if report.reject_path:
+        print(f"Rejected rows are listed in '{report.reject_path}'.")
+    return 1 if report.rejected else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
+
+# --- END OF FILE importer.py ---
@@ -1,11 +1,83 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, File, HTTPException, Path, Query, UploadFile, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from fastapi.middleware.cors import CORSMiddleware
-from datetime import datetime, timedelta
-from jose import JWTError, jwt
+from fastapi.responses import FileResponse, PlainTextResponse, Response, StreamingResponse
+from datetime import date, datetime, timedelta
+from jose import ExpiredSignatureError, JWTError, jwt
 from passlib.context import CryptContext
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+import asyncio
+import os
+import secrets
+import threading
+import time
+from token_cache import TokenCache, token_digest
+from typing import Optional
+import pandas as pd
+import database
+from database import run_in_db
+import metrics
+import models
+import query_stats
+import charts
+import export
+import importer
+import tempfile
+import uuid
 
-app = FastAPI()
+# bcrypt work factor for new hashes (existing hashes keep the cost they were made with)
+BCRYPT_ROUNDS = int(os.environ.get("BCRYPT_ROUNDS", "12"))
+# Threads for password hashing/verification. bcrypt releases the GIL, so this scales with cores.
+AUTH_WORKERS = int(os.environ.get("AUTH_WORKERS", str(os.cpu_count() or 4)))
+
+# How long a looked-up account is reused before re-reading the users table
+USER_CACHE_TTL = float(os.environ.get("USER_CACHE_TTL", "60"))
+
+# Verified tokens kept in memory so repeat requests skip the signature check
+TOKEN_CACHE_SIZE = int(os.environ.get("TOKEN_CACHE_SIZE", "10000"))
+
+# Logouts are shared through the revoked_tokens table, so with several uvicorn
+# workers a token revoked in one stops working in the others within this many
+# seconds: that is how often each worker polls for new revocations
+REVOCATION_POLL_INTERVAL = float(os.environ.get("SIS_REVOCATION_POLL_INTERVAL", "1"))
+
+# Bearer token a Prometheus scraper can present to GET /metrics; admins can
+# always read it with their own login token. Unset means admins only.
+METRICS_TOKEN = os.environ.get("SIS_METRICS_TOKEN", "")
+
+# Where POST /import/{kind} writes its reject reports
+IMPORT_REJECTS_DIR = os.environ.get("SIS_IMPORT_REJECTS_DIR", tempfile.gettempdir())
+
+# Keeps bcrypt off the event loop: at most AUTH_WORKERS verifications run at once.
+# Created on first use and dropped at shutdown, so a restarted app gets a fresh one.
+_auth_executor = None
+_auth_executor_lock = threading.Lock()
+
+def get_auth_executor() -> ThreadPoolExecutor:
+    global _auth_executor
+    if _auth_executor is None:
+        with _auth_executor_lock:
+            if _auth_executor is None:
+                _auth_executor = ThreadPoolExecutor(max_workers=AUTH_WORKERS, thread_name_prefix="bcrypt")
+    return _auth_executor
+
+def shutdown_auth_executor():
+    global _auth_executor
+    with _auth_executor_lock:
+        executor, _auth_executor = _auth_executor, None
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    shutdown_auth_executor()
+    models.close_write_queue()
+    database.shutdown_executor()
+    database.close_pool()
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -14,32 +86,39 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Added last so it is outermost: times everything, including CORS handling
+app.add_middleware(metrics.MetricsMiddleware)
 
 SECRET_KEY = "your_secret_key_here"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
+token_cache = TokenCache(maxsize=TOKEN_CACHE_SIZE)
 
-# Sample users database with admin, teacher, and student
-users_db = {
-    "admin": {
-        "username": "admin",
-        "role": "admin",
-        "hashed_password": pwd_context.hash("admin123")
-    },
-    "teacher": {
-        "username": "teacher",
-        "role": "teacher",
-        "hashed_password": pwd_context.hash("teacher123")
-    },
-    "student": {
-        "username": "student",
-        "role": "student",
-        "hashed_password": pwd_context.hash("student123")
-    }
-}
+# --- User store (users table in students.db, see create_db.py) ---
+_user_cache = {} # username -> (user, cached_at)
+_user_cache_lock = threading.Lock()
+
+def get_user(username: str):
+    """Looks up a login account, reusing recent lookups for USER_CACHE_TTL seconds."""
+    now = time.monotonic()
+    with _user_cache_lock:
+        cached = _user_cache.get(username)
+    if cached and now - cached[1] < USER_CACHE_TTL:
+        return cached[0]
+    user = models.get_user_by_username(username)
+    with _user_cache_lock:
+        if user:
+            _user_cache[username] = (user, now)
+        else:
+            _user_cache.pop(username, None) # Unknown names are not cached
+    return user
+
+def invalidate_user(username: str):
+    with _user_cache_lock:
+        _user_cache.pop(username, None)
 
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
@@ -48,36 +127,95 @@ def get_password_hash(password):
     return pwd_context.hash(password)
 
 def authenticate_user(username: str, password: str):
-    user = users_db.get(username)
+    started = time.perf_counter()
+    user = get_user(username)
     if not user or not verify_password(password, user["hashed_password"]):
+        metrics.AUTHENTICATE_DURATION.observe(("failure",), time.perf_counter() - started)
         return False
+    metrics.AUTHENTICATE_DURATION.observe(("success",), time.perf_counter() - started)
     return user
 
+async def authenticate_user_async(username: str, password: str):
+    """Runs authenticate_user on the bcrypt pool so other requests keep being served."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_auth_executor(), authenticate_user, username, password)
+
 def create_access_token(data: dict, expires_delta: timedelta = None):
     to_encode = data.copy()
     expire = datetime.utcnow() + (expires_delta or timedelta(minutes=15))
-    to_encode.update({"exp": expire})
+    # A unique jti keeps two logins in the same second from sharing a token (and a revocation)
+    to_encode.update({"exp": expire, "jti": to_encode.get("jti") or uuid.uuid4().hex})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
+# Revocations from any worker already applied to token_cache
+_revocations = {"version": None, "last_id": 0, "checked_at": float("-inf")}
+_revocations_lock = threading.Lock()
+
+def sync_revocations():
+    """Applies revocations recorded by any worker since the last sync; one PRAGMA when there are none."""
+    version = models.data_version(("revoked_tokens",))
+    with _revocations_lock:
+        if version == _revocations["version"]:
+            return
+        last_id = _revocations["last_id"]
+    rows = models.get_revoked_tokens(after_id=last_id)
+    token_cache.revoke_digests({digest: expires_at for _, digest, expires_at in rows})
+    with _revocations_lock:
+        _revocations["version"] = version
+        _revocations["last_id"] = max([_revocations["last_id"]] + [row[0] for row in rows])
+
 async def get_current_user(token: str = Depends(oauth2_scheme)):
     credentials_exception = HTTPException(
         status_code=401,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+    if time.monotonic() - _revocations["checked_at"] >= REVOCATION_POLL_INTERVAL:
+        _revocations["checked_at"] = time.monotonic()
+        try:
+            await run_in_db(sync_revocations)
+        except Exception as e:
+            print(f"Error reading revoked tokens: {e}")
+    started = time.perf_counter()
+    cached_user = token_cache.get(token)
+    if cached_user is not None:
+        metrics.CURRENT_USER_DURATION.observe(("cache_hit",), time.perf_counter() - started)
+        return cached_user
+    if token_cache.is_revoked(token):
+        _token_rejected("revoked", started)
+        raise credentials_exception
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username = payload.get("sub")
         role = payload.get("role")
         if username is None or role is None:
+            _token_rejected("missing_claims", started)
             raise credentials_exception
-        return {"username": username, "role": role}
-    except JWTError:
+        user = {"username": username, "role": role}
+        token_cache.put(token, user, expires_at=payload["exp"])
+        metrics.CURRENT_USER_DURATION.observe(("decoded",), time.perf_counter() - started)
+        return user
+    except JWTError as e:
+        _token_rejected("expired" if isinstance(e, ExpiredSignatureError) else "invalid", started)
         raise credentials_exception
 
+def _token_rejected(reason: str, started: float):
+    metrics.TOKEN_FAILURES.inc((reason,))
+    metrics.CURRENT_USER_DURATION.observe(("rejected",), time.perf_counter() - started)
+
+def revoke_token(token: str) -> bool:
+    """Invalidates a token before its expiry. Returns False if it was not valid anyway."""
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return False
+    token_cache.revoke(token, expires_at=payload["exp"])
+    models.add_revoked_token(token_digest(token), payload["exp"]) # For the other workers
+    return True
+
 @app.post("/token")
 async def login(form_data: OAuth2PasswordRequestForm = Depends()):
-    user = authenticate_user(form_data.username, form_data.password)
+    user = await authenticate_user_async(form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=400,
@@ -91,6 +229,33 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends()):
     )
     return {"access_token": access_token, "token_type": "bearer"}
 
+@app.post("/logout")
+async def logout(token: str = Depends(oauth2_scheme), current_user: dict = Depends(get_current_user)):
+    await run_in_db(revoke_token, token)
+    return {"message": f"Logged out {current_user['username']}"}
+
+@app.get("/auth/token-cache")
+async def token_cache_stats(current_user: dict = Depends(get_current_user)):
+    if current_user["role"] != "admin":
+        raise HTTPException(status_code=403, detail="Admins only")
+    return token_cache.stats()
+
+@app.post("/users", status_code=201)
+async def create_user(new_user: models.UserCreate, current_user: dict = Depends(get_current_user)):
+    if current_user["role"] != "admin":
+        raise HTTPException(status_code=403, detail="Admins only")
+    if new_user.role not in ("admin", "teacher", "student"):
+        raise HTTPException(status_code=422, detail="Role must be admin, teacher or student")
+    if new_user.student_id is not None and not await run_in_db(models.get_student_details_by_id, new_user.student_id):
+        raise HTTPException(status_code=422, detail=f"Student {new_user.student_id} not found")
+    loop = asyncio.get_running_loop()
+    hashed_password = await loop.run_in_executor(get_auth_executor(), get_password_hash, new_user.password)
+    created = await run_in_db(models.add_user, new_user.username, hashed_password, new_user.role, new_user.student_id)
+    if not created:
+        raise HTTPException(status_code=409, detail=f"User '{new_user.username}' already exists")
+    invalidate_user(new_user.username)
+    return {"username": new_user.username, "role": new_user.role, "student_id": new_user.student_id}
+
 @app.get("/dashboard")
 async def dashboard(current_user: dict = Depends(get_current_user)):
     return {
@@ -114,3 +279,265 @@ async def student_only(current_user: dict = Depends(get_current_user)):
     if current_user["role"] != "student":
         raise HTTPException(status_code=403, detail="Students only")
     return {"message": "This is a protected student-only route."}
+
+# --- Data API (students, grades, attendance) ---
+# Every models.py call goes through run_in_db, so SQLite never runs on the event loop.
+
+def require_role(*roles: str):
+    """Dependency: the current user, provided their role is one of `roles`."""
+    async def checker(current_user: dict = Depends(get_current_user)):
+        if current_user["role"] not in roles:
+            raise HTTPException(status_code=403, detail=f"Requires role: {', '.join(roles)}")
+        return current_user
+    return checker
+
+staff_only = require_role("admin", "teacher")
+
+async def check_student_access(student_id: int, current_user: dict):
+    """Staff may read any student; a student only their own record."""
+    if current_user["role"] in ("admin", "teacher"):
+        return
+    account = await run_in_db(get_user, current_user["username"])
+    if not account or account.get("student_id") != student_id:
+        raise HTTPException(status_code=403, detail="Students may only view their own records")
+
+def frame_records(df: pd.DataFrame) -> list:
+    """DataFrame -> JSON-ready list of dicts, with dates as YYYY-MM-DD."""
+    if df.empty:
+        return []
+    df = df.copy()
+    for column in df.select_dtypes(include="datetime").columns:
+        df[column] = df[column].dt.strftime("%Y-%m-%d")
+    return df.to_dict(orient="records")
+
+# --- Metrics (Prometheus) ---
+def _runtime_metric_lines() -> list:
+    """Pool, cache, write queue and per-statement SQL figures, collected at scrape time."""
+    pool = database.get_pool().stats()
+    read_cache = models.read_cache_stats()
+    tokens = token_cache.stats()
+    sql = query_stats.collector.snapshot()
+    lines = metrics.gauge_lines("sis_db_pool_connections", "Pooled SQLite connections by state.",
+                                {"open": pool["open"], "idle": pool["idle"], "size": pool["size"]}, labelname="state")
+    lines += metrics.gauge_lines("sis_read_cache", "Read cache counters (models.py).",
+                                 {key: read_cache[key] for key in ("size", "hits", "misses", "evictions")}, labelname="stat")
+    lines += metrics.gauge_lines("sis_token_cache", "Verified-token cache counters.",
+                                 {key: tokens[key] for key in ("size", "hits", "misses", "evictions", "revoked")}, labelname="stat")
+    writes = models.write_queue_stats()
+    lines += metrics.gauge_lines("sis_write_queue", "Write-behind queue counters (SIS_WRITE_BEHIND).",
+                                 {key: writes[key] for key in ("pending", "submitted", "written", "conflicts",
+                                                               "failed", "rejected", "timeouts", "batches")}, labelname="stat")
+    lines += metrics.gauge_lines("sis_sql_slow_queries", "Statements slower than the slow-query threshold.",
+                                 {"total": query_stats.collector.stats()["slow"]}, labelname="stat")
+    lines += ["# HELP sis_sql_statement_duration_seconds SQL statement latency by calling function (sampled).",
+              "# TYPE sis_sql_statement_duration_seconds histogram"]
+    for statement in sql:
+        lines += metrics.histogram_lines("sis_sql_statement_duration_seconds", ("caller", "statement"),
+                                         (statement["caller"], statement["sql"][:120]),
+                                         statement["buckets"].items(), statement["total_ms"] / 1000)
+    return lines
+
+async def metrics_access(token: str = Depends(oauth2_scheme)):
+    """Dependency: the SIS_METRICS_TOKEN scrape token, or an admin's login token."""
+    if METRICS_TOKEN and secrets.compare_digest(token.encode(), METRICS_TOKEN.encode()):
+        return
+    current_user = await get_current_user(token)
+    if current_user["role"] != "admin":
+        raise HTTPException(status_code=403, detail="Requires role: admin")
+
+@app.get("/metrics", include_in_schema=False, dependencies=[Depends(metrics_access)])
+async def prometheus_metrics():
+    return PlainTextResponse(metrics.render(_runtime_metric_lines()), media_type=metrics.CONTENT_TYPE)
+
+@app.get("/stats/sql")
+async def sql_stats(current_user: dict = Depends(require_role("admin"))):
+    """Per-statement query latency and the slow-query log with plans."""
+    return await run_in_db(models.sql_stats) # Reading the log can EXPLAIN new slow statements
+
+@app.get("/students")
+async def list_students(limit: int = Query(50, ge=1, le=500), after_name: Optional[str] = None,
+                        after_id: Optional[int] = None, course: Optional[str] = None,
+                        name_prefix: Optional[str] = None, current_user: dict = Depends(staff_only)):
+    after = (after_name, after_id) if after_name is not None and after_id is not None else None
+    page = await run_in_db(models.list_students, limit=limit, after=after, course=course, name_prefix=name_prefix)
+    next_page = {"after_name": page.next_after[0], "after_id": page.next_after[1]} if page.next_after else None
+    return {"students": page.students, "next": next_page}
+
+@app.get("/students/search")
+async def search_students(q: str, limit: int = Query(20, ge=1, le=200), course: Optional[str] = None,
+                          current_user: dict = Depends(staff_only)):
+    return await run_in_db(models.search_students, q, limit=limit, course=course)
+
+@app.post("/students", status_code=201)
+async def add_student(student: models.StudentCreate, current_user: dict = Depends(require_role("admin"))):
+    if not await run_in_db(models.add_student, student.name, student.email, student.course):
+        raise HTTPException(status_code=409, detail=f"Could not add student; email '{student.email}' may already exist")
+    return student
+
+@app.delete("/students/{student_id}", status_code=204)
+async def delete_student(student_id: int, current_user: dict = Depends(require_role("admin"))):
+    if not await run_in_db(models.delete_student, student_id):
+        raise HTTPException(status_code=404, detail="Student not found")
+
+@app.get("/students/{student_id}/profile")
+async def student_profile(student_id: int, current_user: dict = Depends(get_current_user)):
+    await check_student_access(student_id, current_user)
+    profile = await run_in_db(models.get_student_profile, student_id)
+    if not profile:
+        raise HTTPException(status_code=404, detail="Student not found")
+    return {
+        **profile.model_dump(exclude={"grades", "attendance"}),
+        "grades": frame_records(profile.grades),
+        "attendance": frame_records(profile.attendance),
+    }
+
+@app.get("/students/{student_id}/summary")
+async def student_summary(student_id: int, current_user: dict = Depends(get_current_user)):
+    await check_student_access(student_id, current_user)
+    summary = await run_in_db(models.get_student_summary, student_id)
+    if not summary:
+        raise HTTPException(status_code=404, detail="Student not found")
+    return summary
+
+@app.get("/students/{student_id}/charts")
+async def student_charts(student_id: int, date_from: Optional[date] = None, date_to: Optional[date] = None,
+                         current_user: dict = Depends(get_current_user)):
+    """Dashboard figures as plotly JSON (null where there is no data)."""
+    await check_student_access(student_id, current_user)
+    figures = await run_in_db(charts.student_chart_json, student_id, date_from, date_to)
+    # The cached figures are already JSON; splice them in rather than re-encoding
+    body = ",".join(f'"{name}":{figure or "null"}' for name, figure in figures.items())
+    return Response(content="{" + body + "}", media_type="application/json")
+
+@app.get("/students/{student_id}/grades")
+async def student_grades(student_id: int, date_from: Optional[date] = None, date_to: Optional[date] = None,
+                         limit: Optional[int] = Query(None, ge=1, le=1000), offset: int = Query(0, ge=0),
+                         current_user: dict = Depends(get_current_user)):
+    await check_student_access(student_id, current_user)
+    return frame_records(await run_in_db(models.get_grades_by_student_id, student_id, date_from, date_to, limit, offset))
+
+@app.get("/students/{student_id}/attendance")
+async def student_attendance(student_id: int, date_from: Optional[date] = None, date_to: Optional[date] = None,
+                             limit: Optional[int] = Query(None, ge=1, le=1000), offset: int = Query(0, ge=0),
+                             current_user: dict = Depends(get_current_user)):
+    await check_student_access(student_id, current_user)
+    return frame_records(await run_in_db(models.get_attendance_by_student_id, student_id, date_from, date_to, limit, offset))
+
+@app.get("/leaderboard")
+async def leaderboard(limit: int = Query(10, ge=1, le=500), course: Optional[str] = None,
+                      by: str = Query("average_grade", pattern="^(average_grade|attendance_percentage)$"),
+                      current_user: dict = Depends(staff_only)):
+    return await run_in_db(models.get_leaderboard, limit=limit, course=course, by=by)
+
+async def queued_write(future) -> bool:
+    """Awaits a write-behind Future without holding a DB worker thread; True once committed."""
+    try:
+        outcome = await asyncio.wait_for(asyncio.wrap_future(future), models.WRITE_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=503, detail="Write not committed in time; it may still be applied")
+    if outcome.status == "failed":
+        raise HTTPException(status_code=503, detail=f"Write not committed: {outcome.reason}")
+    return outcome.ok
+
+@app.post("/grades", status_code=201)
+async def add_grade(grade: models.GradeCreate, current_user: dict = Depends(staff_only)):
+    if models.WRITE_BEHIND:
+        added = await queued_write(models.submit_grade(grade.student_id, grade.subject, grade.grade, grade.date_graded))
+    else:
+        added = await run_in_db(models.add_grade, grade.student_id, grade.subject, grade.grade, grade.date_graded)
+    if not added:
+        raise HTTPException(status_code=400, detail="Could not add grade; check the student ID")
+    return grade
+
+@app.put("/grades/{grade_id}")
+async def update_grade(grade_id: int, update: models.GradeUpdate, current_user: dict = Depends(staff_only)):
+    if not await run_in_db(models.update_grade, grade_id, update.grade):
+        raise HTTPException(status_code=404, detail="Grade not found")
+    return {"id": grade_id, "grade": update.grade}
+
+@app.post("/grades/bulk", response_model=models.BulkWriteResult)
+async def add_grades_bulk(batch: models.GradesBulk, current_user: dict = Depends(staff_only)):
+    return await run_in_db(models.add_grades_bulk, [record.model_dump() for record in batch.records])
+
+@app.post("/attendance", status_code=201)
+async def add_attendance(record: models.AttendanceCreate, upsert: bool = False,
+                         current_user: dict = Depends(staff_only)):
+    if models.WRITE_BEHIND:
+        added = await queued_write(models.submit_attendance(record.student_id, record.date, record.subject,
+                                                            record.status, upsert=upsert))
+    else:
+        added = await run_in_db(models.add_attendance, record.student_id, record.date, record.subject,
+                                record.status, upsert=upsert)
+    if not added:
+        raise HTTPException(status_code=409, detail="Attendance already recorded for this date and subject, or invalid status")
+    return record
+
+@app.put("/attendance/{attendance_id}")
+async def update_attendance(attendance_id: int, update: models.AttendanceUpdate, current_user: dict = Depends(staff_only)):
+    if not await run_in_db(models.update_attendance, attendance_id, update.status):
+        raise HTTPException(status_code=404, detail="Attendance record not found, or invalid status")
+    return {"id": attendance_id, "status": update.status}
+
+@app.post("/attendance/bulk", response_model=models.BulkWriteResult)
+async def add_attendance_bulk(batch: models.AttendanceBulk, current_user: dict = Depends(staff_only)):
+    records = [record.model_dump() for record in batch.records]
+    return await run_in_db(models.add_attendance_bulk, records, upsert=batch.upsert)
+
+# --- Export (streamed; see export.py) ---
+
+async def _stream_in_db(chunks):
+    """Pulls each chunk of a blocking export generator on the DB executor."""
+    try:
+        while True:
+            chunk = await run_in_db(next, chunks, None)
+            if chunk is None:
+                break
+            yield chunk
+    finally:
+        # Client went away or the export finished: release the cursor's connection
+        await run_in_db(chunks.close)
+
+@app.get("/export/{table}")
+async def export_table(table: str, format: str = Query("ndjson", pattern="^(ndjson|csv)$"), gzip: bool = False,
+                       course: Optional[str] = None, subject: Optional[str] = None,
+                       date_from: Optional[date] = None, date_to: Optional[date] = None,
+                       current_user: dict = Depends(staff_only)):
+    if table not in export.EXPORT_TABLES:
+        raise HTTPException(status_code=404, detail=f"Unknown export '{table}'")
+    chunks = export.stream_export(table, format, gzip, course, subject, date_from, date_to)
+    media_type = "application/gzip" if gzip else ("text/csv" if format == "csv" else "application/x-ndjson")
+    filename = export.export_filename(table, format, gzip)
+    return StreamingResponse(_stream_in_db(chunks), media_type=media_type,
+                             headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+# --- Bulk import (see importer.py) ---
+
+@app.post("/import/{kind}", response_model=importer.ImportReport, response_model_exclude={"reject_path"})
+async def import_rows(kind: str, file: UploadFile = File(...), format: Optional[str] = Query(None, pattern="^(csv|ndjson)$"),
+                      upsert: bool = False, current_user: dict = Depends(require_role("admin"))):
+    """Loads an uploaded CSV/NDJSON file (optionally .gz); see importer.import_stream."""
+    if kind not in importer.IMPORT_KINDS:
+        raise HTTPException(status_code=404, detail=f"Unknown import '{kind}'")
+    try:
+        fmt = format or importer.detect_format(file.filename or "")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # The upload is already spooled to a temp file, so the import streams from disk
+    report_id = f"{kind}-{uuid.uuid4().hex}"
+    stream = importer.open_text(file.file, file.filename or "")
+    report = await run_in_db(importer.import_stream, kind, stream, fmt, _reject_report_path(report_id), upsert)
+    if report.reject_path:
+        report.rejects_url = f"/import/rejects/{report_id}"
+    return report
+
+def _reject_report_path(report_id: str) -> str:
+    return os.path.join(IMPORT_REJECTS_DIR, f"{report_id}.rejects.csv")
+
+@app.get("/import/rejects/{report_id}")
+async def import_rejects(report_id: str = Path(..., pattern="^(students|grades|attendance)-[0-9a-f]{32}$"),
+                         current_user: dict = Depends(require_role("admin"))):
+    """The reject report (line, reason, row) of an earlier import, as CSV."""
+    path = _reject_report_path(report_id)
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Reject report not found")
+    return FileResponse(path, media_type="text/csv", filename=f"{report_id}.rejects.csv")
@@ -0,0 +1,184 @@
+# --- START OF FILE metrics.py ---
+
+import bisect
+import threading
+import time
+from typing import Dict, Iterable, List, Tuple
+
+# Minimal Prometheus instruments plus the ASGI middleware main.py installs.
+# Recording is a dict lookup, a bisect and a few additions under a lock, so
+# it costs a few microseconds per request and can stay on at peak load.
+
+# Request latency buckets (seconds); the last bucket is +Inf
+HTTP_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# bcrypt verification sits in the 50 ms - 1 s range at production cost factors
+AUTH_BUCKETS = (0.00001, 0.0001, 0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _number(value) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()):
+        self.name, self.help, self.labelnames = name, help_text, labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels: Tuple = (), amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = list(self._values.items())
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        lines += [f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}" for labels, value in values]
+        return lines
+
+
+class Gauge:
+    def __init__(self, name: str, help_text: str):
+        self.name, self.help = name, help_text
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1):
+        with self._lock:
+            self.value -= amount
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge", f"{self.name} {_number(self.value)}"]
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = (), buckets: Tuple[float, ...] = HTTP_BUCKETS):
+        self.name, self.help, self.labelnames, self.buckets = name, help_text, labelnames, buckets
+        self._series = {} # labels -> [per-bucket counts (last is +Inf), sum]
+        self._lock = threading.Lock()
+
+    def observe(self, labels: Tuple, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def render(self) -> List[str]:
+        with self._lock:
+            series = [(labels, list(counts), total) for labels, (counts, total) in self._series.items()]
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, counts, total in series:
+            lines += histogram_lines(self.name, self.labelnames, labels,
+                                     zip([*self.buckets, "+Inf"], _cumulative(counts)), total)
+        return lines
+
+
+def _cumulative(counts: Iterable[int]) -> List[int]:
+    result, running = [], 0
+    for count in counts:
+        running += count
+        result.append(running)
+    return result
+
+def histogram_lines(name: str, labelnames: Tuple[str, ...], labels: Tuple,
+                    cumulative_buckets: Iterable[Tuple], total: float) -> List[str]:
+    """Sample lines of one histogram series from (upper bound, cumulative count) pairs."""
+    lines, count = [], 0
+    for bound, count in cumulative_buckets:
+        le = "+Inf" if bound == "+Inf" else _number(float(bound))
+        bucket_labels = _labels(labelnames, labels, 'le="' + le + '"')
+        lines.append(f"{name}_bucket{bucket_labels} {count}")
+    lines.append(f"{name}_sum{_labels(labelnames, labels)} {_number(float(total))}")
+    lines.append(f"{name}_count{_labels(labelnames, labels)} {count}")
+    return lines
+
+def gauge_lines(name: str, help_text: str, samples: Dict[str, float], labelname: str = None) -> List[str]:
+    """A gauge family from a stats dict: one sample, or one per key when `labelname` is given."""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+    for key, value in samples.items():
+        labels = _labels((labelname,), (key,)) if labelname else ""
+        lines.append(f"{name}{labels} {_number(float(value))}")
+    return lines
+
+
+# --- HTTP ---
+HTTP_REQUESTS = Counter("sis_http_requests_total", "HTTP requests by route and status.", ("method", "route", "status"))
+HTTP_DURATION = Histogram("sis_http_request_duration_seconds", "HTTP request latency, including streaming the body.",
+                          ("method", "route"))
+HTTP_IN_FLIGHT = Gauge("sis_http_requests_in_flight", "HTTP requests currently being served.")
+
+# --- Auth ---
+AUTHENTICATE_DURATION = Histogram("sis_auth_authenticate_seconds",
+                                  "authenticate_user time (user lookup + bcrypt verify) by result.",
+                                  ("result",), AUTH_BUCKETS)
+CURRENT_USER_DURATION = Histogram("sis_auth_current_user_seconds",
+                                  "get_current_user time by outcome (cache_hit, decoded, rejected).",
+                                  ("outcome",), AUTH_BUCKETS)
+TOKEN_FAILURES = Counter("sis_auth_token_failures_total", "Rejected bearer tokens by reason.", ("reason",))
+
+INSTRUMENTS = [HTTP_REQUESTS, HTTP_DURATION, HTTP_IN_FLIGHT, AUTHENTICATE_DURATION, CURRENT_USER_DURATION, TOKEN_FAILURES]
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware: per-route latency and status counts, plus in-flight requests.
+
+    Routes are labelled with their path template (`/students/{student_id}/grades`),
+    read from the scope after routing, so label cardinality stays bounded;
+    requests that match no route share the label "unmatched".
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status_code = 500 # Reported if the app fails before starting a response
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            HTTP_IN_FLIGHT.dec()
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            HTTP_DURATION.observe((scope["method"], path), elapsed)
+            HTTP_REQUESTS.inc((scope["method"], path, str(status_code)))
+
+
+def render(extra_lines: Iterable[str] = ()) -> str:
+    """All instruments, plus any caller-collected families, in Prometheus text format."""
+    lines = []
+    for instrument in INSTRUMENTS:
+        lines += instrument.render()
+    lines += extra_lines
+    return "\n".join(lines) + "\n"
+
+# --- END OF FILE metrics.py ---
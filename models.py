@@ -1,10 +1,19 @@
 # --- START OF FILE models.py ---
 
-from pydantic import BaseModel
-from typing import Optional, List, Dict
+from pydantic import BaseModel, ConfigDict, Field, field_validator, model_validator
+from typing import Callable, Optional, List, Dict, Tuple
+from concurrent.futures import Future
+import atexit
+import os
 import sqlite3
+import time
 import pandas as pd
 from datetime import date
+import database
+import query_stats
+from read_cache import ReadCache
+from write_queue import WriteOutcome, WriteQueue
+import write_queue
 
 # --- Pydantic Models (keep as is) ---
 class User(BaseModel):
@@ -15,6 +24,18 @@ class User(BaseModel):
 class UserInDB(User):
     hashed_password: str
 
+class UserCreate(User):
+    student_id: Optional[int] = None # Required link for 'student' accounts
+
+    @model_validator(mode="after")
+    def _student_link_matches_role(self):
+        # A student account without a record fails every access check; staff accounts have none
+        if self.role == "student" and self.student_id is None:
+            raise ValueError("student_id is required for student accounts")
+        if self.role != "student" and self.student_id is not None:
+            raise ValueError("student_id is only allowed for student accounts")
+        return self
+
 class UserLogin(BaseModel):
     username: str
     password: str
@@ -27,197 +48,890 @@ class TokenData(BaseModel):
     username: Optional[str] = None
     role: Optional[str] = None
 
+# --- API request bodies ---
+class StudentCreate(BaseModel):
+    name: str
+    email: str
+    course: str
+
+class GradeCreate(BaseModel):
+    student_id: int
+    subject: str
+    grade: float = Field(ge=0, le=100)
+    date_graded: date
+
+class GradeUpdate(BaseModel):
+    grade: float = Field(ge=0, le=100)
+
+class AttendanceCreate(BaseModel):
+    student_id: int
+    date: date
+    subject: str
+    status: str
+
+class AttendanceUpdate(BaseModel):
+    status: str
+
+class GradesBulk(BaseModel):
+    records: List[GradeCreate]
+
+class AttendanceBulk(BaseModel):
+    records: List[AttendanceCreate]
+    upsert: bool = False # Overwrite existing records (corrected roster)
+
+# --- Bulk import rows (see importer.py) ---
+# Grade and attendance rows name their student by student_id or by email.
+class StudentImport(BaseModel):
+    name: str = Field(min_length=1)
+    email: str = Field(min_length=3)
+    course: str = Field(min_length=1)
+
+class _StudentRef(BaseModel):
+    student_id: Optional[int] = None
+    email: Optional[str] = None
+
+    @model_validator(mode="after")
+    def _has_student(self):
+        if self.student_id is None and not self.email:
+            raise ValueError("Either student_id or email is required")
+        return self
+
+class GradeImport(_StudentRef):
+    subject: str = Field(min_length=1)
+    grade: float = Field(ge=0, le=100)
+    date_graded: date
+
+class AttendanceImport(_StudentRef):
+    date: date
+    subject: str = Field(min_length=1)
+    status: str
+
+    @field_validator("status")
+    @classmethod
+    def _known_status(cls, value):
+        if value not in ALLOWED_ATTENDANCE_STATUSES:
+            raise ValueError(f"Must be one of {ALLOWED_ATTENDANCE_STATUSES}")
+        return value
+
+class RowConflict(BaseModel):
+    index: int # Position of the rejected row in the submitted batch
+    student_id: Optional[int] = None
+    reason: str
+
+class BulkWriteResult(BaseModel):
+    written: int = 0
+    conflicts: List[RowConflict] = []
+
+    @property
+    def ok(self) -> bool:
+        return not self.conflicts
+
+class StudentPage(BaseModel):
+    students: List[Dict]
+    # Pass as `after` to fetch the next page; None on the last page
+    next_after: Optional[Tuple[str, int]] = None
+
+class StudentProfile(BaseModel):
+    """Everything a profile page shows, read from one consistent snapshot."""
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    id: int
+    name: str
+    email: str
+    course: str
+    grades: pd.DataFrame # Same columns as get_grades_by_student_id
+    attendance: pd.DataFrame # Same columns as get_attendance_by_student_id
+    grade_count: int = 0
+    average_grade: Optional[float] = None # None when no grades are recorded
+    attendance_count: int = 0
+    attendance_percentage: Optional[float] = None # Present or Late, as % of all records
+
 # --- Database Connection ---
 def connect_db():
-    conn = sqlite3.connect("students.db")
-    conn.row_factory = sqlite3.Row
-    conn.execute("PRAGMA foreign_keys = ON")
+    """Borrows a pooled connection (see database.py).
+
+    Use as `with connect_db() as conn:` - the block commits on success, rolls
+    back on error and hands the connection back to the pool. Calling
+    `conn.close()` also returns it to the pool rather than closing it.
+
+    Statements run on it are timed per calling function (see query_stats.py).
+    """
+    conn = database.get_pool().connect()
+    conn.cursor_factory = query_stats.cursor_factory
     return conn
 
+def sql_stats() -> Dict:
+    """Per-statement latency stats and the slow-query log (see query_stats.py)."""
+    return {**query_stats.collector.stats(), "statements": query_stats.collector.snapshot(),
+            "slow_queries": query_stats.collector.slow_queries()}
+
+# --- Read Cache ---
+# Roster and per-student reads are served from memory until a write touches
+# the tables they read (see read_cache.py). Callers get copies, so mutating a
+# returned DataFrame or dict never changes the cached one.
+READ_CACHE_SIZE = int(os.environ.get("SIS_READ_CACHE_SIZE", "256"))
+_read_cache = ReadCache(maxsize=READ_CACHE_SIZE)
+
+def _cached(key, tables, loader):
+    return _read_cache.get_or_load(database.get_pool().db_name, key, tables, loader)
+
+def data_version(tables: Tuple[str, ...] = ("students", "grades", "attendance")) -> Optional[Tuple[int, ...]]:
+    """Cheap change token for `tables`: differs after any committed write to them.
+
+    Usually a single PRAGMA. None when the schema predates data_versions.
+    """
+    versions = _read_cache.table_versions(database.get_pool().db_name)
+    return tuple(versions.get(table) for table in tables) if versions is not None else None
+
+def read_cache_stats() -> Dict:
+    return _read_cache.stats()
+
+def clear_read_cache():
+    _read_cache.clear()
+
+# --- User Accounts (login) ---
+def get_user_by_username(username: str) -> Optional[Dict]:
+    """Gets a login account (username, role, hashed_password, student_id) by username."""
+    with connect_db() as conn:
+        row = conn.execute("""
+            SELECT username, role, hashed_password, student_id FROM users WHERE username = ?
+        """, (username,)).fetchone()
+    return dict(row) if row else None
+
+def add_user(username: str, hashed_password: str, role: str, student_id: Optional[int] = None) -> bool:
+    """Adds a login account. The password must already be hashed (see main.get_password_hash)."""
+    try:
+        with connect_db() as conn:
+            conn.execute("""
+                INSERT INTO users (username, hashed_password, role, student_id)
+                VALUES (?, ?, ?, ?)
+            """, (username, hashed_password, role, student_id))
+        return True
+    except sqlite3.IntegrityError as e:
+        print(f"Error: Could not add user '{username}': {e}")
+        return False
+    except Exception as e:
+        print(f"An error occurred adding user: {e}")
+        return False
+
+# --- Revoked Tokens (shared by every API worker) ---
+def add_revoked_token(token_hash: str, expires_at: float) -> bool:
+    """Records a revoked token by digest, purging revocations of tokens that have expired."""
+    try:
+        with connect_db() as conn:
+            conn.execute("DELETE FROM revoked_tokens WHERE expires_at <= ?", (time.time(),))
+            conn.execute("""
+                INSERT INTO revoked_tokens (token_hash, expires_at) VALUES (?, ?)
+                ON CONFLICT (token_hash) DO NOTHING
+            """, (token_hash, expires_at))
+        return True
+    except Exception as e:
+        print(f"Error recording revoked token: {e}")
+        return False
+
+def get_revoked_tokens(after_id: int = 0) -> List[Tuple[int, str, float]]:
+    """(id, token_hash, expires_at) of unexpired revocations recorded after `after_id`, oldest first."""
+    with connect_db() as conn:
+        rows = conn.execute("""
+            SELECT id, token_hash, expires_at FROM revoked_tokens
+            WHERE id > ? AND expires_at > ? ORDER BY id
+        """, (after_id, time.time())).fetchall()
+    return [tuple(row) for row in rows]
+
 # --- Student Management Functions (Admin) ---
 def get_all_students() -> List[Dict]:
     """Gets basic details for all students."""
-    conn = connect_db()
-    cursor = conn.cursor()
-    cursor.execute("SELECT id, name, email, course FROM students ORDER BY name")
-    rows = cursor.fetchall()
-    conn.close()
-    return [dict(row) for row in rows]
+    def load():
+        with connect_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT id, name, email, course FROM students ORDER BY name")
+            return [dict(row) for row in cursor.fetchall()]
+    return [dict(student) for student in _cached(("all_students",), ("students",), load)]
+
+def list_students(limit: int = 50, after: Optional[Tuple[str, int]] = None,
+                  course: Optional[str] = None, name_prefix: Optional[str] = None) -> StudentPage:
+    """Gets one page of students ordered by name, then ID.
+
+    Uses keyset pagination: `after` is the (name, id) of the last student on
+    the previous page (StudentPage.next_after), so every page is an index seek
+    no matter how deep. Optionally filters by exact course and by a
+    case-insensitive name prefix.
+    """
+    conditions, params = [], []
+    if course:
+        conditions.append("course = ?")
+        params.append(course)
+    if name_prefix:
+        escaped = name_prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        conditions.append("name LIKE ? ESCAPE '\\'")
+        params.append(escaped + "%")
+    if after:
+        # Expanded form of (name, id) > (?, ?) - unlike the row value, it can seek the index
+        conditions.append("name COLLATE NOCASE >= ? AND (name COLLATE NOCASE > ? OR id > ?)")
+        params.extend([after[0], after[0], after[1]])
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+    with connect_db() as conn:
+        rows = conn.execute(f"""
+            SELECT id, name, email, course FROM students
+            {where}
+            ORDER BY name COLLATE NOCASE, id
+            LIMIT ?
+        """, [*params, limit + 1]).fetchall() # One extra row tells us whether there is a next page
+    students = [dict(row) for row in rows[:limit]]
+    next_after = (students[-1]['name'], students[-1]['id']) if len(rows) > limit else None
+    return StudentPage(students=students, next_after=next_after)
+
+def _fts_query(text: str) -> str:
+    """Turns free text into an FTS5 query: every word must match as a prefix."""
+    terms = [term.replace('"', '') for term in text.split()]
+    return " ".join(f'"{term}"*' for term in terms if term)
+
+def search_students(query: str, limit: int = 20, course: Optional[str] = None) -> List[Dict]:
+    """Finds students whose name, email or course match partial words in `query`.
+
+    Backed by the students_fts index (schema migration 4). Results are ranked
+    by relevance, with name matches weighted above email and course matches.
+    """
+    match = _fts_query(query)
+    if not match:
+        return []
+    sql = """
+        SELECT s.id, s.name, s.email, s.course
+        FROM students_fts
+        JOIN students s ON s.id = students_fts.rowid
+        WHERE students_fts MATCH ?
+    """
+    params = [match]
+    if course:
+        sql += " AND s.course = ?"
+        params.append(course)
+    sql += " ORDER BY bm25(students_fts, 10.0, 5.0, 1.0) LIMIT ?"
+    params.append(limit)
+    try:
+        with connect_db() as conn:
+            rows = conn.execute(sql, params).fetchall()
+        return [dict(row) for row in rows]
+    except sqlite3.OperationalError as e:
+        print(f"Error searching students: {e}")
+        return []
+
+def get_courses() -> List[str]:
+    """Gets the distinct course names, for filter pickers."""
+    with connect_db() as conn:
+        rows = conn.execute("SELECT DISTINCT course FROM students ORDER BY course").fetchall()
+    return [row['course'] for row in rows]
 
 def add_student(name, email, course):
-    conn = connect_db()
-    cursor = conn.cursor()
     try:
-        cursor.execute("INSERT INTO students (name, email, course) VALUES (?, ?, ?)", (name, email, course))
-        conn.commit()
+        with connect_db() as conn:
+            conn.execute("INSERT INTO students (name, email, course) VALUES (?, ?, ?)", (name, email, course))
         return True # Indicate success
     except sqlite3.IntegrityError:
         print(f"Error: Student with email {email} already exists.")
         return False # Indicate failure
     except Exception as e:
         print(f"An error occurred adding student: {e}")
-        conn.rollback()
         return False # Indicate failure
-    finally:
-        conn.close()
 
 def delete_student(student_id):
-    conn = connect_db()
-    cursor = conn.cursor()
     try:
-        cursor.execute("DELETE FROM students WHERE id = ?", (student_id,))
-        conn.commit()
+        with connect_db() as conn:
+            cursor = conn.execute("DELETE FROM students WHERE id = ?", (student_id,))
         return cursor.rowcount > 0 # True if a row was deleted
     except Exception as e:
         print(f"An error occurred deleting student: {e}")
-        conn.rollback()
         return False
-    finally:
-        conn.close()
 
 # --- Student/Teacher Shared Data Functions ---
 
 def get_student_id_by_name(name: str) -> Optional[int]:
-    conn = connect_db()
-    cursor = conn.cursor()
-    cursor.execute("SELECT id FROM students WHERE name = ?", (name,))
-    result = cursor.fetchone()
-    conn.close()
+    with connect_db() as conn:
+        result = conn.execute("SELECT id FROM students WHERE name = ?", (name,)).fetchone()
     return result['id'] if result else None
 
 def get_student_details_by_id(student_id: int) -> Optional[dict]:
      """Gets basic details for a student by ID."""
-     conn = connect_db()
-     cursor = conn.cursor()
-     cursor.execute("SELECT id, name, email, course FROM students WHERE id = ?", (student_id,))
-     result = cursor.fetchone()
-     conn.close()
-     return dict(result) if result else None
-
-
-def get_grades_by_student_id(student_id: int) -> pd.DataFrame:
-    """Retrieves all grades (including ID) for a specific student ID."""
-    conn = connect_db()
-    try:
-        # Select ID for potential updates
-        query = """
-            SELECT id, subject, grade, date_graded
-            FROM grades
-            WHERE student_id = ?
-            ORDER BY date_graded DESC, subject
-        """
-        df = pd.read_sql_query(query, conn, params=(student_id,))
-        if not df.empty:
-             df['date_graded'] = pd.to_datetime(df['date_graded'])
-        return df
+     def load():
+         with connect_db() as conn:
+             result = conn.execute("SELECT id, name, email, course FROM students WHERE id = ?", (student_id,)).fetchone()
+         return dict(result) if result else None
+     details = _cached(("student", student_id), ("students",), load)
+     return dict(details) if details else None
+
+
+def _history_filter(date_column: str, student_id: int, date_from: Optional[date], date_to: Optional[date]):
+    conditions, params = ["student_id = ?"], [student_id]
+    if date_from:
+        conditions.append(f"{date_column} >= ?")
+        params.append(_as_iso(date_from))
+    if date_to:
+        conditions.append(f"{date_column} <= ?")
+        params.append(_as_iso(date_to))
+    return " AND ".join(conditions), params
+
+def _page_clause(limit: Optional[int], offset: int, params: list) -> str:
+    if limit is None:
+        return ""
+    params.extend([limit, offset])
+    return "LIMIT ? OFFSET ?"
+
+def _read_grades(conn, student_id: int, date_from: Optional[date] = None, date_to: Optional[date] = None,
+                 limit: Optional[int] = None, offset: int = 0) -> pd.DataFrame:
+    # Select ID for potential updates
+    where, params = _history_filter("date_graded", student_id, date_from, date_to)
+    query = f"""
+        SELECT id, subject, grade, date_graded
+        FROM grades
+        WHERE {where}
+        ORDER BY date_graded DESC, subject, id
+        {_page_clause(limit, offset, params)}
+    """
+    df = pd.read_sql_query(query, conn, params=params)
+    if not df.empty:
+         df['date_graded'] = pd.to_datetime(df['date_graded'])
+    return df
+
+def _read_attendance(conn, student_id: int, date_from: Optional[date] = None, date_to: Optional[date] = None,
+                     limit: Optional[int] = None, offset: int = 0) -> pd.DataFrame:
+    # Select ID for potential updates
+    where, params = _history_filter("date", student_id, date_from, date_to)
+    query = f"""
+        SELECT id, date, subject, status
+        FROM attendance
+        WHERE {where}
+        ORDER BY date DESC, subject
+        {_page_clause(limit, offset, params)}
+    """
+    df = pd.read_sql_query(query, conn, params=params)
+    if not df.empty:
+        df['date'] = pd.to_datetime(df['date'])
+    return df
+
+def get_grades_by_student_id(student_id: int, date_from: Optional[date] = None, date_to: Optional[date] = None,
+                             limit: Optional[int] = None, offset: int = 0) -> pd.DataFrame:
+    """Retrieves grades (including ID) for a specific student ID, newest first.
+
+    Optionally only those graded between date_from and date_to (inclusive),
+    and one page of `limit` rows starting at `offset`.
+    """
+    def load():
+        with connect_db() as conn:
+            return _read_grades(conn, student_id, date_from, date_to, limit, offset)
+    try:
+        key = ("grades", student_id, _as_iso(date_from) if date_from else None,
+               _as_iso(date_to) if date_to else None, limit, offset)
+        return _cached(key, ("grades",), load).copy()
     except Exception as e:
         print(f"Error fetching grades: {e}")
         return pd.DataFrame()
-    finally:
-        conn.close()
-
-def get_attendance_by_student_id(student_id: int) -> pd.DataFrame:
-    """Retrieves all attendance records (including ID) for a specific student ID."""
-    conn = connect_db()
-    try:
-        # Select ID for potential updates
-        query = """
-            SELECT id, date, subject, status
-            FROM attendance
-            WHERE student_id = ?
-            ORDER BY date DESC, subject
-        """
-        df = pd.read_sql_query(query, conn, params=(student_id,))
-        if not df.empty:
-            df['date'] = pd.to_datetime(df['date'])
-        return df
+
+def get_attendance_by_student_id(student_id: int, date_from: Optional[date] = None, date_to: Optional[date] = None,
+                                 limit: Optional[int] = None, offset: int = 0) -> pd.DataFrame:
+    """Retrieves attendance records (including ID) for a specific student ID, newest first.
+
+    Takes the same date range and paging arguments as get_grades_by_student_id.
+    """
+    def load():
+        with connect_db() as conn:
+            return _read_attendance(conn, student_id, date_from, date_to, limit, offset)
+    try:
+        key = ("attendance", student_id, _as_iso(date_from) if date_from else None,
+               _as_iso(date_to) if date_to else None, limit, offset)
+        return _cached(key, ("attendance",), load).copy()
     except Exception as e:
         print(f"Error fetching attendance: {e}")
         return pd.DataFrame()
-    finally:
-        conn.close()
+
+def count_grades_by_student_id(student_id: int, date_from: Optional[date] = None, date_to: Optional[date] = None) -> int:
+    """Number of grades get_grades_by_student_id would return unpaged (for page counts)."""
+    where, params = _history_filter("date_graded", student_id, date_from, date_to)
+    def load():
+        with connect_db() as conn:
+            return conn.execute(f"SELECT COUNT(*) FROM grades WHERE {where}", params).fetchone()[0]
+    return _cached(("grade_count", *params), ("grades",), load)
+
+def count_attendance_by_student_id(student_id: int, date_from: Optional[date] = None, date_to: Optional[date] = None) -> int:
+    """Number of attendance records get_attendance_by_student_id would return unpaged."""
+    where, params = _history_filter("date", student_id, date_from, date_to)
+    def load():
+        with connect_db() as conn:
+            return conn.execute(f"SELECT COUNT(*) FROM attendance WHERE {where}", params).fetchone()[0]
+    return _cached(("attendance_count", *params), ("attendance",), load)
+
+# --- Summary Metrics (student_summary, maintained by triggers - see create_db.py) ---
+
+# Derived metrics over the stored counters; a subquery so callers can filter/sort on them
+_SUMMARY_SELECT = """
+    SELECT student_id, grade_count, grade_min, grade_max,
+           CASE WHEN grade_count > 0 THEN grade_sum / grade_count END AS average_grade,
+           present_count, absent_count, late_count, excused_count,
+           present_count + absent_count + late_count + excused_count AS attendance_count,
+           CASE WHEN present_count + absent_count + late_count + excused_count > 0
+                THEN 100.0 * (present_count + late_count)
+                     / (present_count + absent_count + late_count + excused_count)
+           END AS attendance_percentage
+    FROM student_summary
+"""
+
+def get_student_summary(student_id: int) -> Optional[Dict]:
+    """Gets a student's grade and attendance aggregates with a single primary-key lookup."""
+    with connect_db() as conn:
+        row = conn.execute(f"SELECT * FROM ({_SUMMARY_SELECT}) WHERE student_id = ?", (student_id,)).fetchone()
+    return dict(row) if row else None
+
+def get_leaderboard(limit: int = 10, course: Optional[str] = None, by: str = "average_grade") -> List[Dict]:
+    """Ranks students by average grade or attendance percentage, best first.
+
+    Reads only the per-student summary rows, never the grades/attendance tables.
+    Students without any grade (or attendance) records are left out.
+    """
+    if by not in ("average_grade", "attendance_percentage"):
+        raise ValueError(f"Cannot rank by '{by}'")
+    sql = f"""
+        SELECT s.id, s.name, s.course, m.grade_count, m.average_grade, m.grade_min, m.grade_max,
+               m.attendance_count, m.attendance_percentage
+        FROM ({_SUMMARY_SELECT}) m
+        JOIN students s ON s.id = m.student_id
+        WHERE m.{by} IS NOT NULL
+    """
+    params = []
+    if course:
+        sql += " AND s.course = ?"
+        params.append(course)
+    sql += f" ORDER BY m.{by} DESC, s.name LIMIT ?"
+    params.append(limit)
+    with connect_db() as conn:
+        rows = conn.execute(sql, params).fetchall()
+    return [dict(row) for row in rows]
+
+def _load_student_profile(condition: str, value) -> Optional[StudentProfile]:
+    """Reads details, grades, attendance and summary metrics in one read transaction."""
+    with connect_db() as conn:
+        # BEGIN holds the read snapshot across all queries below
+        conn.execute("BEGIN")
+        details = conn.execute(f"SELECT id, name, email, course FROM students WHERE {condition}", (value,)).fetchone()
+        if not details:
+            return None
+        student_id = details['id']
+        metrics = conn.execute(f"""
+            SELECT grade_count, average_grade, attendance_count, attendance_percentage
+            FROM ({_SUMMARY_SELECT}) WHERE student_id = ?
+        """, (student_id,)).fetchone()
+        return StudentProfile(
+            **dict(details),
+            grades=_read_grades(conn, student_id),
+            attendance=_read_attendance(conn, student_id),
+            **(dict(metrics) if metrics else {}),
+        )
+
+def get_student_profile(student_id: int) -> Optional[StudentProfile]:
+    """Loads a student's full profile with one pooled connection. None if not found."""
+    try:
+        return _load_student_profile("id = ?", student_id)
+    except Exception as e:
+        print(f"Error fetching student profile: {e}")
+        return None
+
+def get_student_profile_by_name(name: str) -> Optional[StudentProfile]:
+    """Same as get_student_profile, looked up by the student's (login) name."""
+    try:
+        return _load_student_profile("name = ?", name)
+    except Exception as e:
+        print(f"Error fetching student profile: {e}")
+        return None
+
+def get_student_profile_for_user(username: str) -> Optional[StudentProfile]:
+    """Same as get_student_profile, for the student record linked to a login account."""
+    try:
+        return _load_student_profile("id = (SELECT student_id FROM users WHERE username = ?)", username)
+    except Exception as e:
+        print(f"Error fetching student profile: {e}")
+        return None
 
 # --- Teacher Specific Functions ---
 
+ALLOWED_ATTENDANCE_STATUSES = ['Present', 'Absent', 'Late', 'Excused']
+# SQLite caps bound parameters per statement; stay well below the limit
+_MAX_IN_PARAMS = 900
+
+# Both rely on the UNIQUE (student_id, date, subject) index from schema migration 2
+_ATTENDANCE_INSERT_SQL = """
+    INSERT INTO attendance (student_id, date, subject, status)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT (student_id, date, subject) DO NOTHING
+"""
+_ATTENDANCE_UPSERT_SQL = """
+    INSERT INTO attendance (student_id, date, subject, status)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT (student_id, date, subject) DO UPDATE SET status = excluded.status
+"""
+
+def write_attendance_rows(conn, rows, upsert: bool = False) -> int:
+    """Inserts (student_id, date, subject, status) rows on the caller's connection and transaction.
+
+    Existing records are skipped, or overwritten with upsert=True. Returns
+    the number of rows inserted or updated. For loaders that manage their
+    own transactions (see importer.py).
+    """
+    return conn.executemany(_ATTENDANCE_UPSERT_SQL if upsert else _ATTENDANCE_INSERT_SQL, rows).rowcount
+
 def add_grade(student_id: int, subject: str, grade: float, date_graded: date) -> bool:
-    """Adds a new grade record for a student."""
-    conn = connect_db()
-    cursor = conn.cursor()
+    """Adds a new grade record for a student.
+
+    In write-behind mode the write is queued and this waits for its group commit.
+    """
+    if WRITE_BEHIND:
+        outcome = _write_queue.result(submit_grade(student_id, subject, grade, date_graded))
+        if not outcome.ok:
+            print(f"Error adding grade: {outcome.reason}")
+        return outcome.ok
     try:
-        cursor.execute("""
-            INSERT INTO grades (student_id, subject, grade, date_graded)
-            VALUES (?, ?, ?, ?)
-        """, (student_id, subject, grade, date_graded.isoformat()))
-        conn.commit()
+        with connect_db() as conn:
+            conn.execute("""
+                INSERT INTO grades (student_id, subject, grade, date_graded)
+                VALUES (?, ?, ?, ?)
+            """, (student_id, subject, grade, date_graded.isoformat()))
         return True
     except Exception as e:
         print(f"Error adding grade: {e}")
-        conn.rollback()
         return False
-    finally:
-        conn.close()
 
 def update_grade(grade_id: int, new_grade: float) -> bool:
     """Updates the grade value for a specific grade record ID."""
-    conn = connect_db()
-    cursor = conn.cursor()
     try:
-        cursor.execute("UPDATE grades SET grade = ? WHERE id = ?", (new_grade, grade_id))
-        conn.commit()
+        with connect_db() as conn:
+            cursor = conn.execute("UPDATE grades SET grade = ? WHERE id = ?", (new_grade, grade_id))
         # Check if any row was actually updated
         return cursor.rowcount > 0
     except Exception as e:
         print(f"Error updating grade: {e}")
-        conn.rollback()
         return False
-    finally:
-        conn.close()
-
-def add_attendance(student_id: int, attendance_date: date, subject: str, status: str) -> bool:
-    """Adds a new attendance record for a student."""
-    conn = connect_db()
-    cursor = conn.cursor()
-    # Optional: Check if a record for this student, date, and subject already exists
-    cursor.execute("SELECT id FROM attendance WHERE student_id = ? AND date = ? AND subject = ?",
-                   (student_id, attendance_date.isoformat(), subject))
-    if cursor.fetchone():
-        print(f"Attendance record already exists for student {student_id} on {attendance_date.isoformat()} for {subject}. Use update instead.")
-        conn.close()
-        return False # Indicate failure because it exists
-
-    try:
-        cursor.execute("""
-            INSERT INTO attendance (student_id, date, subject, status)
-            VALUES (?, ?, ?, ?)
-        """, (student_id, attendance_date.isoformat(), subject, status))
-        conn.commit()
+
+def add_attendance(student_id: int, attendance_date: date, subject: str, status: str, upsert: bool = False) -> bool:
+    """Adds an attendance record for a student in a single statement.
+
+    By default an existing record for the same student, date and subject is
+    left untouched and False is returned. With upsert=True its status is
+    overwritten instead, for re-submitting corrected rosters.
+
+    In write-behind mode the write is queued and this waits for its group commit.
+    """
+    if status not in ALLOWED_ATTENDANCE_STATUSES:
+        print(f"Error: Invalid attendance status '{status}'. Must be one of {ALLOWED_ATTENDANCE_STATUSES}")
+        return False
+
+    if WRITE_BEHIND:
+        outcome = _write_queue.result(submit_attendance(student_id, attendance_date, subject, status, upsert=upsert))
+        if not outcome.ok:
+            print(f"Error adding attendance: {outcome.reason}")
+        return outcome.ok
+    try:
+        with connect_db() as conn:
+            cursor = conn.execute(_ATTENDANCE_UPSERT_SQL if upsert else _ATTENDANCE_INSERT_SQL,
+                                  (student_id, attendance_date.isoformat(), subject, status))
+        if cursor.rowcount == 0:
+            print(f"Attendance record already exists for student {student_id} on {attendance_date.isoformat()} for {subject}. Use update instead.")
+            return False # Indicate failure because it exists
         return True
     except Exception as e:
         print(f"Error adding attendance: {e}")
-        conn.rollback()
         return False
-    finally:
-        conn.close()
+
+def _as_iso(value) -> str:
+    return value.isoformat() if isinstance(value, date) else str(value)
+
+# --- Write-behind (see write_queue.py) ---
+# With SIS_WRITE_BEHIND=1, single grade and attendance writes from concurrent
+# callers share group commits on one writer thread instead of each taking the
+# write lock and committing on its own.
+WRITE_BEHIND = write_queue.ENABLED
+WRITE_TIMEOUT = write_queue.RESULT_TIMEOUT
+_write_queue = WriteQueue(connect_db)
+atexit.register(_write_queue.close) # Runs before database.close_pool, which was registered first
+
+def _foreign_key_conflict(e: sqlite3.IntegrityError) -> WriteOutcome:
+    reason = "Unknown student" if "FOREIGN KEY" in str(e) else str(e)
+    return WriteOutcome(status="conflict", reason=reason)
+
+def _write_grade(conn, student_id: int, subject: str, grade: float, graded_on: str) -> WriteOutcome:
+    try:
+        cursor = conn.execute("""
+            INSERT INTO grades (student_id, subject, grade, date_graded)
+            VALUES (?, ?, ?, ?)
+        """, (student_id, subject, grade, graded_on))
+    except sqlite3.IntegrityError as e:
+        return _foreign_key_conflict(e)
+    return WriteOutcome(status="written", id=cursor.lastrowid)
+
+def _write_attendance(conn, student_id: int, attended_on: str, subject: str, status: str, upsert: bool) -> WriteOutcome:
+    try:
+        cursor = conn.execute(_ATTENDANCE_UPSERT_SQL if upsert else _ATTENDANCE_INSERT_SQL,
+                              (student_id, attended_on, subject, status))
+    except sqlite3.IntegrityError as e:
+        return _foreign_key_conflict(e)
+    if cursor.rowcount == 0:
+        return WriteOutcome(status="conflict", reason=f"Attendance already recorded for {subject} on {attended_on}")
+    # An upsert that updated an existing record leaves lastrowid stale
+    return WriteOutcome(status="written", id=None if upsert else cursor.lastrowid)
+
+def submit_grade(student_id: int, subject: str, grade: float, date_graded: date) -> Future:
+    """Queues a grade for the next group commit; the Future resolves to a WriteOutcome."""
+    return _write_queue.submit(_write_grade, student_id, subject, grade, _as_iso(date_graded))
+
+def submit_attendance(student_id: int, attendance_date: date, subject: str, status: str, upsert: bool = False) -> Future:
+    """Queues an attendance record for the next group commit; the Future resolves to a WriteOutcome.
+
+    Same semantics as add_attendance: without upsert an existing record for
+    the student, date and subject is a conflict.
+    """
+    if status not in ALLOWED_ATTENDANCE_STATUSES:
+        future = Future()
+        future.set_result(WriteOutcome(status="conflict", reason=f"Invalid status '{status}'"))
+        return future
+    return _write_queue.submit(_write_attendance, student_id, _as_iso(attendance_date), subject, status, upsert)
+
+def write_queue_stats() -> Dict:
+    return _write_queue.stats()
+
+def close_write_queue():
+    """Commits queued writes and stops the writer thread (FastAPI shutdown); the next write restarts it."""
+    _write_queue.close()
+
+
+def _as_int(value) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+def _as_grade(value) -> Optional[float]:
+    """The value as a grade, or None if it is not a number in 0-100."""
+    try:
+        grade = float(value)
+    except (TypeError, ValueError):
+        return None
+    return grade if 0 <= grade <= 100 else None
+
+def _bulk_row_problem(record, fields: Tuple[str, ...]) -> Optional[str]:
+    """Why a bulk row cannot be used at all (not a dict, or missing fields), or None."""
+    if not isinstance(record, dict):
+        return "Row is not an object"
+    missing = [field for field in fields if record.get(field) in (None, "")]
+    if missing:
+        return f"Missing {', '.join(missing)}"
+    if _as_int(record['student_id']) is None:
+        return f"Invalid student_id '{record['student_id']}'"
+    return None
+
+def _existing_student_ids(conn, student_ids) -> set:
+    """Returns which of the given IDs exist, in chunks of IN (...) lookups."""
+    ids = list(set(student_ids))
+    found = set()
+    for start in range(0, len(ids), _MAX_IN_PARAMS):
+        chunk = ids[start:start + _MAX_IN_PARAMS]
+        placeholders = ",".join("?" * len(chunk))
+        rows = conn.execute(f"SELECT id FROM students WHERE id IN ({placeholders})", chunk).fetchall()
+        found.update(row['id'] for row in rows)
+    return found
+
+def _write_bulk(rows: List, prepare: Callable, check: Callable, sql: str, action: str) -> BulkWriteResult:
+    """Shared body of the bulk writers: validate, check against the database, executemany.
+
+    `prepare(row)` returns (student_id, params, problem); a row with a
+    problem is a conflict and never reaches the database. `check(conn,
+    candidates)` gets the remaining (index, student_id, params) inside the
+    write transaction and returns {index: reason} for those to reject; the
+    rest are written with `sql` in one executemany. If the transaction fails
+    every candidate is reported with the error. Conflicts come back in row
+    order.
+    """
+    result = BulkWriteResult()
+    candidates = []
+    for index, row in enumerate(rows):
+        student_id, params, problem = prepare(row)
+        if problem:
+            result.conflicts.append(RowConflict(index=index, student_id=student_id, reason=problem))
+        else:
+            candidates.append((index, student_id, params))
+    if not candidates:
+        return result
+    invalid = list(result.conflicts)
+
+    try:
+        with connect_db() as conn:
+            # Take the write lock up front so the checks below cannot go stale
+            conn.execute("BEGIN IMMEDIATE")
+            rejected = check(conn, candidates)
+            to_write = []
+            for index, student_id, params in candidates:
+                if index in rejected:
+                    result.conflicts.append(RowConflict(index=index, student_id=student_id, reason=rejected[index]))
+                else:
+                    to_write.append(params)
+            conn.executemany(sql, to_write)
+        result.written = len(to_write)
+    except Exception as e:
+        print(f"Error {action} in bulk: {e}")
+        result.conflicts = invalid + [RowConflict(index=index, student_id=student_id, reason=f"Batch failed: {e}")
+                                      for index, student_id, _ in candidates]
+        result.written = 0
+    result.conflicts.sort(key=lambda conflict: conflict.index)
+    return result
+
+def _unknown_students(conn, candidates) -> Dict[int, str]:
+    known_ids = _existing_student_ids(conn, [student_id for _, student_id, _ in candidates])
+    return {index: "Unknown student" for index, student_id, _ in candidates if student_id not in known_ids}
+
+def add_attendance_bulk(records: List[Dict], upsert: bool = False) -> BulkWriteResult:
+    """Adds a whole roster of attendance records in one transaction.
+
+    Each record is a dict with student_id, date, subject and status. Rows that
+    reference an unknown student or carry an invalid status are reported as
+    conflicts, as are rows for an already recorded (student, date, subject)
+    unless upsert=True, in which case those records are overwritten. All
+    other rows are written with a single executemany.
+    """
+    def prepare(record):
+        problem = _bulk_row_problem(record, ('student_id', 'date', 'subject', 'status'))
+        if problem:
+            return (_as_int(record.get('student_id')) if isinstance(record, dict) else None), None, problem
+        student_id = int(record['student_id'])
+        if record['status'] not in ALLOWED_ATTENDANCE_STATUSES:
+            return student_id, None, f"Invalid status '{record['status']}'"
+        return student_id, (student_id, _as_iso(record['date']), record['subject'], record['status']), None
+
+    def check(conn, candidates):
+        rejected = _unknown_students(conn, candidates)
+        if upsert:
+            return rejected
+        # One lookup per (date, subject) pair - a roster usually shares both
+        groups = {}
+        for _, student_id, (_, att_date, subject, _) in candidates:
+            groups.setdefault((att_date, subject), set()).add(student_id)
+        existing_keys = set()
+        for (att_date, subject), student_ids in groups.items():
+            ids = list(student_ids)
+            for start in range(0, len(ids), _MAX_IN_PARAMS):
+                chunk = ids[start:start + _MAX_IN_PARAMS]
+                placeholders = ",".join("?" * len(chunk))
+                rows = conn.execute(f"""
+                    SELECT student_id FROM attendance
+                    WHERE date = ? AND subject = ? AND student_id IN ({placeholders})
+                """, [att_date, subject, *chunk]).fetchall()
+                existing_keys.update((row['student_id'], att_date, subject) for row in rows)
+        for index, student_id, (_, att_date, subject, _) in candidates:
+            key = (student_id, att_date, subject)
+            if index in rejected: # Unknown student
+                continue
+            if key in existing_keys:
+                rejected[index] = f"Attendance already recorded for {subject} on {att_date}"
+            else:
+                existing_keys.add(key) # Also catches duplicates within the batch
+        return rejected
+
+    return _write_bulk(records, prepare, check, _ATTENDANCE_UPSERT_SQL if upsert else _ATTENDANCE_INSERT_SQL,
+                       "adding attendance")
+
+def add_grades_bulk(records: List[Dict]) -> BulkWriteResult:
+    """Adds many grade records in one transaction.
+
+    Each record is a dict with student_id, subject, grade and date_graded.
+    Rows with a grade outside 0-100, a missing subject or an unknown student
+    are reported as conflicts; the rest are written with a single executemany.
+    """
+    def prepare(record):
+        problem = _bulk_row_problem(record, ('student_id', 'subject', 'grade', 'date_graded'))
+        if problem:
+            return (_as_int(record.get('student_id')) if isinstance(record, dict) else None), None, problem
+        student_id = int(record['student_id'])
+        grade = _as_grade(record['grade'])
+        if grade is None:
+            return student_id, None, f"Grade {record['grade']} is outside 0-100"
+        return student_id, (student_id, record['subject'], grade, _as_iso(record['date_graded'])), None
+
+    return _write_bulk(records, prepare, _unknown_students, """
+        INSERT INTO grades (student_id, subject, grade, date_graded)
+        VALUES (?, ?, ?, ?)
+    """, "adding grades")
 
 def update_attendance(attendance_id: int, new_status: str) -> bool:
     """Updates the status for a specific attendance record ID."""
-    conn = connect_db()
-    cursor = conn.cursor()
-    allowed_statuses = ['Present', 'Absent', 'Late', 'Excused']
-    if new_status not in allowed_statuses:
-        print(f"Error: Invalid attendance status '{new_status}'. Must be one of {allowed_statuses}")
-        conn.close()
+    if new_status not in ALLOWED_ATTENDANCE_STATUSES:
+        print(f"Error: Invalid attendance status '{new_status}'. Must be one of {ALLOWED_ATTENDANCE_STATUSES}")
         return False
 
     try:
-        cursor.execute("UPDATE attendance SET status = ? WHERE id = ?", (new_status, attendance_id))
-        conn.commit()
+        with connect_db() as conn:
+            cursor = conn.execute("UPDATE attendance SET status = ? WHERE id = ?", (new_status, attendance_id))
         return cursor.rowcount > 0
     except Exception as e:
         print(f"Error updating attendance: {e}")
-        conn.rollback()
         return False
-    finally:
-        conn.close()
 
-# --- END OF FILE models.py ---
\ No newline at end of file
+def _existing_record_ids(conn, table: str, record_ids, student_id: Optional[int] = None) -> set:
+    """Which of the given grade/attendance IDs exist (and belong to student_id, if given)."""
+    ids = list(set(record_ids))
+    found = set()
+    owner = " AND student_id = ?" if student_id is not None else ""
+    for start in range(0, len(ids), _MAX_IN_PARAMS):
+        chunk = ids[start:start + _MAX_IN_PARAMS]
+        placeholders = ",".join("?" * len(chunk))
+        params = chunk + ([student_id] if student_id is not None else [])
+        rows = conn.execute(f"SELECT id FROM {table} WHERE id IN ({placeholders}){owner}", params).fetchall()
+        found.update(row['id'] for row in rows)
+    return found
+
+def _update_row_problem(update) -> Optional[str]:
+    """Why a bulk edit cannot be applied at all (not a dict, or no integer id), or None."""
+    if not isinstance(update, dict):
+        return "Row is not an object"
+    if _as_int(update.get('id')) is None:
+        return f"Invalid record id '{update.get('id')}'"
+    return None
+
+def _missing_records(table: str, label: str, student_id: Optional[int]) -> Callable:
+    """Bulk-edit check: rejects edits whose record (params[1]) is missing or not the student's."""
+    def check(conn, candidates):
+        known_ids = _existing_record_ids(conn, table, [params[1] for _, _, params in candidates], student_id)
+        return {index: f"{label} record {params[1]} not found"
+                for index, _, params in candidates if params[1] not in known_ids}
+    return check
+
+def update_grades_bulk(updates: List[Dict], student_id: Optional[int] = None) -> BulkWriteResult:
+    """Applies many grade edits ({id, grade}) in one transaction.
+
+    Edits with a grade outside 0-100, or for a record that does not exist
+    (or, when student_id is given, belongs to another student) are reported
+    as conflicts; the rest are written with a single executemany.
+    """
+    def prepare(update):
+        problem = _update_row_problem(update)
+        if problem:
+            return student_id, None, problem
+        grade = _as_grade(update.get('grade'))
+        if grade is None:
+            return student_id, None, f"Grade {update.get('grade')} is outside 0-100"
+        return student_id, (grade, int(update['id'])), None
+
+    return _write_bulk(updates, prepare, _missing_records("grades", "Grade", student_id),
+                       "UPDATE grades SET grade = ? WHERE id = ?", "updating grades")
+
+def update_attendance_bulk(updates: List[Dict], student_id: Optional[int] = None) -> BulkWriteResult:
+    """Applies many attendance status edits ({id, status}) in one transaction.
+
+    Same conflict rules as update_grades_bulk, with the status checked
+    against ALLOWED_ATTENDANCE_STATUSES.
+    """
+    def prepare(update):
+        problem = _update_row_problem(update)
+        if problem:
+            return student_id, None, problem
+        if update.get('status') not in ALLOWED_ATTENDANCE_STATUSES:
+            return student_id, None, f"Invalid status '{update.get('status')}'"
+        return student_id, (update['status'], int(update['id'])), None
+
+    return _write_bulk(updates, prepare, _missing_records("attendance", "Attendance", student_id),
+                       "UPDATE attendance SET status = ? WHERE id = ?", "updating attendance")
+
+# --- END OF FILE models.py ---
@@ -0,0 +1,339 @@
+# --- START OF FILE query_stats.py ---
+
+import bisect
+import os
+import pathlib
+import random
+import re
+import sqlite3
+import sys
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+# --- Configuration ---
+# On by default: timing a statement costs about a microsecond on top of the query
+ENABLED = os.environ.get("SIS_SQL_STATS", "1") != "0"
+# Fraction of statements recorded in the per-statement histograms. Only these
+# (and slow ones) walk the stack to find their caller, so keep it low in
+# production. Slow statements are always logged, sampled or not.
+SAMPLE_RATE = float(os.environ.get("SIS_SQL_SAMPLE_RATE", "0.01"))
+SLOW_QUERY_MS = float(os.environ.get("SIS_SQL_SLOW_MS", "100"))
+SLOW_LOG_SIZE = int(os.environ.get("SIS_SQL_SLOW_LOG_SIZE", "100"))
+# Distinct (caller, statement) pairs tracked; anything beyond is folded into one "other" entry
+MAX_STATEMENTS = int(os.environ.get("SIS_SQL_MAX_STATEMENTS", "500"))
+
+# Histogram bucket upper bounds in seconds (Prometheus `le` labels); the last bucket is +Inf
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# Frames from these modules are plumbing, not the caller a statement is charged to
+_PLUMBING_MODULES = ("query_stats", "database", "read_cache", "sqlite3", "pandas", "concurrent", "threading", "functools")
+_PLACEHOLDER_LIST = re.compile(r"\?(?:\s*,\s*\?)+")
+_WHITESPACE = re.compile(r"\s+")
+_EXPLAINABLE = ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE", "REPLACE")
+
+
+class _StatementStats:
+    __slots__ = ("caller", "sql", "count", "total", "max", "rows", "buckets")
+
+    def __init__(self, caller: str, sql: str):
+        self.caller = caller
+        self.sql = sql
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.rows = 0
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+
+
+class QueryStats:
+    """Per-statement latency histograms and a slow-query log for models.py SQL.
+
+    Statements are keyed by the model function that ran them plus their SQL,
+    with whitespace collapsed and runs of `?, ?, ...` (IN lists built for a
+    batch) folded together so each call site stays one entry. Latency covers
+    execute plus fetching, so a query that is cheap to start but slow to
+    drain is still charged in full.
+
+    Recording never runs SQL. The slow log's query plans are captured when
+    the log is read, on a separate read-only connection, so the statement's
+    own connection and transaction are never touched.
+    """
+
+    def __init__(self, sample_rate: float = SAMPLE_RATE, slow_query_ms: float = SLOW_QUERY_MS,
+                 slow_log_size: int = SLOW_LOG_SIZE, max_statements: int = MAX_STATEMENTS):
+        self.sample_rate = sample_rate
+        self.slow_query_seconds = slow_query_ms / 1000
+        self.max_statements = max_statements
+        self._statements = {} # (caller, normalized sql) -> _StatementStats
+        self._normalized = {} # raw sql -> normalized sql
+        self._plans = {} # normalized sql -> EXPLAIN QUERY PLAN lines
+        self._slow_log = deque(maxlen=slow_log_size) # (entry, database, raw sql, params)
+        self._lock = threading.Lock()
+        self.recorded = 0
+        self.slow = 0
+
+    # --- Recording (called from InstrumentedCursor) ---
+    def _normalize(self, sql: str) -> str:
+        with self._lock:
+            normalized = self._normalized.get(sql)
+        if normalized is None:
+            normalized = _PLACEHOLDER_LIST.sub("?, ...", _WHITESPACE.sub(" ", sql).strip())
+            with self._lock:
+                if len(self._normalized) >= self.max_statements * 4:
+                    self._normalized.clear()
+                self._normalized[sql] = normalized
+        return normalized
+
+    def record(self, cursor: sqlite3.Cursor, sql: str, params, elapsed: float, rows: int, sampled: bool,
+               caller: str = None):
+        """Records one statement that `cursor` ran."""
+        slow = elapsed >= self.slow_query_seconds
+        if not (sampled or slow):
+            return
+        normalized = self._normalize(sql)
+        caller = caller or calling_function()
+        if sampled:
+            with self._lock:
+                stats = self._statements.get((caller, normalized))
+                if stats is None:
+                    if len(self._statements) >= self.max_statements:
+                        caller, normalized = "other", "other"
+                        stats = self._statements.get((caller, normalized))
+                    if stats is None:
+                        stats = self._statements[(caller, normalized)] = _StatementStats(caller, normalized)
+                stats.count += 1
+                stats.total += elapsed
+                stats.max = max(stats.max, elapsed)
+                stats.rows += rows
+                stats.buckets[bisect.bisect_left(LATENCY_BUCKETS, elapsed)] += 1
+                self.recorded += 1
+        if slow:
+            entry = {
+                "at": time.time(),
+                "caller": caller,
+                "sql": normalized,
+                "params": repr(params)[:200],
+                "ms": round(elapsed * 1000, 3),
+                "rows": rows,
+            }
+            with self._lock:
+                self._slow_log.append((entry, _database(cursor.connection), sql, params))
+                self.slow += 1
+
+    def _capture_plans(self, slow_log: list) -> Dict[str, List[str]]:
+        """EXPLAIN QUERY PLAN for each distinct slow statement not explained yet.
+
+        Runs on a private read-only connection per database. Statements on
+        temporary tables (e.g. an import's staging table) cannot be explained
+        from there and get an "(EXPLAIN failed: ...)" plan instead.
+        """
+        with self._lock:
+            plans = dict(self._plans)
+        missing = {}
+        for entry, db_name, sql, params in slow_log:
+            if (entry["sql"] not in plans and entry["sql"] not in missing and db_name
+                    and entry["sql"].upper().startswith(_EXPLAINABLE)):
+                missing[entry["sql"]] = (db_name, sql, params)
+        connections = {}
+        try:
+            for normalized, (db_name, sql, params) in missing.items():
+                try:
+                    if db_name not in connections:
+                        uri = f"{pathlib.Path(db_name).resolve().as_uri()}?mode=ro"
+                        connections[db_name] = sqlite3.connect(uri, uri=True)
+                    rows = connections[db_name].execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+                    depth = {0: -1}
+                    plan = []
+                    for node_id, parent, _, detail in rows:
+                        depth[node_id] = depth.get(parent, -1) + 1
+                        plan.append("  " * depth[node_id] + detail)
+                except sqlite3.Error as e:
+                    plan = [f"(EXPLAIN failed: {e})"]
+                plans[normalized] = plan
+        finally:
+            for conn in connections.values():
+                conn.close()
+        if missing:
+            with self._lock:
+                for normalized in missing:
+                    if len(self._plans) < self.max_statements:
+                        self._plans[normalized] = plans[normalized]
+        return plans
+
+    # --- Reading ---
+    def snapshot(self) -> List[Dict]:
+        """One dict per statement, slowest total time first.
+
+        `buckets` holds cumulative counts per LATENCY_BUCKETS bound (plus
+        +Inf), ready to publish as a Prometheus histogram.
+        """
+        with self._lock:
+            statements = [(s.caller, s.sql, s.count, s.total, s.max, s.rows, list(s.buckets))
+                          for s in self._statements.values()]
+        result = []
+        for caller, sql, count, total, maximum, rows, buckets in sorted(statements, key=lambda s: -s[3]):
+            cumulative, running = [], 0
+            for bucket in buckets:
+                running += bucket
+                cumulative.append(running)
+            result.append({
+                "caller": caller,
+                "sql": sql,
+                "count": count,
+                "total_ms": round(total * 1000, 3),
+                "mean_ms": round(total / count * 1000, 3) if count else 0.0,
+                "max_ms": round(maximum * 1000, 3),
+                "rows": rows,
+                "buckets": dict(zip([*map(str, LATENCY_BUCKETS), "+Inf"], cumulative)),
+            })
+        return result
+
+    def slow_queries(self) -> List[Dict]:
+        """The slow-query log, oldest first, each entry with its query plan (None for non-DML)."""
+        with self._lock:
+            slow_log = list(self._slow_log)
+        plans = self._capture_plans(slow_log)
+        return [{**entry, "plan": plans.get(entry["sql"])} for entry, _, _, _ in slow_log]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "enabled": ENABLED,
+                "sample_rate": self.sample_rate,
+                "slow_query_ms": self.slow_query_seconds * 1000,
+                "tracked_statements": len(self._statements),
+                "recorded": self.recorded,
+                "slow": self.slow,
+            }
+
+    def reset(self):
+        with self._lock:
+            self._statements.clear()
+            self._slow_log.clear()
+            self._plans.clear()
+            self._normalized.clear()
+            self.recorded = 0
+            self.slow = 0
+
+
+def calling_function() -> str:
+    """`module.function` of the nearest caller outside the DB plumbing (e.g. `models.get_student_profile`)."""
+    frame = sys._getframe(2)
+    while frame is not None:
+        module = frame.f_globals.get("__name__", "")
+        if not module.startswith(_PLUMBING_MODULES):
+            # Loaders defined inside a model function are charged to that function
+            code = frame.f_code
+            name = getattr(code, "co_qualname", code.co_name) # co_qualname is Python 3.11+
+            return f"{module}.{name.split('.<locals>')[0]}"
+        frame = frame.f_back
+    return "unknown"
+
+
+def _database(conn: sqlite3.Connection) -> Optional[str]:
+    """File behind a pooled connection, for explaining its slow statements later."""
+    pool = getattr(conn, "_pool", None)
+    return pool.db_name if pool is not None else None
+
+
+collector = QueryStats()
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """sqlite3 cursor that times each statement from execute until its rows are drained.
+
+    Row statements are recorded when a fetch comes back short or empty, or
+    when the cursor is reused, closed or collected; everything else as soon
+    as execute returns. Rows read by iterating the cursor directly are not
+    counted, but the statement is still timed up to its first row.
+
+    The caller of a sampled statement is captured at execute time, so a
+    cursor collected with rows still pending is still charged to it.
+    """
+
+    _pending = None # [sql, params, elapsed so far, rows so far, sampled, caller] while rows remain
+
+    def _finish(self):
+        sql, params, elapsed, rows, sampled, caller = self._pending
+        self._pending = None
+        collector.record(self, sql, params, elapsed, rows, sampled, caller=caller)
+
+    def execute(self, sql, parameters=()):
+        if self._pending is not None:
+            self._finish()
+        sampled = collector.sample_rate >= 1.0 or random.random() < collector.sample_rate
+        started = time.perf_counter()
+        super().execute(sql, parameters)
+        elapsed = time.perf_counter() - started
+        if self.description is None:
+            collector.record(self, sql, parameters, elapsed, max(self.rowcount, 0), sampled)
+        else:
+            self._pending = [sql, parameters, elapsed, 0, sampled, calling_function() if sampled else None]
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        if self._pending is not None:
+            self._finish()
+        sampled = collector.sample_rate >= 1.0 or random.random() < collector.sample_rate
+        first = None
+        if isinstance(seq_of_parameters, (list, tuple)) and seq_of_parameters:
+            first = seq_of_parameters[0] # For the slow log's EXPLAIN; generators are not replayed
+        started = time.perf_counter()
+        super().executemany(sql, seq_of_parameters)
+        elapsed = time.perf_counter() - started
+        collector.record(self, sql, first if first is not None else (), elapsed, max(self.rowcount, 0), sampled)
+        return self
+
+    def fetchone(self):
+        if self._pending is None:
+            return super().fetchone()
+        started = time.perf_counter()
+        row = super().fetchone()
+        self._pending[2] += time.perf_counter() - started
+        if row is None:
+            self._finish()
+        else:
+            self._pending[3] += 1
+        return row
+
+    def fetchmany(self, size=None):
+        if self._pending is None:
+            return super().fetchmany(size if size is not None else self.arraysize)
+        size = size if size is not None else self.arraysize
+        started = time.perf_counter()
+        rows = super().fetchmany(size)
+        self._pending[2] += time.perf_counter() - started
+        self._pending[3] += len(rows)
+        if len(rows) < size:
+            self._finish()
+        return rows
+
+    def fetchall(self):
+        if self._pending is None:
+            return super().fetchall()
+        started = time.perf_counter()
+        rows = super().fetchall()
+        self._pending[2] += time.perf_counter() - started
+        self._pending[3] += len(rows)
+        self._finish()
+        return rows
+
+    def close(self):
+        if self._pending is not None:
+            self._finish()
+        super().close()
+
+    def __del__(self):
+        if self._pending is not None:
+            try:
+                self._finish()
+            except Exception:
+                pass
+
+
+# Cursor class models.connect_db() hands out
+cursor_factory = InstrumentedCursor if ENABLED else sqlite3.Cursor
+
+# --- END OF FILE query_stats.py ---
@@ -0,0 +1,129 @@
+# --- START OF FILE read_cache.py ---
+
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Optional, Tuple
+
+class ReadCache:
+    """Bounded LRU cache of query results, tagged with the versions of the tables they read.
+
+    Versions come from the data_versions table (schema migration 8), whose
+    counters are bumped by triggers in the same transaction as every write.
+    An entry is served only while all of its tables still have the versions
+    it was loaded under, so a hit is never staler than the last commit.
+
+    Reading data_versions on every lookup would cost nearly as much as some
+    of the cached queries, so a private watcher connection polls
+    `PRAGMA data_version` first. That value changes only when another
+    connection - a pooled one in this process or anything in another
+    process - has committed, which makes the common no-writes case one cheap
+    pragma. Every thread has its own watcher, so the pragma never runs under
+    the cache lock and concurrent lookups do not queue behind one another.
+    """
+
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        self._entries = OrderedDict() # key -> (database, version tag, value)
+        self._lock = threading.Lock()
+        # Each thread polls through its own watcher, so lookups from different
+        # threads never wait for each other's PRAGMA (see table_versions)
+        self._local = threading.local()
+        self._generation = 0 # Bumped by close(); older watchers are reopened
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # --- Versions ---
+    def _thread_watcher(self, db_name: str) -> "_Watcher":
+        watcher = getattr(self._local, "watcher", None)
+        if watcher is None or watcher.db_name != db_name or watcher.generation != self._generation:
+            if watcher is not None:
+                watcher.conn.close()
+            watcher = self._local.watcher = _Watcher(db_name, self._generation)
+        return watcher
+
+    def table_versions(self, db_name: str) -> Optional[Dict[str, int]]:
+        """Current version of each table, or None if the schema has no data_versions yet."""
+        watcher = self._thread_watcher(db_name)
+        data_version = watcher.conn.execute("PRAGMA data_version").fetchone()[0]
+        if data_version != watcher.data_version:
+            try:
+                watcher.versions = dict(watcher.conn.execute("SELECT name, version FROM data_versions"))
+            except sqlite3.OperationalError:
+                watcher.versions = None
+            watcher.data_version = data_version
+        return watcher.versions
+
+    # --- Lookups ---
+    def get_or_load(self, db_name: str, key: Hashable, tables: Tuple[str, ...], loader: Callable):
+        """Returns the cached value for `key`, or calls `loader()` and caches its result.
+
+        `tables` lists every table the loader reads. Exceptions from the
+        loader propagate and nothing is cached.
+        """
+        if self.maxsize <= 0:
+            return loader()
+        # Snapshot versions BEFORE loading: a write that lands mid-load then
+        # leaves the entry tagged older than its data, which only costs a reload
+        versions = self.table_versions(db_name)
+        if versions is None:
+            return loader()
+        tag = tuple(versions.get(table) for table in tables)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[:2] == (db_name, tag):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[2]
+            self.misses += 1
+
+        value = loader()
+        with self._lock:
+            self._entries[key] = (db_name, tag, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def close(self):
+        """Drops every entry and this thread's watcher; other threads reopen theirs on next use."""
+        with self._lock:
+            self._entries.clear()
+            self._generation += 1
+        watcher = getattr(self._local, "watcher", None)
+        if watcher is not None:
+            watcher.conn.close()
+            self._local.watcher = None
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+
+class _Watcher:
+    """One thread's watcher connection and the last versions it read."""
+
+    def __init__(self, db_name: str, generation: int):
+        # Closed by close(), or with its thread's locals when the thread exits
+        self.conn = sqlite3.connect(db_name, isolation_level=None)
+        self.db_name = db_name
+        self.generation = generation
+        self.data_version = None
+        self.versions = None # table name -> version, None when data_versions is missing
+
+# --- END OF FILE read_cache.py ---
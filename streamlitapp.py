@@ -5,9 +5,14 @@ import streamlit as st
 import requests
 from jose import jwt
 import models
+import analytics
+import charts
 import pandas as pd
 import plotly.express as px
-from datetime import date
+from datetime import date, timedelta
+import functools
+import json
+import time
 import os # Import os
 
 # --- Use Streamlit Secrets ---
@@ -34,7 +39,7 @@ def show_admin_dashboard():
 
     if choice == "View All Students":
         try:
-            students = models.get_all_students()
+            students = _student_page_browser(key="admin_students")
             if students:
                 df_students = pd.DataFrame(students).set_index('id')
                 st.dataframe(df_students)
@@ -63,26 +68,19 @@ def show_admin_dashboard():
 
     elif choice == "Delete Student":
         try:
-            students = models.get_all_students()
-            if students:
-                student_options = {f"{s['name']} (ID: {s['id']})": s['id'] for s in students}
-                if not student_options:
-                     st.warning("No students available to delete.")
-                else:
-                    selected_display_name = st.selectbox("Select student to delete", list(student_options.keys()))
-                    if st.button("Delete", key="delete_student_confirm"):
-                         st.warning(f"Are you sure you want to delete {selected_display_name}? This action cannot be undone and will remove associated grades and attendance.", icon="⚠️")
-                         if st.button("Confirm Deletion", key="delete_student_final"):
-                            student_id_to_delete = student_options[selected_display_name]
-                            deleted = models.delete_student(student_id_to_delete)
-                            if deleted:
-                                st.success(f"'{selected_display_name}' deleted successfully.")
-                                st.rerun() # Refresh view
-                            else:
-                                 st.error(f"Error deleting student {selected_display_name}. Check logs.")
-
-            else:
-                st.warning("No students found in the database.")
+            selected_student = _student_picker("Select student to delete", key="admin_delete")
+            if selected_student:
+                selected_display_name = f"{selected_student['name']} (ID: {selected_student['id']})"
+                if st.button("Delete", key="delete_student_confirm"):
+                     st.warning(f"Are you sure you want to delete {selected_display_name}? This action cannot be undone and will remove associated grades and attendance.", icon="⚠️")
+                     if st.button("Confirm Deletion", key="delete_student_final"):
+                        student_id_to_delete = selected_student['id']
+                        deleted = models.delete_student(student_id_to_delete)
+                        if deleted:
+                            st.success(f"'{selected_display_name}' deleted successfully.")
+                            st.rerun() # Refresh view
+                        else:
+                             st.error(f"Error deleting student {selected_display_name}. Check logs.")
         except Exception as e:
             st.error(f"Error fetching students for deletion: {e}")
 
@@ -93,40 +91,31 @@ def show_teacher_dashboard():
     st.title("🧑‍🏫 Teacher Dashboard")
     st.write("Welcome, Teacher!")
 
-    teacher_menu = ["View Student Profiles", "Manage Grades", "Manage Attendance"]
+    teacher_menu = ["View Student Profiles", "Manage Grades", "Manage Attendance", "Take Class Attendance", "Enter Class Grades", "Class Leaderboard", "Class Analytics"]
     choice = st.sidebar.radio("Teacher Actions", teacher_menu)
     st.sidebar.divider()
 
-    # --- Get list of all students for selection ---
-    try:
-        all_students = models.get_all_students()
-        if not all_students:
-            st.warning("No students found in the system.")
-            return
-        student_options = {s['name']: s['id'] for s in all_students}
-        student_names = list(student_options.keys())
-    except Exception as e:
-        st.error(f"Error fetching student list: {e}")
-        return
-
     # --- View Student Profiles ---
     if choice == "View Student Profiles":
         st.header("View Student Profiles")
-        selected_name = st.selectbox("Select Student", student_names)
-        if selected_name:
-            student_id = student_options[selected_name]
-            student_details = models.get_student_details_by_id(student_id)
-
-            if student_details:
-                st.subheader(f"Profile: {student_details['name']}")
-                st.write(f"**ID:** {student_details['id']}")
-                st.write(f"**Email:** {student_details['email']}")
-                st.write(f"**Course:** {student_details['course']}")
+        selected_student = _student_picker("Select Student", key="profile_student")
+        if selected_student:
+            student_id = selected_student['id']
+            profile = _student_profile(student_id)
+
+            if profile:
+                st.subheader(f"Profile: {profile.name}")
+                st.write(f"**ID:** {profile.id}")
+                st.write(f"**Email:** {profile.email}")
+                st.write(f"**Course:** {profile.course}")
+                col_avg, col_att = st.columns(2)
+                col_avg.metric("Average Grade", f"{profile.average_grade:.2f}%" if profile.average_grade is not None else "N/A")
+                col_att.metric("Overall Attendance", f"{profile.attendance_percentage:.1f}%" if profile.attendance_percentage is not None else "N/A")
                 st.divider()
 
                 # Display Grades (reuse student dashboard logic if complex charts needed)
                 st.subheader("Grades")
-                df_grades = models.get_grades_by_student_id(student_id)
+                df_grades = profile.grades
                 if not df_grades.empty:
                     st.dataframe(df_grades[['subject', 'grade', 'date_graded']].style.format({"grade": "{:.1f}%", "date_graded": "{:%Y-%m-%d}"}))
                 else:
@@ -134,7 +123,7 @@ def show_teacher_dashboard():
 
                 # Display Attendance
                 st.subheader("Attendance")
-                df_attendance = models.get_attendance_by_student_id(student_id)
+                df_attendance = profile.attendance
                 if not df_attendance.empty:
                     st.dataframe(df_attendance[['date', 'subject', 'status']].style.format({"date": "{:%Y-%m-%d}"}))
                 else:
@@ -145,10 +134,11 @@ def show_teacher_dashboard():
     # --- Manage Grades ---
     elif choice == "Manage Grades":
         st.header("Manage Student Grades")
-        selected_name_grade = st.selectbox("Select Student for Grade Management", student_names, key="grade_student_select")
+        selected_student = _student_picker("Select Student for Grade Management", key="grade_student")
 
-        if selected_name_grade:
-            student_id = student_options[selected_name_grade]
+        if selected_student:
+            student_id = selected_student['id']
+            selected_name_grade = selected_student['name']
             st.subheader(f"Grades for: {selected_name_grade}")
 
             # --- Add New Grade Form ---
@@ -172,46 +162,50 @@ def show_teacher_dashboard():
 
             st.divider()
 
-            # --- Edit Existing Grade ---
-            st.write("**Edit Existing Grade**")
-            df_grades = models.get_grades_by_student_id(student_id)
+            # --- Edit Existing Grades (one page at a time, saved in one transaction) ---
+            st.write("**Edit Existing Grades**")
+            date_from, date_to, page_size = _history_filters("grade_history")
+            total = _count_student_grades(student_id, date_from, date_to)
+            offset = _history_page_offset("grade_history", total, page_size, (student_id, date_from, date_to, page_size))
+            df_grades = _student_grades(student_id, date_from, date_to, limit=page_size, offset=offset)
 
             if not df_grades.empty:
-                 # Create a display string for the select box including grade ID
-                 grade_edit_options = {
-                     f"{row['date_graded'].strftime('%Y-%m-%d')} - {row['subject']} ({row['grade']:.1f}%) (ID: {row['id']})": row['id']
-                     for index, row in df_grades.iterrows()
-                 }
-                 selected_grade_display = st.selectbox("Select Grade to Edit", list(grade_edit_options.keys()))
-
-                 if selected_grade_display:
-                      grade_id_to_edit = grade_edit_options[selected_grade_display]
-                      # Find the original grade value for the form default
-                      original_grade = df_grades.loc[df_grades['id'] == grade_id_to_edit, 'grade'].iloc[0]
-
-                      with st.form("Edit Grade Form"):
-                          new_grade_value = st.number_input("New Grade (0-100)", min_value=0.0, max_value=100.0, value=original_grade, step=0.5, format="%.1f", key=f"edit_grade_{grade_id_to_edit}")
-                          submitted_edit = st.form_submit_button("Update Grade")
-
-                          if submitted_edit:
-                              if new_grade_value is not None:
-                                   success = models.update_grade(grade_id_to_edit, new_grade_value)
-                                   if success:
-                                       st.success(f"Grade ID {grade_id_to_edit} updated successfully to {new_grade_value}%.")
-                                       # Consider st.rerun() or a refresh button if immediate update needed
-                                   else:
-                                       st.error(f"Failed to update grade ID {grade_id_to_edit}. Check logs.")
+                 with st.form("Edit Grades Form"):
+                      edited_grades = st.data_editor(
+                          df_grades[['id', 'date_graded', 'subject', 'grade']],
+                          column_config={
+                              "id": st.column_config.NumberColumn("ID", disabled=True),
+                              "date_graded": st.column_config.DateColumn("Date Graded", format="YYYY-MM-DD", disabled=True),
+                              "subject": st.column_config.TextColumn("Subject", disabled=True),
+                              "grade": st.column_config.NumberColumn("Grade (0-100)", min_value=0.0, max_value=100.0, step=0.5, format="%.1f", required=True),
+                          },
+                          hide_index=True,
+                          use_container_width=True,
+                          key=f"grade_editor_{student_id}_{offset}",
+                      )
+                      submitted_edit = st.form_submit_button("Save Changes")
+
+                      if submitted_edit:
+                          changed = edited_grades[edited_grades['grade'].to_numpy() != df_grades['grade'].to_numpy()]
+                          if changed.empty:
+                              st.info("No grades were changed.")
+                          else:
+                              updates = [{"id": int(grade_id), "grade": float(grade)} for grade_id, grade in zip(changed['id'], changed['grade'])]
+                              result = models.update_grades_bulk(updates, student_id=student_id)
+                              _report_bulk_result(result, _record_labels(changed, 'date_graded'), "grade change", label_title="Record")
             else:
-                 st.info("No existing grades to edit for this student.")
+                 st.info("No existing grades to edit for this student." if total == 0 and not (date_from or date_to)
+                         else "No grades in this date range.")
 
 
     # --- Manage Attendance ---
     elif choice == "Manage Attendance":
         st.header("Manage Student Attendance")
-        selected_name_att = st.selectbox("Select Student for Attendance Management", student_names, key="att_student_select")
+        selected_student = _student_picker("Select Student for Attendance Management", key="att_student")
 
-        if selected_name_att:
-            student_id = student_options[selected_name_att]
+        if selected_student:
+            student_id = selected_student['id']
+            selected_name_att = selected_student['name']
             st.subheader(f"Attendance for: {selected_name_att}")
 
             # --- Add New Attendance Record Form ---
@@ -220,11 +214,12 @@ def show_teacher_dashboard():
                 att_date = st.date_input("Date", value=date.today())
                 att_subject = st.text_input("Subject/Class")
                 att_status = st.selectbox("Status", ['Present', 'Absent', 'Late', 'Excused'])
+                att_overwrite = st.checkbox("Overwrite an existing record for this date/subject")
                 submitted_add_att = st.form_submit_button("Add Attendance Record")
 
                 if submitted_add_att:
                      if att_date and att_subject and att_status:
-                          success = models.add_attendance(student_id, att_date, att_subject, att_status)
+                          success = models.add_attendance(student_id, att_date, att_subject, att_status, upsert=att_overwrite)
                           if success:
                               st.success(f"Attendance recorded as '{att_status}' for {selected_name_att} in '{att_subject}' on {att_date.strftime('%Y-%m-%d')}.")
                           else:
@@ -234,75 +229,386 @@ def show_teacher_dashboard():
 
             st.divider()
 
-            # --- Edit Existing Attendance ---
+            # --- Edit Existing Attendance (one page at a time, saved in one transaction) ---
             st.write("**Edit Existing Attendance**")
-            df_attendance = models.get_attendance_by_student_id(student_id)
+            date_from, date_to, page_size = _history_filters("att_history")
+            total = _count_student_attendance(student_id, date_from, date_to)
+            offset = _history_page_offset("att_history", total, page_size, (student_id, date_from, date_to, page_size))
+            df_attendance = _student_attendance(student_id, date_from, date_to, limit=page_size, offset=offset)
 
             if not df_attendance.empty:
-                 att_edit_options = {
-                     f"{row['date'].strftime('%Y-%m-%d')} - {row['subject']} ({row['status']}) (ID: {row['id']})": row['id']
-                     for index, row in df_attendance.iterrows()
-                 }
-                 selected_att_display = st.selectbox("Select Attendance Record to Edit", list(att_edit_options.keys()))
-
-                 if selected_att_display:
-                      att_id_to_edit = att_edit_options[selected_att_display]
-                      original_status = df_attendance.loc[df_attendance['id'] == att_id_to_edit, 'status'].iloc[0]
-                      status_index = ['Present', 'Absent', 'Late', 'Excused'].index(original_status)
-
-                      with st.form("Edit Attendance Form"):
-                          new_att_status = st.selectbox("New Status", ['Present', 'Absent', 'Late', 'Excused'], index=status_index, key=f"edit_att_{att_id_to_edit}")
-                          submitted_edit_att = st.form_submit_button("Update Attendance")
-
-                          if submitted_edit_att:
-                              if new_att_status:
-                                   success = models.update_attendance(att_id_to_edit, new_att_status)
-                                   if success:
-                                       st.success(f"Attendance ID {att_id_to_edit} updated successfully to '{new_att_status}'.")
-                                   else:
-                                       st.error(f"Failed to update attendance ID {att_id_to_edit}. Check logs.")
+                 with st.form("Edit Attendance Form"):
+                      edited_attendance = st.data_editor(
+                          df_attendance[['id', 'date', 'subject', 'status']],
+                          column_config={
+                              "id": st.column_config.NumberColumn("ID", disabled=True),
+                              "date": st.column_config.DateColumn("Date", format="YYYY-MM-DD", disabled=True),
+                              "subject": st.column_config.TextColumn("Subject", disabled=True),
+                              "status": st.column_config.SelectboxColumn("Status", options=models.ALLOWED_ATTENDANCE_STATUSES, required=True),
+                          },
+                          hide_index=True,
+                          use_container_width=True,
+                          key=f"att_editor_{student_id}_{offset}",
+                      )
+                      submitted_edit_att = st.form_submit_button("Save Changes")
+
+                      if submitted_edit_att:
+                          changed = edited_attendance[edited_attendance['status'].to_numpy() != df_attendance['status'].to_numpy()]
+                          if changed.empty:
+                              st.info("No attendance records were changed.")
+                          else:
+                              updates = [{"id": int(att_id), "status": status} for att_id, status in zip(changed['id'], changed['status'])]
+                              result = models.update_attendance_bulk(updates, student_id=student_id)
+                              _report_bulk_result(result, _record_labels(changed, 'date'), "attendance change", label_title="Record")
             else:
-                 st.info("No existing attendance records to edit for this student.")
+                 st.info("No existing attendance records to edit for this student." if total == 0 and not (date_from or date_to)
+                         else "No attendance records in this date range.")
+
+    # --- Take Class Attendance (whole roster, one transaction) ---
+    elif choice == "Take Class Attendance":
+        st.header("Take Class Attendance")
+        roster = _select_class_roster(key="class_att_course")
+        if not roster:
+            return
+
+        with st.form("Class Attendance Form"):
+            class_date = st.date_input("Date", value=date.today())
+            class_subject = st.text_input("Subject/Class")
+            df_roster = pd.DataFrame(roster)[['id', 'name', 'email']].assign(status='Present')
+            edited_roster = st.data_editor(
+                df_roster,
+                column_config={
+                    "id": st.column_config.NumberColumn("ID", disabled=True),
+                    "name": st.column_config.TextColumn("Student", disabled=True),
+                    "email": st.column_config.TextColumn("Email", disabled=True),
+                    "status": st.column_config.SelectboxColumn("Status", options=models.ALLOWED_ATTENDANCE_STATUSES, required=True),
+                },
+                hide_index=True,
+                use_container_width=True,
+                key="class_att_editor",
+            )
+            class_overwrite = st.checkbox("Overwrite attendance already taken (corrected roster)")
+            submitted_class_att = st.form_submit_button("Save Attendance")
+
+            if submitted_class_att:
+                if class_subject:
+                    records = [
+                        {"student_id": int(student_id), "date": class_date, "subject": class_subject, "status": status}
+                        for student_id, status in zip(edited_roster['id'], edited_roster['status'])
+                    ]
+                    result = models.add_attendance_bulk(records, upsert=class_overwrite)
+                    _report_bulk_result(result, edited_roster['name'].tolist(), "attendance record")
+                else:
+                    st.warning("Please enter the subject/class.")
+
+    # --- Enter Class Grades (whole roster, one transaction) ---
+    elif choice == "Enter Class Grades":
+        st.header("Enter Class Grades")
+        roster = _select_class_roster(key="class_grade_course")
+        if not roster:
+            return
+
+        with st.form("Class Grades Form"):
+            class_subject = st.text_input("Subject")
+            class_grade_date = st.date_input("Date Graded", value=date.today())
+            df_roster = pd.DataFrame(roster)[['id', 'name', 'email']].assign(grade=None)
+            edited_roster = st.data_editor(
+                df_roster,
+                column_config={
+                    "id": st.column_config.NumberColumn("ID", disabled=True),
+                    "name": st.column_config.TextColumn("Student", disabled=True),
+                    "email": st.column_config.TextColumn("Email", disabled=True),
+                    "grade": st.column_config.NumberColumn("Grade (0-100)", min_value=0.0, max_value=100.0, step=0.5, format="%.1f"),
+                },
+                hide_index=True,
+                use_container_width=True,
+                key="class_grade_editor",
+            )
+            submitted_class_grades = st.form_submit_button("Save Grades")
+
+            if submitted_class_grades:
+                graded = edited_roster.dropna(subset=['grade']) # Blank cells mean "not graded"
+                if not class_subject:
+                    st.warning("Please enter the subject.")
+                elif graded.empty:
+                    st.warning("Enter at least one grade.")
+                else:
+                    records = [
+                        {"student_id": int(student_id), "subject": class_subject, "grade": float(grade), "date_graded": class_grade_date}
+                        for student_id, grade in zip(graded['id'], graded['grade'])
+                    ]
+                    result = models.add_grades_bulk(records)
+                    _report_bulk_result(result, graded['name'].tolist(), "grade")
+
+    # --- Class Leaderboard (precomputed per-student summaries) ---
+    elif choice == "Class Leaderboard":
+        st.header("Class Leaderboard")
+        col_course, col_by, col_limit = st.columns(3)
+        course = col_course.selectbox("Course", [ALL_COURSES] + _courses(), key="leaderboard_course")
+        rank_by = col_by.radio("Rank by", ["Average Grade", "Attendance"], horizontal=True)
+        limit = col_limit.number_input("Show top", min_value=5, max_value=500, value=20, step=5)
+        leaders = _leaderboard(
+            limit=int(limit),
+            course=None if course == ALL_COURSES else course,
+            by="average_grade" if rank_by == "Average Grade" else "attendance_percentage",
+        )
+        if leaders:
+            df_leaders = pd.DataFrame(leaders)
+            df_leaders.insert(0, 'rank', range(1, len(df_leaders) + 1))
+            st.dataframe(
+                df_leaders[['rank', 'name', 'course', 'average_grade', 'grade_count', 'attendance_percentage', 'attendance_count']]
+                .style.format({"average_grade": "{:.1f}%", "attendance_percentage": "{:.1f}%"}, na_rep="N/A"),
+                hide_index=True,
+            )
+        else:
+            st.info("No grades or attendance recorded yet.")
+
+    # --- Class Analytics (cohort-wide statistics) ---
+    elif choice == "Class Analytics":
+        st.header("Class Analytics")
+        col_course, col_subject = st.columns(2)
+        course = col_course.selectbox("Course", [ALL_COURSES] + _courses(), key="analytics_course")
+        course = None if course == ALL_COURSES else course
+        subject = col_subject.selectbox("Subject", ["All Subjects"] + _subjects(course), key="analytics_subject")
+        subject = None if subject == "All Subjects" else subject
+        col_grade, col_att = st.columns(2)
+        low_grade = col_grade.slider("At risk below average grade (%)", 0.0, 100.0, analytics.LOW_GRADE_THRESHOLD, step=5.0)
+        low_attendance = col_att.slider("...and attendance below (%)", 0.0, 100.0, analytics.LOW_ATTENDANCE_THRESHOLD, step=5.0)
+
+        report = _cohort_report(course=course, subject=subject, low_grade=low_grade, low_attendance=low_attendance)
+        if report.grade_rows == 0:
+            st.info("No grades recorded for this selection.")
+            return
+
+        st.caption(f"Based on {report.grade_rows:,} grade records.")
+        st.subheader("Per-Subject Statistics")
+        st.dataframe(report.subject_stats.style.format(
+            {col: "{:.1f}" for col in ['mean', 'std', 'min', 'p25', 'median', 'p75', 'p90', 'max']}, na_rep="N/A"
+        ), hide_index=True)
+        fig_subjects = px.bar(report.subject_stats, x='subject', y='mean', error_y=report.subject_stats['std'],
+                              title="Mean Grade by Subject (± 1 std)", labels={'mean': 'Mean Grade (%)', 'subject': 'Subject'})
+        st.plotly_chart(fig_subjects, use_container_width=True)
+
+        display_columns = ['subject', 'rank', 'name', 'course', 'average_grade', 'grade_count', 'attendance_percentage', 'percentile']
+        display_format = {"average_grade": "{:.1f}%", "attendance_percentage": "{:.1f}%", "percentile": "{:.0f}"}
+        at_risk = report.at_risk
+        st.subheader(f"At-Risk Students ({len(at_risk):,})")
+        if at_risk.empty:
+            st.success("No students are below both thresholds.")
+        else:
+            st.dataframe(at_risk[display_columns].head(ANALYTICS_DISPLAY_ROWS).style.format(display_format, na_rep="N/A"), hide_index=True)
+        with st.expander("Student Rankings"):
+            st.dataframe(report.student_stats[display_columns].head(ANALYTICS_DISPLAY_ROWS).style.format(display_format, na_rep="N/A"), hide_index=True)
+        if len(report.student_stats) > ANALYTICS_DISPLAY_ROWS:
+            st.caption(f"Tables show the first {ANALYTICS_DISPLAY_ROWS} rows. Narrow by course or subject to see more.")
+
+
+# --- Cached reads (shared by all sessions, keyed on the data version) ---
+# Every widget interaction re-runs this script. Reads below are cached per
+# argument set AND per data version of the tables they read, so a rerun with
+# no intervening write costs one PRAGMA instead of the query. Any committed
+# write - from this app, the API or another process - changes the version of
+# the tables it touched (models.data_version), so only entries that read
+# those tables miss on the next run. Superseded entries age out via max_entries.
+CACHE_MAX_ENTRIES = 512
+ALL_TABLES = ("students", "grades", "attendance")
+
+def _data_token(tables):
+    token = models.data_version(tables)
+    return token if token is not None else time.time_ns() # No version table yet: never reuse
+
+def _versioned(*tables, resource: bool = False):
+    """Caches a read until a write touches one of `tables`.
+
+    resource=True shares one object between sessions instead of copying it
+    (st.cache_resource); use it for large results the app only displays.
+    """
+    cache = st.cache_resource if resource else st.cache_data
+    def decorate(func):
+        def load(token, *args, **kwargs):
+            return func(*args, **kwargs)
+        load.__qualname__ = f"{func.__qualname__}__versioned" # Streamlit keys caches by qualname
+        cached = cache(max_entries=CACHE_MAX_ENTRIES, show_spinner=False)(load)
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            return cached(_data_token(tables), *args, **kwargs)
+        return wrapper
+    return decorate
+
+_courses = _versioned("students")(models.get_courses)
+_student_page = _versioned("students")(models.list_students)
+_search_students = _versioned("students")(models.search_students)
+_student_grades = _versioned("grades")(models.get_grades_by_student_id)
+_student_attendance = _versioned("attendance")(models.get_attendance_by_student_id)
+_count_student_grades = _versioned("grades")(models.count_grades_by_student_id)
+_count_student_attendance = _versioned("attendance")(models.count_attendance_by_student_id)
+_student_profile = _versioned(*ALL_TABLES)(models.get_student_profile)
+_leaderboard = _versioned(*ALL_TABLES)(models.get_leaderboard)
+_subjects = _versioned("students", "grades")(analytics.get_subjects)
+_cohort_report = _versioned(*ALL_TABLES, resource=True)(analytics.cohort_report)
+
+@_versioned(*ALL_TABLES)
+def _student_profile_for_user(username: str):
+    return models.get_student_profile_for_user(username) or models.get_student_profile_by_name(username)
+
+# --- Student pickers (keyset-paginated, never load the whole roster) ---
+PICKER_PAGE_SIZE = 50
+ANALYTICS_DISPLAY_ROWS = 500
+ALL_COURSES = "All Courses"
+
+def _student_picker(label: str, key: str):
+    """Search-as-you-type student picker; returns the selected student dict or None."""
+    col_search, col_course = st.columns([2, 1])
+    search_text = col_search.text_input("Search by name or email", key=f"{key}_search", placeholder="Start typing a name or email...")
+    course = col_course.selectbox("Course", [ALL_COURSES] + _courses(), key=f"{key}_course")
+    course = None if course == ALL_COURSES else course
+    if search_text.strip():
+        # Ranked full-text matches on any part of the name or email
+        students = _search_students(search_text, limit=PICKER_PAGE_SIZE, course=course)
+        has_more = len(students) == PICKER_PAGE_SIZE
+    else:
+        page = _student_page(limit=PICKER_PAGE_SIZE, course=course)
+        students, has_more = page.students, page.next_after is not None
+    if not students:
+        st.warning("No students match this search.")
+        return None
+    if has_more:
+        st.caption(f"Showing the first {PICKER_PAGE_SIZE} matches. Type more of the name to narrow the list.")
+    student_by_label = {f"{s['name']} (ID: {s['id']})": s for s in students}
+    selected_label = st.selectbox(label, list(student_by_label.keys()), key=f"{key}_select")
+    return student_by_label.get(selected_label)
+
+def _student_page_browser(key: str, page_size: int = PICKER_PAGE_SIZE):
+    """Filterable, paged student listing with Previous/Next; returns the current page."""
+    col_search, col_course = st.columns([2, 1])
+    name_prefix = col_search.text_input("Search by name", key=f"{key}_search")
+    course = col_course.selectbox("Course", [ALL_COURSES] + _courses(), key=f"{key}_course")
+    filters = (name_prefix.strip(), course)
+
+    # Cursor stack: entry i is the `after` key that starts page i. Reset when filters change.
+    state_key = f"{key}_cursors"
+    if st.session_state.get(f"{key}_filters") != filters:
+        st.session_state[f"{key}_filters"] = filters
+        st.session_state[state_key] = [None]
+    cursors = st.session_state[state_key]
+
+    page = _student_page(
+        limit=page_size,
+        after=cursors[-1],
+        course=None if course == ALL_COURSES else course,
+        name_prefix=filters[0] or None,
+    )
+    col_prev, col_page, col_next = st.columns([1, 2, 1])
+    if col_prev.button("◀ Previous", key=f"{key}_prev", disabled=len(cursors) == 1):
+        cursors.pop()
+        st.rerun()
+    col_page.write(f"Page {len(cursors)}")
+    if col_next.button("Next ▶", key=f"{key}_next", disabled=page.next_after is None):
+        cursors.append(page.next_after)
+        st.rerun()
+    return page.students
+
+# --- Grade/attendance history paging (per student) ---
+HISTORY_PAGE_SIZES = [25, 50, 100, 250]
+
+def _history_filters(key: str):
+    """Date range and page size controls; returns (date_from, date_to, page_size)."""
+    col_from, col_to, col_size = st.columns(3)
+    date_from = col_from.date_input("From", value=None, key=f"{key}_from")
+    date_to = col_to.date_input("To", value=None, key=f"{key}_to")
+    page_size = col_size.selectbox("Rows per page", HISTORY_PAGE_SIZES, key=f"{key}_size")
+    return date_from, date_to, page_size
+
+def _history_page_offset(key: str, total: int, page_size: int, filters) -> int:
+    """Page picker over `total` rows; back to page 1 when the student or filters change."""
+    pages = max(1, -(-total // page_size))
+    page_key = f"{key}_page"
+    if st.session_state.get(f"{key}_filters") != filters or st.session_state.get(page_key, 1) > pages:
+        st.session_state[f"{key}_filters"] = filters
+        st.session_state[page_key] = 1
+    page = st.number_input(f"Page (of {pages}, {total:,} records)", min_value=1, max_value=pages, step=1, key=page_key)
+    return (int(page) - 1) * page_size
+
+@_versioned("students")
+def _load_course_roster(course: str):
+    """All students of one course, fetched page by page."""
+    roster, after = [], None
+    while True:
+        page = models.list_students(limit=500, after=after, course=course)
+        roster.extend(page.students)
+        if page.next_after is None:
+            return roster
+        after = page.next_after
+
+def _select_class_roster(key: str):
+    """Course picker for the class-wide grids; returns that course's students."""
+    courses = _courses()
+    if not courses:
+        st.warning("No students found in the system.")
+        return []
+    selected_course = st.selectbox("Course", courses, key=key)
+    return _load_course_roster(selected_course)
+
+
+def _report_bulk_result(result, row_labels: list, noun: str, label_title: str = "Student"):
+    """Shows the outcome of a bulk write, naming each rejected row by its label."""
+    if result.written:
+        st.success(f"Saved {result.written} {noun}(s) in one transaction.")
+    if result.conflicts:
+        st.warning(f"{len(result.conflicts)} row(s) were not saved:")
+        st.dataframe(pd.DataFrame(
+            [{label_title: row_labels[c.index], "Reason": c.reason} for c in result.conflicts]
+        ), hide_index=True)
+
+def _record_labels(df: pd.DataFrame, date_column: str) -> list:
+    """'YYYY-MM-DD - Subject (ID: n)' for each row, built column-wise rather than per row."""
+    return (pd.to_datetime(df[date_column]).dt.strftime('%Y-%m-%d') + " - " + df['subject']
+            + " (ID: " + df['id'].astype(str) + ")").tolist()
 
 
 # --- Student Dashboard (Existing Function) ---
+# Visible range -> days back from today; charts and record tables follow it
+CHART_RANGES = {"All time": None, "Last year": 365, "Last 3 months": 92}
+
+def _show_figure(figure: dict):
+    if figure:
+        st.plotly_chart(figure, use_container_width=True)
+    else:
+        st.info("No records in the selected range.")
+
 def show_student_dashboard(username: str):
     # (Keep existing student dashboard function as is)
     st.title(f"🎓 Student Dashboard")
-    student_details = models.get_student_details_by_name(username)
-    if not student_details:
+    profile = _student_profile_for_user(username)
+    if not profile:
         st.error(f"Could not find details for student '{username}'.")
         return
-    student_id = student_details['id']
-    st.write(f"Welcome, **{student_details['name']}**!")
-    st.write(f"Course: {student_details['course']} | Email: {student_details['email']}")
+    st.write(f"Welcome, **{profile.name}**!")
+    st.write(f"Course: {profile.course} | Email: {profile.email}")
     st.divider()
-    try:
-        df_grades = models.get_grades_by_student_id(student_id)
-        df_attendance = models.get_attendance_by_student_id(student_id)
-    except Exception as e:
-        st.error(f"An error occurred while fetching dashboard data: {e}")
-        return
+    df_grades = profile.grades
+    df_attendance = profile.attendance
+    chart_range = st.radio("Show", list(CHART_RANGES), horizontal=True, key="dashboard_range")
+    range_days = CHART_RANGES[chart_range]
+    range_from = date.today() - timedelta(days=range_days) if range_days else None
+    figures = {name: json.loads(figure) if figure else None
+               for name, figure in charts.student_chart_json(profile.id, date_from=range_from).items()}
 
     # --- Performance Analysis (Grades) ---
     st.header("📊 Performance Analysis")
     if not df_grades.empty:
-        avg_grade = df_grades['grade'].mean()
-        st.metric("Average Grade", f"{avg_grade:.2f}%")
+        st.metric("Average Grade", f"{profile.average_grade:.2f}%")
         col1, col2 = st.columns(2)
         with col1:
              st.subheader("Grades per Subject")
-             fig_grades_bar = px.bar(df_grades, x='subject', y='grade', color='subject', title="Grades by Subject", labels={'grade':'Grade (%)'})
-             fig_grades_bar.update_layout(xaxis_title="Subject", yaxis_title="Grade (%)")
-             st.plotly_chart(fig_grades_bar, use_container_width=True)
+             _show_figure(figures["grades_bar"])
         with col2:
             st.subheader("Grade Trend Over Time")
-            df_grades_sorted = df_grades.sort_values('date_graded')
-            fig_grades_trend = px.line(df_grades_sorted, x='date_graded', y='grade', markers=True, title="Grade Trend", labels={'date_graded':'Date', 'grade':'Grade (%)'})
-            fig_grades_trend.update_layout(xaxis_title="Date Graded", yaxis_title="Grade (%)")
-            st.plotly_chart(fig_grades_trend, use_container_width=True)
+            _show_figure(figures["grades_trend"])
         with st.expander("View All Grades Details"):
              # Display ID as well now
+             if range_from:
+                 df_grades = _student_grades(profile.id, date_from=range_from)
              st.dataframe(df_grades[['id', 'subject', 'grade', 'date_graded']].style.format({"grade": "{:.1f}%", "date_graded": "{:%Y-%m-%d}"}))
     else:
         st.info("No grade information available yet.")
@@ -311,24 +617,18 @@ def show_student_dashboard(username: str):
     # --- Attendance Management ---
     st.header("🗓️ Attendance")
     if not df_attendance.empty:
-        total_records = len(df_attendance)
-        present_count = len(df_attendance[df_attendance['status'] == 'Present'])
-        late_count = len(df_attendance[df_attendance['status'] == 'Late'])
-        attendance_perc = ((present_count + late_count) / total_records) * 100 if total_records > 0 else 0
-        st.metric("Overall Attendance", f"{attendance_perc:.1f}%")
+        st.metric("Overall Attendance", f"{profile.attendance_percentage:.1f}%")
         col3, col4 = st.columns(2)
         with col3:
             st.subheader("Attendance Status Distribution")
-            status_counts = df_attendance['status'].value_counts().reset_index()
-            status_counts.columns = ['status', 'count']
-            fig_attendance_pie = px.pie(status_counts, values='count', names='status', title="Attendance Breakdown", hole=0.3)
-            fig_attendance_pie.update_traces(textposition='inside', textinfo='percent+label')
-            st.plotly_chart(fig_attendance_pie, use_container_width=True)
+            _show_figure(figures["attendance_pie"])
         with col4:
             st.subheader("Recent Attendance Records")
             # Display ID as well now
             st.dataframe(df_attendance[['id', 'date', 'subject', 'status']].head().style.format({"date": "{:%Y-%m-%d}"}))
         with st.expander("View All Attendance Records"):
+             if range_from:
+                 df_attendance = _student_attendance(profile.id, date_from=range_from)
              st.dataframe(df_attendance[['id', 'date', 'subject', 'status']].style.format({"date": "{:%Y-%m-%d}"}))
     else:
         st.info("No attendance information available yet.")
@@ -380,6 +680,11 @@ if st.session_state.token:
     st.sidebar.write(f"User: **{st.session_state.username}**")
     st.sidebar.write(f"Role: **{st.session_state.role}**")
     if st.sidebar.button("Logout"):
+        try:
+            # Revoke the token server-side so it stops working before it expires
+            requests.post(f"{API_URL}/logout", headers={"Authorization": f"Bearer {st.session_state.token}"}, timeout=5)
+        except requests.exceptions.RequestException:
+            pass # API unreachable: the token still expires on its own
         st.session_state.token = None
         st.session_state.role = None
         st.session_state.username = None
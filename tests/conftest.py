@@ -0,0 +1,25 @@
+import os
+import tempfile
+
+# Set before the app modules are imported: cheap bcrypt for the API tests, and
+# a throwaway default database so nothing ever touches the tracked students.db
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+os.environ["SIS_DB_PATH"] = os.path.join(tempfile.mkdtemp(prefix="sis-tests-"), "students.db")
+
+import pytest
+
+import create_db
+import database
+import models
+
+
+@pytest.fixture
+def db(tmp_path):
+    """A small generated database (20 students, 2 subjects, 2 weeks) behind the shared pool."""
+    path = str(tmp_path / "students.db")
+    create_db.generate_dataset(path, students=20, subjects=2, days=14, grades_per_subject=2)
+    database.configure_pool(path, size=4, timeout=2)
+    models.clear_read_cache()
+    yield path
+    models.close_write_queue()
+    database.close_pool()
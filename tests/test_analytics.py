@@ -0,0 +1,64 @@
+from datetime import date
+
+import pandas as pd
+import pytest
+
+import analytics
+import models
+
+DAY = date(2030, 1, 7)
+
+
+def _grades() -> pd.DataFrame:
+    with models.connect_db() as conn:
+        return pd.read_sql_query("SELECT student_id, subject, grade FROM grades", conn)
+
+def _add_student(name: str, course: str = "Cohort Test") -> int:
+    assert models.add_student(name, f"{name.replace(' ', '.').lower()}@example.com", course)
+    return models.get_student_id_by_name(name)
+
+
+def test_subject_stats_match_a_plain_groupby(db):
+    report = analytics.cohort_report()
+    grades = _grades()
+    expected = grades.groupby("subject")["grade"]
+    stats = report.subject_stats.set_index("subject")
+    assert report.grade_rows == len(grades)
+    assert list(stats.index) == sorted(expected.groups)
+    assert stats["count"].tolist() == expected.count().tolist()
+    assert stats["students"].tolist() == grades.groupby("subject")["student_id"].nunique().tolist()
+    assert stats["mean"].to_numpy() == pytest.approx(expected.mean().to_numpy())
+    assert stats["median"].to_numpy() == pytest.approx(expected.median().to_numpy())
+    assert stats["p90"].to_numpy() == pytest.approx(expected.quantile(0.9).to_numpy())
+
+def test_student_stats_average_and_rank_within_each_subject(db):
+    report = analytics.cohort_report()
+    expected = _grades().groupby(["subject", "student_id"])["grade"].mean()
+    stats = report.student_stats.set_index(["subject", "student_id"])
+    assert stats["average_grade"].sort_index().to_numpy() == pytest.approx(expected.sort_index().to_numpy())
+    for _, subject_stats in report.student_stats.groupby("subject"):
+        assert subject_stats["rank"].iloc[0] == 1
+        assert subject_stats["average_grade"].is_monotonic_decreasing
+        assert subject_stats["percentile"].max() == 100
+
+def test_at_risk_needs_both_low_grades_and_low_attendance(db):
+    struggling, absent_only, graded_only = (_add_student(name) for name in ("Low Both", "Low Attendance", "Low Grades"))
+    for student_id, grade, status in ((struggling, 40, "Absent"), (absent_only, 90, "Absent"), (graded_only, 40, "Present")):
+        assert models.add_grade(student_id, "Math", grade, DAY)
+        assert models.add_attendance(student_id, DAY, "Math", status)
+    report = analytics.cohort_report(course="Cohort Test")
+    assert report.at_risk["student_id"].tolist() == [struggling]
+
+def test_students_without_grades_are_left_out(db):
+    graded, ungraded = _add_student("Has Grades"), _add_student("No Grades")
+    assert models.add_grade(graded, "Math", 70, DAY)
+    assert models.add_attendance(ungraded, DAY, "Math", "Present")
+    report = analytics.cohort_report(course="Cohort Test")
+    assert report.student_stats["student_id"].tolist() == [graded]
+    assert report.student_stats["attendance_percentage"].isna().all() # No attendance taken for the graded student
+
+def test_cohort_without_any_grades(db):
+    _add_student("No Grades")
+    report = analytics.cohort_report(course="Cohort Test")
+    assert report.grade_rows == 0
+    assert report.subject_stats.empty and report.student_stats.empty and report.at_risk.empty
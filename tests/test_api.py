@@ -0,0 +1,130 @@
+import csv
+import gzip
+import io
+import json
+from datetime import timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+
+import database
+import main
+import models
+
+
+def _headers(username: str, role: str) -> dict:
+    token = main.create_access_token({"sub": username, "role": role}, expires_delta=timedelta(minutes=5))
+    return {"Authorization": f"Bearer {token}"}
+
+def _start(db: str) -> TestClient:
+    database.configure_pool(db, size=4) # The previous shutdown closed the shared pool
+    return TestClient(main.app)
+
+def _count(sql: str, *params) -> int:
+    with models.connect_db() as conn:
+        return conn.execute(sql, params).fetchone()[0]
+
+
+def test_app_can_be_started_twice(db):
+    for _ in range(2):
+        with _start(db) as client:
+            # The bcrypt executor must come back after a shutdown
+            assert client.post("/token", data={"username": "admin", "password": "wrong"}).status_code == 400
+            response = client.post("/token", data={"username": "admin", "password": "admin123"})
+            assert response.status_code == 200 and response.json()["access_token"]
+
+def test_logout_revokes_the_token(db):
+    headers = _headers("admin", "admin")
+    with _start(db) as client:
+        assert client.get("/dashboard", headers=headers).status_code == 200
+        assert client.post("/logout", headers=headers).status_code == 200
+        assert client.get("/dashboard", headers=headers).status_code == 401
+        assert models.get_revoked_tokens() # Shared with other workers through the database
+        # Another token for the same user, even one issued in the same second, still works
+        assert client.get("/dashboard", headers=_headers("admin", "admin")).status_code == 200
+
+@pytest.mark.parametrize("body, status", [
+    ({"username": "s1", "password": "pw", "role": "student"}, 422),
+    ({"username": "t1", "password": "pw", "role": "teacher", "student_id": 1}, 422),
+    ({"username": "s2", "password": "pw", "role": "student", "student_id": 999}, 422),
+    ({"username": "s3", "password": "pw", "role": "student", "student_id": 2}, 201),
+    ({"username": "t2", "password": "pw", "role": "teacher"}, 201),
+])
+def test_new_accounts_link_students_by_role(db, body, status):
+    with _start(db) as client:
+        assert client.post("/users", json=body, headers=_headers("admin", "admin")).status_code == status
+
+def test_students_only_see_their_own_record(db):
+    with _start(db) as client:
+        headers = _headers("student", "student") # The seeded account is linked to student 1
+        assert client.get("/students/1/profile", headers=headers).status_code == 200
+        assert client.get("/students/2/profile", headers=headers).status_code == 403
+
+def test_export_streams_ndjson_csv_and_gzip(db):
+    with _start(db) as client:
+        headers = _headers("teacher", "teacher")
+        ndjson = client.get("/export/grades", headers=headers)
+        assert ndjson.status_code == 200 and ndjson.headers["content-type"] == "application/x-ndjson"
+        records = [json.loads(line) for line in ndjson.text.splitlines()]
+        assert len(records) == _count("SELECT COUNT(*) FROM grades")
+        assert set(records[0]) == {"id", "student_id", "name", "email", "course", "subject", "grade", "date_graded"}
+
+        plain = client.get("/export/attendance", params={"format": "csv"}, headers=headers)
+        rows = list(csv.DictReader(io.StringIO(plain.text)))
+        assert len(rows) == _count("SELECT COUNT(*) FROM attendance") and "status" in rows[0]
+        zipped = client.get("/export/attendance", params={"format": "csv", "gzip": "true"}, headers=headers)
+        assert zipped.headers["content-disposition"] == 'attachment; filename="attendance.csv.gz"'
+        assert gzip.decompress(zipped.content) == plain.content
+
+def test_export_filters(db):
+    with models.connect_db() as conn:
+        course, subject, day = conn.execute("""
+            SELECT s.course, g.subject, g.date_graded FROM grades g JOIN students s ON s.id = g.student_id LIMIT 1
+        """).fetchone()
+    with _start(db) as client:
+        headers = _headers("admin", "admin")
+        params = {"course": course, "subject": subject, "date_from": day, "date_to": day}
+        records = [json.loads(line) for line in client.get("/export/grades", params=params, headers=headers).text.splitlines()]
+        assert records and all((r["course"], r["subject"], r["date_graded"]) == (course, subject, day) for r in records)
+        assert len(records) == _count("""
+            SELECT COUNT(*) FROM grades g JOIN students s ON s.id = g.student_id
+            WHERE s.course = ? AND g.subject = ? AND g.date_graded = ?
+        """, course, subject, day)
+        empty = client.get("/export/grades", params={"format": "csv", "course": "No Such Course"}, headers=headers)
+        assert empty.text.splitlines() == ["id,student_id,name,email,course,subject,grade,date_graded"]
+
+def test_export_is_staff_only_and_checks_the_table(db):
+    with _start(db) as client:
+        assert client.get("/export/grades", headers=_headers("student", "student")).status_code == 403
+        assert client.get("/export/users", headers=_headers("admin", "admin")).status_code == 404
+        assert client.get("/export/grades", params={"format": "xml"}, headers=_headers("admin", "admin")).status_code == 422
+
+def test_import_rejects_can_be_downloaded(db):
+    upload = b"student_id,subject,grade,date_graded\n1,Math,50,2030-01-07\n999,Math,50,2030-01-07\n"
+    with _start(db) as client:
+        headers = _headers("admin", "admin")
+        response = client.post("/import/grades", files={"file": ("grades.csv", upload)}, headers=headers)
+        assert response.status_code == 200, response.text
+        report = response.json()
+        assert (report["written"], report["rejected"]) == (1, 1)
+        assert "reject_path" not in report
+        rejects = client.get(report["rejects_url"], headers=headers)
+        assert rejects.status_code == 200 and "Unknown student 999" in rejects.text
+
+def test_metrics_need_an_admin_or_the_scrape_token(db, monkeypatch):
+    monkeypatch.setattr(main, "METRICS_TOKEN", "scrape-secret")
+    with _start(db) as client:
+        assert client.get("/metrics").status_code == 401
+        assert client.get("/metrics", headers=_headers("teacher", "teacher")).status_code == 403
+        assert client.get("/metrics", headers=_headers("admin", "admin")).status_code == 200
+        response = client.get("/metrics", headers={"Authorization": "Bearer scrape-secret"})
+        assert response.status_code == 200 and "sis_http_requests_total" in response.text
+
+def test_app_can_be_restarted_with_write_behind(db, monkeypatch):
+    monkeypatch.setattr(models, "WRITE_BEHIND", True)
+    grade = {"student_id": 1, "subject": "Math", "grade": 80, "date_graded": "2030-01-07"}
+    for _ in range(2):
+        with _start(db) as client:
+            # Both the bcrypt executor and the write queue must come back after a shutdown
+            assert client.post("/token", data={"username": "admin", "password": "wrong"}).status_code == 400
+            assert client.post("/grades", json=grade, headers=_headers("admin", "admin")).status_code == 201
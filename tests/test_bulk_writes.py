@@ -0,0 +1,90 @@
+from datetime import date
+
+import models
+
+DAY = date(2030, 1, 7)
+
+
+def _attendance(student_id, date_=DAY, subject="Math", status="Present"):
+    return {"student_id": student_id, "date": date_, "subject": subject, "status": status}
+
+def _status(student_id, date_=DAY, subject="Math"):
+    with models.connect_db() as conn:
+        row = conn.execute("SELECT status FROM attendance WHERE student_id = ? AND date = ? AND subject = ?",
+                           (student_id, date_.isoformat(), subject)).fetchone()
+    return row["status"] if row else None
+
+
+def test_attendance_bulk_writes_good_rows_and_reports_the_rest(db):
+    models.add_attendance(2, DAY, "Math", "Late")
+    result = models.add_attendance_bulk([
+        _attendance(1),
+        _attendance(2),                  # Already recorded
+        _attendance(999),                # Unknown student
+        _attendance(3, status="Asleep"), # Invalid status
+        _attendance(1),                  # Duplicate within the batch
+        {"date": DAY, "subject": "Math", "status": "Present"},
+        None,
+        _attendance(4),
+    ])
+    assert result.written == 2
+    assert [conflict.index for conflict in result.conflicts] == [1, 2, 3, 4, 5, 6]
+    assert "Missing student_id" in result.conflicts[4].reason
+    assert _status(1) == "Present" and _status(2) == "Late" and _status(4) == "Present"
+
+def test_grades_bulk_reports_invalid_and_unknown_rows(db):
+    before = models.get_student_summary(1)["grade_count"]
+    records = [
+        {"student_id": 1, "subject": "Math", "grade": 95, "date_graded": DAY},
+        {"student_id": 1, "subject": "Math", "grade": 101, "date_graded": DAY},
+        {"student_id": 999, "subject": "Math", "grade": 50, "date_graded": DAY},
+        {"student_id": 1, "subject": "Math", "grade": 50},
+        {"student_id": "one", "subject": "Math", "grade": 50, "date_graded": DAY},
+    ]
+    result = models.add_grades_bulk(records)
+    assert result.written == 1
+    assert [conflict.index for conflict in result.conflicts] == [1, 2, 3, 4]
+    assert models.get_student_summary(1)["grade_count"] == before + 1
+
+def test_add_attendance_refuses_a_second_record_unless_upserting(db):
+    assert models.add_attendance(1, DAY, "Math", "Present")
+    assert not models.add_attendance(1, DAY, "Math", "Absent")
+    assert _status(1) == "Present"
+    assert models.add_attendance(1, DAY, "Math", "Absent", upsert=True)
+    assert _status(1) == "Absent"
+
+def test_add_attendance_rejects_invalid_status_and_unknown_student(db):
+    assert not models.add_attendance(1, DAY, "Math", "Asleep")
+    assert not models.add_attendance(999, DAY, "Math", "Present")
+
+def test_attendance_bulk_upsert_overwrites_existing_records(db):
+    models.add_attendance(1, DAY, "Math", "Absent")
+    result = models.add_attendance_bulk([_attendance(1, status="Excused"), _attendance(2)], upsert=True)
+    assert result.ok and result.written == 2
+    assert _status(1) == "Excused"
+
+def test_bulk_edits_only_touch_the_given_students_records(db):
+    with models.connect_db() as conn:
+        own = conn.execute("SELECT id FROM grades WHERE student_id = 1 LIMIT 1").fetchone()["id"]
+        other = conn.execute("SELECT id FROM grades WHERE student_id = 2 LIMIT 1").fetchone()["id"]
+    result = models.update_grades_bulk([{"id": own, "grade": 42}, {"id": other, "grade": 42}, {"grade": 42}],
+                                       student_id=1)
+    assert result.written == 1
+    assert [conflict.index for conflict in result.conflicts] == [1, 2]
+
+def test_a_failed_batch_reports_every_row(db, monkeypatch):
+    monkeypatch.setattr(models, "_ATTENDANCE_INSERT_SQL", "INSERT INTO no_such_table VALUES (?, ?, ?, ?)")
+    result = models.add_attendance_bulk([_attendance(1), _attendance(2, status="Asleep"), _attendance(3)])
+    assert result.written == 0
+    assert [conflict.index for conflict in result.conflicts] == [0, 1, 2]
+    assert result.conflicts[1].reason == "Invalid status 'Asleep'"
+    assert result.conflicts[0].reason.startswith("Batch failed") and _status(1) is None
+
+def test_bulk_attendance_edits_check_status_and_record(db):
+    with models.connect_db() as conn:
+        own = conn.execute("SELECT id FROM attendance WHERE student_id = 1 LIMIT 1").fetchone()["id"]
+    result = models.update_attendance_bulk([{"id": own, "status": "Excused"}, {"id": own, "status": "Asleep"},
+                                            {"id": 10 ** 9, "status": "Late"}, {"id": "x", "status": "Late"}])
+    assert result.written == 1
+    assert [(conflict.index, conflict.reason) for conflict in result.conflicts] == [
+        (1, "Invalid status 'Asleep'"), (2, f"Attendance record {10 ** 9} not found"), (3, "Invalid record id 'x'")]
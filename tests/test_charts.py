@@ -0,0 +1,58 @@
+from datetime import date
+
+import pytest
+
+import charts
+import models
+
+DAY = date(2030, 1, 7)
+
+
+@pytest.mark.parametrize("first, last, bucket", [
+    (None, "2030-01-01", "day"),
+    ("2030-01-01", "2030-01-01", "day"),
+    ("2030-01-01", "2030-04-03", "day"),   # 92 days
+    ("2030-01-01", "2030-04-04", "week"),  # 93 days
+    ("2030-01-01", "2032-01-01", "week"),  # 730 days
+    ("2030-01-01", "2032-01-02", "month"), # 731 days
+])
+def test_bucket_follows_the_visible_span(first, last, bucket):
+    assert charts.choose_bucket(first, last) == bucket
+
+def test_aggregates_match_the_raw_records(db):
+    grades = models.get_grades_by_student_id(1)
+    attendance = models.get_attendance_by_student_id(1)
+    data = charts.student_chart_data(1)
+    means = grades.groupby("subject")["grade"].mean()
+    assert data["subject_means"]["subject"].tolist() == means.index.tolist()
+    assert data["subject_means"]["average_grade"].to_numpy() == pytest.approx(means.to_numpy())
+    assert data["trend"]["grade_count"].sum() == len(grades)
+    assert data["trend"]["lowest"].min() == grades["grade"].min()
+    assert dict(zip(data["status_counts"]["status"], data["status_counts"]["count"])) \
+        == attendance["status"].value_counts().to_dict()
+
+def test_trend_buckets_group_by_period(db):
+    for day, grade in ((date(2030, 1, 7), 60), (date(2030, 1, 9), 80), (date(2030, 2, 20), 90)):
+        assert models.add_grade(1, "Math", grade, day)
+    week = charts.student_chart_data(1, date_from=date(2030, 1, 1), bucket="week")["trend"]
+    assert week["period"].dt.dayofweek.eq(0).all() # Mondays
+    assert week["average_grade"].tolist() == [70, 90]
+    month = charts.student_chart_data(1, date_from=date(2030, 1, 1), date_to=date(2032, 12, 31))
+    assert month["trend_bucket"] == "month"
+    assert month["trend"]["period"].dt.day.eq(1).all() and month["trend"]["grade_count"].tolist() == [2, 1]
+    with pytest.raises(ValueError):
+        charts.student_chart_data(1, bucket="hour")
+
+def test_ranged_status_counts_read_only_the_range(db):
+    assert models.add_attendance(1, DAY, "Math", "Late")
+    data = charts.student_chart_data(1, date_from=DAY, date_to=DAY)
+    assert data["status_counts"].to_dict("records") == [{"status": "Late", "count": 1}]
+
+def test_figures_are_cached_until_grades_change(db):
+    figures = charts.student_chart_json(1)
+    assert figures["grades_bar"] and figures["attendance_pie"]
+    hits = charts._cached_figures.cache_info().hits
+    assert charts.student_chart_json(1) == figures
+    assert charts._cached_figures.cache_info().hits == hits + 1
+    assert models.add_grade(1, "Physics Lab", 99, DAY)
+    assert "Physics Lab" in charts.student_chart_json(1)["grades_bar"]
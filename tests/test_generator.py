@@ -0,0 +1,50 @@
+import sqlite3
+
+import pytest
+
+import create_db
+
+SIZE = dict(students=15, subjects=3, days=30, grades_per_subject=2)
+
+
+def _rows(path) -> dict:
+    conn = sqlite3.connect(str(path))
+    try:
+        return {table: conn.execute(f"SELECT * FROM {table} ORDER BY id").fetchall() for table in create_db.BASE_TABLES}
+    finally:
+        conn.close()
+
+
+def test_same_seed_gives_the_same_rows(tmp_path):
+    counts = create_db.generate_dataset(str(tmp_path / "a.db"), seed=7, **SIZE)
+    create_db.generate_dataset(str(tmp_path / "b.db"), seed=7, **SIZE)
+    rows = _rows(tmp_path / "a.db")
+    assert rows == _rows(tmp_path / "b.db")
+    assert counts["students"] == len(rows["students"]) == 15
+    assert counts["grades"] == len(rows["grades"]) == 15 * 3 * 2
+    assert counts["attendance"] == len(rows["attendance"]) > 0
+
+def test_another_seed_gives_other_rows(tmp_path):
+    create_db.generate_dataset(str(tmp_path / "a.db"), seed=7, **SIZE)
+    create_db.generate_dataset(str(tmp_path / "b.db"), seed=8, **SIZE)
+    assert _rows(tmp_path / "a.db")["grades"] != _rows(tmp_path / "b.db")["grades"]
+
+def test_generated_database_is_fully_migrated(tmp_path):
+    path = str(tmp_path / "a.db")
+    create_db.generate_dataset(path, seed=7, **SIZE)
+    conn = sqlite3.connect(path)
+    try:
+        assert create_db.get_schema_version(conn) == create_db.SCHEMA_VERSION
+        summaries = conn.execute("SELECT SUM(grade_count) FROM student_summary").fetchone()[0]
+        assert summaries == 15 * 3 * 2 # Rebuilt after the bulk load
+    finally:
+        conn.close()
+
+def test_existing_file_needs_overwrite(tmp_path):
+    path = str(tmp_path / "a.db")
+    create_db.generate_dataset(path, **SIZE)
+    with pytest.raises(FileExistsError):
+        create_db.generate_dataset(path, **SIZE)
+    assert create_db.generate_dataset(path, overwrite=True, **SIZE)["students"] == 15
+    with pytest.raises(ValueError):
+        create_db.generate_dataset(str(tmp_path / "b.db"), students=0)
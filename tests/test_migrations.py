@@ -0,0 +1,95 @@
+import sqlite3
+
+import pytest
+
+import create_db
+
+
+@pytest.fixture
+def baseline(tmp_path):
+    """A schema-version-0 database (base tables only), as created before migrations existed."""
+    conn = sqlite3.connect(str(tmp_path / "baseline.db"))
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA foreign_keys = ON")
+    for ddl in create_db.BASE_TABLES.values():
+        conn.execute(ddl)
+    conn.executemany("INSERT INTO students (id, name, email, course) VALUES (?, ?, ?, ?)",
+                     [(1, "student", "student@example.com", "General Studies"),
+                      (2, "Ada Lovelace", "ada@example.com", "Mathematics")])
+    conn.executemany("INSERT INTO grades (student_id, subject, grade, date_graded) VALUES (?, ?, ?, ?)",
+                     [(1, "Math", 80, "2025-01-10"), (1, "Math", 90, "2025-01-17"), (2, "Art", 70, "2025-01-10")])
+    # Duplicates were possible before migration 2; the newest row must survive
+    conn.executemany("INSERT INTO attendance (student_id, date, subject, status) VALUES (?, ?, ?, ?)",
+                     [(1, "2025-01-10", "Math", "Absent"), (1, "2025-01-10", "Math", "Present"),
+                      (2, "2025-01-10", "Art", "Late")])
+    conn.commit()
+    yield conn
+    conn.close()
+
+
+def test_upgrades_a_baseline_database_to_the_latest_version(baseline):
+    assert create_db.get_schema_version(baseline) == 0
+    assert create_db.apply_migrations(baseline) == create_db.SCHEMA_VERSION
+    assert create_db.get_schema_version(baseline) == create_db.SCHEMA_VERSION
+
+def test_migrations_are_idempotent(baseline):
+    create_db.apply_migrations(baseline)
+    tables = baseline.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()[0]
+    assert create_db.apply_migrations(baseline) == create_db.SCHEMA_VERSION
+    assert baseline.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()[0] == tables
+
+def test_a_failed_migration_leaves_the_previous_version(baseline, monkeypatch):
+    monkeypatch.setattr(create_db, "MIGRATIONS", create_db.MIGRATIONS + ["CREATE TABLE broken (;"])
+    monkeypatch.setattr(create_db, "SCHEMA_VERSION", len(create_db.MIGRATIONS))
+    with pytest.raises(sqlite3.Error):
+        create_db.apply_migrations(baseline)
+    assert create_db.get_schema_version(baseline) == create_db.SCHEMA_VERSION - 1
+
+def test_duplicate_attendance_is_collapsed_and_then_refused(baseline):
+    create_db.apply_migrations(baseline)
+    rows = baseline.execute("SELECT status FROM attendance WHERE student_id = 1").fetchall()
+    assert [row["status"] for row in rows] == ["Present"]
+    with pytest.raises(sqlite3.IntegrityError):
+        baseline.execute("INSERT INTO attendance (student_id, date, subject, status) VALUES (1, '2025-01-10', 'Math', 'Late')")
+
+def test_collapsed_duplicates_are_kept_for_review(baseline, capsys):
+    kept, removed = (row["id"] for row in baseline.execute(
+        "SELECT id FROM attendance WHERE student_id = 1 ORDER BY id DESC"))
+    create_db.apply_migrations(baseline)
+    rows = baseline.execute("SELECT id, status, kept_id FROM attendance_duplicates").fetchall()
+    assert [tuple(row) for row in rows] == [(removed, "Absent", kept)]
+    assert "1 duplicate attendance record(s) were moved" in capsys.readouterr().out
+
+def test_existing_students_are_indexed_for_search(baseline):
+    create_db.apply_migrations(baseline)
+    matches = baseline.execute("SELECT rowid FROM students_fts WHERE students_fts MATCH 'lovelace'").fetchall()
+    assert [row[0] for row in matches] == [2]
+
+def test_existing_grades_and_attendance_are_summarised(baseline):
+    create_db.apply_migrations(baseline)
+    summary = baseline.execute("SELECT * FROM student_summary WHERE student_id = 1").fetchone()
+    assert (summary["grade_count"], summary["grade_sum"], summary["present_count"], summary["absent_count"]) == (2, 170, 1, 0)
+
+def test_summary_triggers_follow_writes(baseline):
+    create_db.apply_migrations(baseline)
+    baseline.execute("INSERT INTO grades (student_id, subject, grade, date_graded) VALUES (2, 'Art', 50, '2025-01-17')")
+    baseline.execute("UPDATE attendance SET status = 'Absent' WHERE student_id = 2")
+    baseline.commit()
+    summary = baseline.execute("SELECT * FROM student_summary WHERE student_id = 2").fetchone()
+    assert (summary["grade_count"], summary["grade_min"], summary["late_count"], summary["absent_count"]) == (2, 50, 0, 1)
+
+def test_seeded_student_account_is_linked_to_its_record(baseline):
+    create_db.apply_migrations(baseline)
+    student_account = baseline.execute("SELECT student_id FROM users WHERE username = 'student'").fetchone()
+    assert student_account["student_id"] == 1
+
+def test_data_versions_count_writes_per_table(baseline):
+    create_db.apply_migrations(baseline)
+    versions = dict(baseline.execute("SELECT name, version FROM data_versions").fetchall())
+    baseline.execute("INSERT INTO grades (student_id, subject, grade, date_graded) VALUES (2, 'Art', 50, '2025-01-17')")
+    baseline.execute("UPDATE attendance SET status = 'Absent' WHERE student_id = 2")
+    baseline.commit()
+    after = dict(baseline.execute("SELECT name, version FROM data_versions").fetchall())
+    assert after["grades"] == versions["grades"] + 1
+    assert after["attendance"] == versions["attendance"] + 1
+    assert after["students"] == versions["students"]
@@ -0,0 +1,77 @@
+import sqlite3
+import threading
+
+import pytest
+
+import database
+
+
+@pytest.fixture
+def pool(db):
+    pool = database.ConnectionPool(db, size=2, timeout=0.2)
+    yield pool
+    pool.close()
+
+
+def test_released_connections_are_reused(pool):
+    conn = pool.connect()
+    conn.close()
+    assert pool.connect() is conn
+
+def test_second_close_is_a_no_op(pool):
+    conn = pool.connect()
+    conn.close()
+    conn.close() # Used to release the semaphore twice and queue the connection twice
+    first, second = pool.connect(), pool.connect()
+    assert first is not second
+    with pytest.raises(sqlite3.OperationalError):
+        pool.connect()
+    first.close()
+    second.close()
+    assert pool.stats()["idle"] == 2
+
+def test_exhausted_pool_times_out(pool):
+    held = [pool.connect(), pool.connect()]
+    with pytest.raises(sqlite3.OperationalError, match="exhausted"):
+        pool.connect()
+    for conn in held:
+        conn.close()
+
+def test_context_manager_commits_and_release_rolls_back(pool):
+    with pool.connect() as conn:
+        conn.execute("INSERT INTO students (name, email, course) VALUES ('Committed', 'committed@example.com', 'X')")
+    conn = pool.connect()
+    conn.execute("INSERT INTO students (name, email, course) VALUES ('Dropped', 'dropped@example.com', 'X')")
+    conn.close() # Uncommitted work is rolled back on release
+    with pool.connect() as conn:
+        names = {row["name"] for row in conn.execute("SELECT name FROM students WHERE course = 'X'")}
+    assert names == {"Committed"}
+
+def test_a_connection_is_never_lent_to_two_threads(pool):
+    in_use, overlaps, lock = set(), [], threading.Lock()
+
+    def borrow():
+        for _ in range(50):
+            conn = pool.connect()
+            with lock:
+                if id(conn) in in_use:
+                    overlaps.append(conn)
+                in_use.add(id(conn))
+            conn.execute("SELECT 1").fetchone()
+            with lock:
+                in_use.discard(id(conn))
+            conn.close()
+
+    pool.timeout = 5
+    threads = [threading.Thread(target=borrow) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not overlaps
+    assert pool.stats()["open"] <= 2
+
+def test_closed_pool_refuses_new_borrows(pool):
+    pool.close()
+    with pytest.raises(sqlite3.ProgrammingError):
+        pool.connect()
@@ -0,0 +1,61 @@
+import sqlite3
+
+import pytest
+
+import database
+import models
+
+
+def test_named_profiles_are_normalised(monkeypatch):
+    for env in database._PROFILE_OVERRIDES.values():
+        monkeypatch.delenv(env, raising=False)
+    assert database.get_profile() == database.get_profile(database.DB_PROFILE)
+    assert database.get_profile("durable") == database.DB_PROFILES["durable"]
+    compat = database.get_profile("compat")
+    assert (compat["journal_mode"], compat["mmap_size"]) == ("DELETE", 0)
+
+def test_environment_overrides_single_settings(monkeypatch):
+    monkeypatch.setenv("SIS_DB_SYNCHRONOUS", "full")
+    monkeypatch.setenv("SIS_DB_CACHE_SIZE", "-1000")
+    profile = database.get_profile("fast")
+    assert (profile["synchronous"], profile["cache_size"]) == ("FULL", -1000)
+    assert profile["wal_autocheckpoint"] == database.DB_PROFILES["fast"]["wal_autocheckpoint"]
+
+@pytest.mark.parametrize("env, value", [
+    ("SIS_DB_JOURNAL_MODE", "MEMORY"),
+    ("SIS_DB_SYNCHRONOUS", "SOMETIMES"),
+    ("SIS_DB_BUSY_TIMEOUT_MS", "five"),
+])
+def test_invalid_overrides_are_refused(monkeypatch, env, value):
+    monkeypatch.setenv(env, value)
+    with pytest.raises(ValueError):
+        database.get_profile()
+
+def test_unknown_profile_is_refused():
+    with pytest.raises(ValueError, match="Unknown database profile"):
+        database.get_profile("reckless")
+
+def test_apply_profile_sets_the_pragmas(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / "profile.db"))
+    try:
+        profile = database.get_profile("durable")
+        assert database.apply_profile(conn, profile) == "WAL"
+        assert conn.execute("PRAGMA synchronous").fetchone()[0] == 2 # FULL
+        assert conn.execute("PRAGMA cache_size").fetchone()[0] == profile["cache_size"]
+        assert database.apply_profile(conn, database.get_profile("compat")) == "DELETE"
+    finally:
+        conn.close()
+
+def test_pooled_connections_use_the_profile(db):
+    profile = database.get_profile()
+    with models.connect_db() as conn:
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0].upper() == profile["journal_mode"]
+        assert conn.execute("PRAGMA busy_timeout").fetchone()[0] == profile["busy_timeout"]
+
+def test_checkpointer_checkpoints_the_wal(db):
+    checkpointer = database.Checkpointer(db, interval=0)
+    try:
+        busy, _, _ = checkpointer.checkpoint()
+        assert not busy and checkpointer.runs == 1
+    finally:
+        checkpointer.stop()
@@ -0,0 +1,56 @@
+import pytest
+
+import models
+import query_stats
+
+
+@pytest.fixture
+def collector(db, monkeypatch):
+    collector = query_stats.collector
+    collector.reset()
+    monkeypatch.setattr(collector, "sample_rate", 1.0)
+    yield collector
+    collector.reset()
+
+
+def _callers(collector) -> set:
+    return {statement["caller"] for statement in collector.snapshot()}
+
+def test_statements_are_charged_to_the_model_function(collector):
+    models.clear_read_cache()
+    models.get_student_summary(1)
+    models.get_all_students() # Runs inside a cache loader defined in the function
+    assert {"models.get_student_summary", "models.get_all_students"} <= _callers(collector)
+    assert not any(caller.startswith(("database.", "read_cache.", "query_stats.")) for caller in _callers(collector))
+
+def test_in_lists_of_any_length_share_one_entry(collector):
+    with models.connect_db() as conn:
+        for ids in ((1, 2), (1, 2, 3), (1, 2, 3, 4)):
+            conn.execute(f"SELECT id FROM students WHERE id IN ({', '.join('?' * len(ids))})", ids).fetchall()
+    [statement] = [s for s in collector.snapshot() if s["caller"] == f"{__name__}.test_in_lists_of_any_length_share_one_entry"]
+    assert statement["sql"] == "SELECT id FROM students WHERE id IN (?, ...)"
+    assert (statement["count"], statement["rows"]) == (3, 9)
+
+def test_unsampled_fast_statements_are_not_recorded(collector, monkeypatch):
+    monkeypatch.setattr(collector, "sample_rate", 0.0)
+    models.get_student_summary(1)
+    assert collector.stats()["recorded"] == 0 and not collector.snapshot()
+
+def test_slow_statements_are_logged_with_their_plan(collector, monkeypatch):
+    monkeypatch.setattr(collector, "sample_rate", 0.0) # Slow ones are logged regardless
+    monkeypatch.setattr(collector, "slow_query_seconds", 0.0)
+    models.get_student_summary(1)
+    [entry] = [e for e in collector.slow_queries() if e["caller"] == "models.get_student_summary"]
+    assert entry["sql"].startswith("SELECT * FROM ( SELECT student_id")
+    assert entry["params"] == "(1,)" and entry["rows"] == 1
+    assert any("student_summary" in line for line in entry["plan"])
+
+def test_plans_are_captured_outside_the_callers_transaction(collector, monkeypatch):
+    monkeypatch.setattr(collector, "slow_query_seconds", 0.0)
+    with models.connect_db() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute("UPDATE students SET course = course WHERE id = ?", (1,))
+        # Read while the write lock is still held: the plan comes from another connection
+        [entry] = [e for e in collector.slow_queries() if e["sql"].startswith("UPDATE students")]
+        assert entry["plan"] and not entry["plan"][0].startswith("(EXPLAIN failed")
+        assert conn.in_transaction
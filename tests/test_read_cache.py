@@ -0,0 +1,60 @@
+import sqlite3
+import threading
+from datetime import date
+
+import models
+from read_cache import ReadCache
+
+
+def test_repeat_reads_are_served_from_the_cache(db):
+    models.get_all_students()
+    hits = models.read_cache_stats()["hits"]
+    models.get_all_students()
+    assert models.read_cache_stats()["hits"] == hits + 1
+
+def test_callers_get_copies(db):
+    students = models.get_all_students()
+    students[0]["name"] = "Changed"
+    students.clear()
+    assert models.get_all_students()[0]["name"] != "Changed"
+
+def test_writes_through_models_invalidate(db):
+    count = len(models.get_all_students())
+    assert models.add_student("Cache Test", "cache.test@example.com", "Physics")
+    assert len(models.get_all_students()) == count + 1
+
+def test_writes_from_another_connection_invalidate(db):
+    count = len(models.get_all_students())
+    conn = sqlite3.connect(db)
+    conn.execute("INSERT INTO students (name, email, course) VALUES ('Raw SQL', 'raw@example.com', 'Art')")
+    conn.commit()
+    conn.close()
+    assert len(models.get_all_students()) == count + 1
+
+def test_data_version_changes_only_for_written_tables(db):
+    before = models.data_version(("students", "grades"))
+    assert models.add_attendance(1, date(2030, 1, 7), "Math", "Present")
+    assert models.data_version(("students", "grades")) == before
+    assert models.add_student("Version Test", "version.test@example.com", "Physics")
+    after = models.data_version(("students", "grades"))
+    assert after[0] == before[0] + 1 and after[1] == before[1]
+
+def test_each_thread_polls_through_its_own_watcher(db):
+    cache, watchers, versions = ReadCache(), [], []
+
+    def look():
+        versions.append(cache.table_versions(db)["students"])
+        watchers.append(cache._local.watcher)
+
+    threads = [threading.Thread(target=look) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len({id(watcher.conn) for watcher in watchers}) == 3
+    assert models.add_student("Watcher Test", "watcher.test@example.com", "Physics")
+    thread = threading.Thread(target=look)
+    thread.start()
+    thread.join()
+    assert versions[-1] == versions[0] + 1
+    cache.close()
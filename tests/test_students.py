@@ -0,0 +1,96 @@
+from datetime import timedelta
+
+import pytest
+
+import models
+
+
+def test_profile_matches_the_individual_reads(db):
+    profile = models.get_student_profile(1)
+    assert (profile.id, profile.name) == (1, models.get_student_details_by_id(1)["name"])
+    assert profile.grades.equals(models.get_grades_by_student_id(1))
+    assert profile.attendance.equals(models.get_attendance_by_student_id(1))
+    summary = models.get_student_summary(1)
+    assert profile.grade_count == summary["grade_count"] == len(profile.grades)
+    assert profile.average_grade == summary["average_grade"]
+    assert profile.attendance_count == len(profile.attendance)
+
+def test_profile_of_a_student_without_records(db):
+    assert models.add_student("No Records", "no.records@example.com", "Art")
+    profile = models.get_student_profile_by_name("No Records")
+    assert profile.grades.empty and profile.attendance.empty
+    assert (profile.grade_count, profile.average_grade, profile.attendance_percentage) == (0, None, None)
+
+def test_unknown_student_has_no_profile(db):
+    assert models.get_student_profile(999) is None
+    assert models.get_student_profile_by_name("Nobody") is None
+    assert models.get_student_profile_for_user("admin") is None
+
+def _all_pages(**filters):
+    students, after = [], None
+    while True:
+        page = models.list_students(limit=3, after=after, **filters)
+        students.extend(page.students)
+        if page.next_after is None:
+            return students
+        after = page.next_after
+
+def test_listing_pages_through_name_ties_in_case_insensitive_order(db):
+    for n in range(5): # Ties that straddle page boundaries
+        assert models.add_student("Same Name", f"same.name.{n}@example.com", "Art")
+    assert models.add_student("aaa lower case", "aaa@example.com", "Art")
+    students = _all_pages()
+    assert len(students) == len(models.get_all_students())
+    assert len({student["id"] for student in students}) == len(students)
+    assert students == sorted(students, key=lambda student: (student["name"].lower(), student["id"]))
+    assert students[0]["name"] == "aaa lower case" # Binary order would put every capitalised name first
+
+def test_listing_filters_by_course(db):
+    course = models.get_courses()[0]
+    students = _all_pages(course=course)
+    assert students and {student["course"] for student in students} == {course}
+    assert len(students) == sum(student["course"] == course for student in models.get_all_students())
+
+def test_search_ranks_name_matches_above_email_and_course(db):
+    assert models.add_student("Wombat Course", "course.match@example.com", "Quokka Studies")
+    assert models.add_student("Wombat Email", "quokka@example.com", "Art")
+    assert models.add_student("Quokka Name", "name.match@example.com", "Art")
+    assert [student["name"] for student in models.search_students("quok")] == ["Quokka Name", "Wombat Email", "Wombat Course"]
+    assert [student["name"] for student in models.search_students("quok wom")] == ["Wombat Email", "Wombat Course"]
+    assert [student["name"] for student in models.search_students("quokka", course="Art")] == ["Quokka Name", "Wombat Email"]
+
+def test_search_index_follows_updates_and_deletes(db):
+    assert models.add_student("Quokka Name", "quokka@example.com", "Art")
+    student_id = models.search_students("quokka")[0]["id"]
+    with models.connect_db() as conn:
+        conn.execute("UPDATE students SET name = 'Wallaby Name', email = 'wallaby@example.com' WHERE id = ?", (student_id,))
+    assert models.search_students("quokka") == []
+    assert [student["id"] for student in models.search_students("wallaby")] == [student_id]
+    assert models.delete_student(student_id)
+    assert models.search_students("wallaby") == []
+
+def test_search_ignores_empty_and_quoted_input(db):
+    assert models.search_students("   ") == []
+    assert models.search_students('"') == []
+
+@pytest.mark.parametrize("read, count, date_column", [
+    (models.get_grades_by_student_id, models.count_grades_by_student_id, "date_graded"),
+    (models.get_attendance_by_student_id, models.count_attendance_by_student_id, "date"),
+])
+def test_history_filters_by_date_and_pages(db, read, count, date_column):
+    history = read(1)
+    assert len(history) == count(1) >= 4
+    assert history[date_column].is_monotonic_decreasing
+    dates = sorted(history[date_column].unique())
+    assert len(dates) >= 3
+    date_from, date_to = dates[1].date(), dates[-2].date()
+    expected = history[(history[date_column].dt.date >= date_from) & (history[date_column].dt.date <= date_to)]
+    ranged = read(1, date_from=date_from, date_to=date_to)
+    assert ranged["id"].tolist() == expected["id"].tolist()
+    assert count(1, date_from=date_from, date_to=date_to) == len(expected)
+    assert count(1, date_from=dates[-1].date() + timedelta(days=1)) == 0
+
+    pages = [read(1, limit=3, offset=offset)["id"].tolist() for offset in range(0, len(history), 3)]
+    assert all(len(page) == 3 for page in pages[:-1])
+    assert sum(pages, []) == history["id"].tolist()
+    assert read(1, limit=3, offset=len(history)).empty
@@ -0,0 +1,126 @@
+import threading
+import time
+from datetime import date
+
+import pytest
+
+import models
+from write_queue import WriteOutcome, WriteQueue
+
+DAY = date(2030, 1, 7)
+
+
+@pytest.fixture
+def queue(db):
+    queue = WriteQueue(models.connect_db, batch_size=64, max_latency_ms=50)
+    yield queue
+    queue.close()
+
+
+def test_concurrent_writes_share_group_commits(queue):
+    outcomes = []
+
+    def submit(student_id):
+        outcomes.append(queue.result(queue.submit(models._write_grade, student_id, "Math", 75.0, DAY.isoformat())))
+
+    threads = [threading.Thread(target=submit, args=(student_id,)) for student_id in range(1, 21)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert [outcome.status for outcome in outcomes] == ["written"] * 20
+    assert all(outcome.id for outcome in outcomes)
+    stats = queue.stats()
+    assert stats["written"] == 20 and stats["batches"] < 20
+
+def test_conflicts_are_reported_per_write(db):
+    assert models.add_attendance(1, DAY, "Math", "Present")
+    futures = [
+        models.submit_attendance(1, DAY, "Math", "Late"),
+        models.submit_grade(999, "Math", 50, DAY),
+        models.submit_attendance(2, DAY, "Math", "Asleep"),
+        models.submit_attendance(2, DAY, "Math", "Present"),
+    ]
+    statuses = [future.result(timeout=5).status for future in futures]
+    assert statuses == ["conflict", "conflict", "conflict", "written"]
+    assert futures[1].result().reason == "Unknown student"
+
+def test_upsert_overwrites_through_the_queue(db):
+    assert models.add_attendance(1, DAY, "Math", "Present")
+    assert models.submit_attendance(1, DAY, "Math", "Excused", upsert=True).result(timeout=5).ok
+    assert models.get_student_summary(1)["excused_count"] >= 1
+
+def test_queue_restarts_after_close(db):
+    assert models.submit_grade(1, "Math", 60, DAY).result(timeout=5).ok
+    models.close_write_queue() # As at app shutdown
+    assert models.submit_grade(1, "Math", 61, DAY).result(timeout=5).ok
+    models.close_write_queue()
+
+def test_waiting_gives_up_after_the_timeout(queue):
+    def slow(conn):
+        time.sleep(0.3)
+        return WriteOutcome(status="written")
+
+    outcome = queue.result(queue.submit(slow), timeout=0.05)
+    assert outcome.status == "failed" and queue.stats()["timeouts"] == 1
+
+def test_a_failing_write_fails_its_batch_but_not_the_writer(queue):
+    def boom(conn):
+        raise RuntimeError("broken write")
+
+    assert queue.result(queue.submit(boom)).status == "failed"
+    assert queue.result(queue.submit(models._write_grade, 1, "Math", 70.0, DAY.isoformat())).ok
+
+def test_cancelled_writes_are_skipped(queue):
+    started = threading.Event()
+
+    def hold(conn):
+        started.set()
+        time.sleep(0.2)
+        return WriteOutcome(status="written")
+
+    first = queue.submit(hold)
+    started.wait(5)
+    second = queue.submit(models._write_grade, 1, "Math", 70.0, DAY.isoformat())
+    assert second.cancel()
+    assert queue.result(first).ok
+    queue.close()
+    assert queue.stats()["written"] == 1
+
+def test_full_queue_refuses_instead_of_blocking(db):
+    queue = WriteQueue(models.connect_db, max_pending=1, max_latency_ms=0)
+    release = threading.Event()
+
+    def hold(conn):
+        release.wait(5)
+        return WriteOutcome(status="written")
+
+    try:
+        first = queue.submit(hold)
+        deadline = time.monotonic() + 5
+        while queue.stats()["pending"] and time.monotonic() < deadline:
+            time.sleep(0.01) # Until the writer has taken the first write
+        queue.submit(hold)
+        refused = queue.submit(hold)
+        assert refused.result(timeout=0).reason == "Write queue is full"
+    finally:
+        release.set()
+        assert first.result(timeout=5).ok
+        queue.close()
+
+def test_writes_after_a_timed_out_close_get_a_new_writer(queue):
+    release = threading.Event()
+
+    def hold(conn):
+        release.wait(5)
+        return WriteOutcome(status="written")
+
+    first = queue.submit(hold)
+    deadline = time.monotonic() + 5
+    while queue.stats()["pending"] and time.monotonic() < deadline:
+        time.sleep(0.01)
+    queue.close(timeout=0.05) # Gives up while the old writer is still busy
+    threading.Timer(0.2, release.set).start()
+    # Used to land behind _STOP in the old writer's queue and wait out the timeout
+    assert queue.result(queue.submit(models._write_grade, 1, "Math", 70.0, DAY.isoformat()), timeout=3).ok
+    assert first.result(timeout=5).ok
@@ -0,0 +1,115 @@
+# --- START OF FILE token_cache.py ---
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Dict
+
+def token_digest(token: str) -> str:
+    """SHA-256 of a token: how revocations are stored and shared, never the token itself."""
+    return hashlib.sha256(token.encode()).hexdigest()
+
+class TokenCache:
+    """Bounded LRU cache of already-verified JWTs -> their {username, role} claims.
+
+    Entries expire together with the token itself, so a cache hit never
+    outlives the signature check it replaces. Revoked tokens are remembered
+    until their own expiry so they cannot be re-verified and re-cached.
+
+    Revocations are kept by token digest, so ones made by other processes
+    (read from the shared revoked_tokens table) can be applied with
+    `revoke_digests` without ever knowing the tokens.
+    """
+
+    def __init__(self, maxsize: int = 10000):
+        self.maxsize = maxsize
+        self._entries = OrderedDict() # token -> (claims, expires_at, digest)
+        self._digests = {} # digest -> cached token
+        self._revoked = {} # digest -> expires_at
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, token: str) -> Optional[Dict]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                self.misses += 1
+                return None
+            claims, expires_at, digest = entry
+            if expires_at <= now:
+                del self._entries[token]
+                self._digests.pop(digest, None)
+                self.evictions += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(token)
+            self.hits += 1
+            return claims
+
+    def put(self, token: str, claims: Dict, expires_at: float):
+        if self.maxsize <= 0 or expires_at <= time.time():
+            return
+        digest = token_digest(token)
+        with self._lock:
+            if digest in self._revoked:
+                return
+            self._entries[token] = (claims, expires_at, digest)
+            self._entries.move_to_end(token)
+            self._digests[digest] = token
+            while len(self._entries) > self.maxsize:
+                _, (_, _, evicted_digest) = self._entries.popitem(last=False)
+                self._digests.pop(evicted_digest, None)
+                self.evictions += 1
+
+    def revoke(self, token: str, expires_at: float):
+        """Drops the token and refuses it until `expires_at` (its exp claim)."""
+        self.revoke_digests({token_digest(token): expires_at})
+
+    def revoke_digests(self, revocations: Dict[str, float]):
+        """Applies revocations given as token digest -> expires_at."""
+        now = time.time()
+        with self._lock:
+            for digest, expires_at in revocations.items():
+                token = self._digests.pop(digest, None)
+                if token is not None:
+                    self._entries.pop(token, None)
+                if expires_at > now:
+                    self._revoked[digest] = expires_at
+            # Forget revocations whose tokens have expired anyway
+            for expired in [d for d, exp in self._revoked.items() if exp <= now]:
+                del self._revoked[expired]
+
+    def is_revoked(self, token: str) -> bool:
+        digest = token_digest(token)
+        with self._lock:
+            expires_at = self._revoked.get(digest)
+            if expires_at is None:
+                return False
+            if expires_at <= time.time():
+                del self._revoked[digest]
+                return False
+            return True
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._digests.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "revoked": len(self._revoked),
+            }
+
+# --- END OF FILE token_cache.py ---
@@ -0,0 +1,223 @@
+# --- START OF FILE write_queue.py ---
+
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Callable, Dict, Optional
+
+from pydantic import BaseModel
+
+# --- Configuration ---
+# Off by default: every add_grade/add_attendance commits on its own. When on,
+# those writes are handed to one writer thread and committed in groups.
+ENABLED = os.environ.get("SIS_WRITE_BEHIND", "0") == "1"
+# Most writes committed together in one transaction
+BATCH_SIZE = int(os.environ.get("SIS_WRITE_BATCH_SIZE", "128"))
+# Longest a write waits in the queue for others to share its commit
+MAX_LATENCY_MS = float(os.environ.get("SIS_WRITE_MAX_LATENCY_MS", "5"))
+# Queued writes beyond this are refused straight away instead of piling up
+MAX_PENDING = int(os.environ.get("SIS_WRITE_QUEUE_SIZE", "10000"))
+# Longest a caller waits for its write's outcome before giving up on it
+RESULT_TIMEOUT = float(os.environ.get("SIS_WRITE_TIMEOUT", "30"))
+
+_STOP = object()
+
+
+class WriteOutcome(BaseModel):
+    status: str # "written", "conflict" (rejected by the data) or "failed" (not attempted or rolled back)
+    id: Optional[int] = None # Row ID of the new record, when known
+    reason: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.status == "written"
+
+
+class WriteQueue:
+    """Write-behind queue: one thread commits queued single-row writes in groups.
+
+    `submit(apply, *args)` returns a Future straight away. The writer thread
+    takes the oldest queued write, gathers more until it has `batch_size` or
+    the oldest has waited `max_latency_ms`, then runs them all in one
+    BEGIN IMMEDIATE transaction: one writer-lock acquisition and one commit
+    for the whole group instead of one per write.
+
+    `apply(conn, *args)` runs one write and returns its WriteOutcome. A
+    constraint error rolls back only that statement in SQLite, so it becomes
+    a "conflict" for that write alone and the rest of the batch still
+    commits. If the transaction itself is lost (the commit fails, or an
+    error rolls everything back), every write in the batch is "failed".
+    Futures are resolved only after the commit, so "written" means durable
+    to the configured synchronous level. A Future cancelled before its batch
+    starts is skipped.
+
+    `close()` commits what is queued and stops the thread; the next submit
+    starts a new one, so an app can be shut down and started again.
+    """
+
+    def __init__(self, connect: Callable, batch_size: int = BATCH_SIZE,
+                 max_latency_ms: float = MAX_LATENCY_MS, max_pending: int = MAX_PENDING):
+        self._connect = connect
+        self.batch_size = max(1, batch_size)
+        self.max_latency = max(0.0, max_latency_ms / 1000)
+        self.max_pending = max(0, max_pending)
+        self._queue = queue.Queue(maxsize=self.max_pending)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._closed = False
+        self.submitted = 0
+        self.written = 0
+        self.conflicts = 0
+        self.failed = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.batches = 0
+        self.largest_batch = 0
+        self.commit_seconds = 0.0
+
+    # --- Submitting ---
+    def submit(self, apply: Callable, *args) -> Future:
+        """Queues `apply(conn, *args)`; the Future resolves to its WriteOutcome.
+
+        Never blocks: when the queue is full or closed the Future is already
+        resolved with a "failed" outcome.
+        """
+        future = Future()
+        with self._lock:
+            if self._closed:
+                future.set_result(WriteOutcome(status="failed", reason="Write queue is shutting down"))
+                return future
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, args=(self._queue,), name="sqlite-writer", daemon=True)
+                self._thread.start()
+            try:
+                self._queue.put_nowait((time.monotonic(), apply, args, future))
+            except queue.Full:
+                self.rejected += 1
+                future.set_result(WriteOutcome(status="failed", reason="Write queue is full"))
+                return future
+            self.submitted += 1
+        return future
+
+    # --- Writer thread ---
+    def _run(self, pending: queue.Queue):
+        while True:
+            item = pending.get()
+            if item is _STOP:
+                return
+            batch = [item]
+            deadline = item[0] + self.max_latency
+            stop = False
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    item = pending.get(timeout=remaining) if remaining > 0 else pending.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stop = True
+                    break
+                batch.append(item)
+            batch = [item for item in batch if item[3].set_running_or_notify_cancel()]
+            if batch:
+                try:
+                    self._commit(batch)
+                except Exception as e: # Never let the writer die with callers waiting
+                    print(f"Error in the write-behind thread: {e}")
+                    for _, _, _, future in batch:
+                        if not future.done():
+                            future.set_result(WriteOutcome(status="failed", reason=f"Writer error: {e}"))
+            if stop:
+                return
+
+    def _commit(self, batch: list):
+        started = time.perf_counter()
+        outcomes = []
+        try:
+            with self._connect() as conn:
+                conn.execute("BEGIN IMMEDIATE")
+                for _, apply, args, _ in batch:
+                    try:
+                        outcomes.append(apply(conn, *args))
+                    except sqlite3.IntegrityError as e:
+                        outcomes.append(WriteOutcome(status="conflict", reason=str(e)))
+                    except sqlite3.Error as e:
+                        if not conn.in_transaction:
+                            raise # SQLite rolled the whole transaction back
+                        outcomes.append(WriteOutcome(status="failed", reason=str(e)))
+        except Exception as e:
+            print(f"Error committing a batch of {len(batch)} queued writes: {e}")
+            outcomes = [WriteOutcome(status="failed", reason=f"Batch failed: {e}")] * len(batch)
+
+        with self._lock:
+            self.batches += 1
+            self.largest_batch = max(self.largest_batch, len(batch))
+            self.commit_seconds += time.perf_counter() - started
+            for outcome in outcomes:
+                if outcome.status == "written":
+                    self.written += 1
+                elif outcome.status == "conflict":
+                    self.conflicts += 1
+                else:
+                    self.failed += 1
+        for (_, _, _, future), outcome in zip(batch, outcomes):
+            future.set_result(outcome)
+
+    # --- Lifecycle ---
+    def close(self, timeout: float = 10):
+        """Commits whatever is queued, then stops the writer thread until the next submit.
+
+        If the writer is still busy after `timeout` seconds it is left to
+        finish the old queue on its own; later writes go to a new queue and
+        thread.
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            thread, pending = self._thread, self._queue
+        try:
+            if thread is not None and thread.is_alive():
+                pending.put(_STOP) # Blocks only until the writer makes room
+                thread.join(timeout=timeout)
+        finally:
+            with self._lock:
+                if thread is not None and thread.is_alive():
+                    # Still working through the old queue towards _STOP: leave
+                    # it to finish there and give later writes a fresh queue,
+                    # which the next submit pairs with a fresh thread
+                    print(f"Write-behind thread still busy after {timeout:g}s; starting a new queue")
+                    self._queue = queue.Queue(maxsize=self.max_pending)
+                self._thread = None
+                self._closed = False
+
+    def result(self, future: Future, timeout: float = RESULT_TIMEOUT) -> WriteOutcome:
+        """Waits for a submitted write; "failed" if no outcome arrives within `timeout` seconds."""
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            with self._lock:
+                self.timeouts += 1
+            return WriteOutcome(status="failed", reason=f"No outcome within {timeout:g}s; the write may still be committed")
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "enabled": ENABLED,
+                "pending": self._queue.qsize(),
+                "submitted": self.submitted,
+                "written": self.written,
+                "conflicts": self.conflicts,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "timeouts": self.timeouts,
+                "batches": self.batches,
+                "largest_batch": self.largest_batch,
+                "mean_batch": round((self.written + self.conflicts + self.failed) / self.batches, 2) if self.batches else 0.0,
+                "commit_ms": round(self.commit_seconds * 1000, 3),
+            }
+
+# --- END OF FILE write_queue.py ---